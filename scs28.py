@@ -37,22 +37,66 @@ Encoding:
 Decoding, will prompt for card input:
     ./scs28.py -d
 
+Decoding a deck from each line of a file, without prompting:
+    ./scs28.py -d --lines -f decks.txt
+
 Decoding:
     ./scs28.py -d "6H 7C 10D 4C QD QC 7D 9C AH KC 3D 8C 3C 8H 2D 4H JC AC 6D KH 10H 9D 4D JH 2C AD 8D KD 9H 6C KS AS 3H 5C 7H 5D 10C 2S JD 2H QH 3S 4S 5S 6S 7S 8S 9S 10S JS QS 5H"
 
+Encoding up to 68 characters into two decks with different backs shuffled together:
+    ./scs28.py -e --deck shoe2 "Two decks hold much more than twice what one deck does."
+
+Printing steps for putting each deck of a file into order by hand, each starting from the deck before:
+    ./scs28.py --plan previous -f decks.txt
+
 Encrypting, 3 shares with a threshold of 2 needed to decrypt:
     ./scs28.py --encrypt -n 3 -t 2 "Ssshh! Don't tell anyone."
 
 Decrypting, will prompt for 2 deck inputs:
     ./scs28.py --decrypt -t 2
+
+Decrypting from 5 decks with a threshold of 3, leaving out one bad deck if there is one:
+    ./scs28.py --decrypt -t 3 -n 5 < decks.txt
+
+Streaming a file of any length into numbered decks, one per line, and back:
+    ./scs28.py -e --stream -f photo.jpg > decks.txt
+    ./scs28.py -d --stream < decks.txt > photo.jpg
+
+Adding 4 parity decks to every 10 stream decks, and rebuilding up to 4 lost decks of each 14:
+    ./scs28.py -e --stream --erasure 10:4 -f photo.jpg > decks.txt
+    ./scs28.py -d --stream --erasure < decks.txt > photo.jpg
+
+Packing a file into the fewest decks possible; decks must be kept in order:
+    ./scs28.py -e --packed -f photo.jpg > decks.txt
+    ./scs28.py -d --packed < decks.txt > photo.jpg
+
+Encrypting every message in a JSON lines file on all cores, and decrypting them:
+    ./scs28.py --encrypt -n 3 -t 2 --batch messages.jsonl > decks.jsonl
+    ./scs28.py --decrypt -t 2 --batch decks.jsonl > messages.jsonl
+
+Encrypting a file under a random key split 3 of 5, each courier carrying about a third of it:
+    ./scs28.py --encrypt -n 5 -t 3 --hybrid -f orders.txt > couriers.txt
+
+Encrypting a long message, two 27 byte blocks per deck; any 2 of 5 shares reveal nothing, and 4 decrypt:
+    ./scs28.py --encrypt -n 5 -t 3 -k 2 "Any length of message goes here."
+
+Serving requests as JSON lines on a UNIX socket, to skip process startup per request:
+    ./scs28.py --serve /tmp/scs28.sock
+
+Storing decks in a compact binary archive, then decoding decks 100 to 199 of it:
+    ./scs28.py -e --stream -f photo.jpg --archive decks.arc --ranks --index
+    ./scs28.py -d --archive decks.arc --range 100:200
 """
 
 from __future__ import print_function
-import argparse
 import sys
 import math
 import random
 import codecs
+import collections
+import struct
+import functools
+import os
 
 __author__ = "Nathan Collins"
 __copyight__ = "Copyright (c) 2015, Nathan Collins"
@@ -60,11 +104,30 @@ __licence__ = "MIT"
 __version__ = "0.9.2"
 __email__ = "npcollins<a>gmail_com"
 
+# The feature modules import their names from scs28; when this file is run as a
+# script, they get it rather than loading a second copy
+if __name__ == "__main__":
+    sys.modules.setdefault("scs28", sys.modules[__name__])
+
 
 ###############################
 ## SCS28 Start 
 ###############################
+# Limits of the feature modules that the command line help shows; they are kept
+# here so that building the help does not import those modules
+MAX_SHOE_DECKS = 8
+MAX_ERASURE_DATA = 128
+
+# Decks handed to a worker process at a time when decoding an archive in parallel
+ARCHIVE_CHUNK_DECKS = 1024
+
+# Fewer decks than this are decoded in a single process unless workers are asked
+# for, as starting a pool costs about as much as decoding several hundred decks
+ARCHIVE_SERIAL_DECKS = 4 * ARCHIVE_CHUNK_DECKS
+
+
 def main(argv=None):
+    import argparse
     apar = argparse.ArgumentParser(prog='scs28',
     description="""    Super Card Shuffle 28 -- 
     Converts a byte string message into a ordered deck of cards.
@@ -83,21 +146,300 @@ def main(argv=None):
     apar.add_argument('-t', type=int, metavar='THRESH',
             help='sets the threshold for SSS; this is exact number of decks required to decrypt a message; can range from 2 to the total number of shares')
     apar.add_argument('-n', type=int, metavar='SHARES',
-            help='sets the total share count for SSS; this is number of decks generated when encrypting a message; must be at least as large as the threshold; maximum value of 64')
+            help='sets the total share count for SSS; this is number of decks generated when encrypting a message; must be at least as large as the threshold; maximum value of 255; with -D, the number of decks to read, and if more than the threshold, decks that do not agree with the rest are found, reported and left out')
+    apar.add_argument('-k', type=int, metavar='PACK',
+            help='encrypt a message of any length with packed SSS, hiding PACK blocks of 27 bytes in each deck; any THRESH minus 1 decks still reveal nothing, but THRESH plus PACK minus 1 decks are needed to decrypt, so the share count must be at least that; share count of at most 127; give the same -k to -D')
+    apar.add_argument('--bytewise', action='store_true',
+            help='with -E, encrypt a message of any length by sharing each byte over GF(256), which is much faster for long messages; each share takes a deck per 23 bytes of message; with -D, decrypt such decks')
+    apar.add_argument('--hybrid', action='store_true',
+            help='with -E, encrypt a message of any length under a random key, and split only the key with SSS; each of the SHARES couriers carries a key deck then its part of the erasure coded ciphertext, about 1/THRESH of a deck per 23 bytes of message; with -D, decrypt from the decks of THRESH or more couriers, read from FILE or stdin with a blank line after each courier')
     apar.add_argument('-v','--vertical', action='store_true',
-            help='output decks in vertical columns instead of on single lines')
+            help='output decks in vertical columns instead of on single lines; same as --format vertical')
+    apar.add_argument('--format', choices=sorted(OUTPUT_FORMATS), metavar='FORMAT',
+            help='output format for decks: text (one deck per line, the default), vertical (tab delimited columns), json (JSON lines), csv (one row per deck) or binary (52 card number bytes per deck)')
+    apar.add_argument('--deck', metavar='MODEL',
+            help='with -e or -d of a single message, use another kind of deck: standard (52 cards, the default), jokers (54 cards), shoe2 to shoe'+str(MAX_SHOE_DECKS)+' (2 or more decks with different backs, cards written like QH/2), piquet (32 cards, 7 to ace) or euchre (24 cards, 9 to ace); larger decks hold longer messages')
+    apar.add_argument('--plan', metavar='START', nargs='?', const='new', choices=('new', 'previous'),
+            help='print steps for putting each deck of input (MESSAGE, FILE or stdin, one per line) into order by hand, with an estimate of the time taken; START is new to begin every deck from one in card order (the default), or previous to begin each from the deck before it')
     apar.add_argument('-q','--quiet', action='store_true',
             help='do not print any prompts or help')
+    apar.add_argument('-s','--stream', action='store_true',
+            help='with -e, split input of any length into numbered decks; with -d, reassemble such decks (in any order) back into binary output')
+    apar.add_argument('-p','--packed', action='store_true',
+            help='with -e, pack input of any length into the fewest decks possible, one per line; with -d, unpack such decks, which must be given in order')
+    apar.add_argument('--erasure', metavar='DATA:PARITY', nargs='?', const='',
+            help='with -e --stream, follow each group of DATA decks with PARITY decks, so that any DATA decks of a group rebuild the rest; DATA of at most '+str(MAX_ERASURE_DATA)+'; with -d --stream, rebuild lost decks from such parity decks (plain -d --stream skips them)')
+    apar.add_argument('-f','--file', metavar='FILE',
+            help='read stream, packed or lines input from FILE instead of stdin')
+    apar.add_argument('-o','--output', metavar='FILE',
+            help='with -D, write the decrypted message to FILE instead of stdout')
+    apar.add_argument('-l','--lines', action='store_true',
+            help='with -d, decode a deck from each line of input without prompting, printing one message per line; a line that fails prints blank, and is reported on stderr as JSON without stopping the rest')
+    apar.add_argument('-a','--archive', metavar='FILE',
+            help='with -e --stream, -e --packed or -E, write the decks to a binary archive FILE instead of printing them; with -d or -D, read the decks from archive FILE')
+    apar.add_argument('--ranks', action='store_true',
+            help='store decks in a new archive as 29 byte numbers instead of 52 byte card lists')
+    apar.add_argument('--index', action='store_true',
+            help='also write a sidecar index (FILE.idx) for looking up decks in a new archive')
+    apar.add_argument('--range', metavar='START:STOP',
+            help='with -d --archive, only decode the decks in positions START up to STOP')
+    apar.add_argument('-b','--batch', metavar='FILE',
+            help='with -E or -D, process every record of a JSON lines or .csv FILE ("-" for stdin) in parallel, writing results in the same format and order')
+    apar.add_argument('-w','--workers', type=int, metavar='COUNT',
+            help='number of worker processes for --batch, or for decoding with --archive; defaults to the number of CPUs, except for archives of fewer than '+str(ARCHIVE_SERIAL_DECKS)+' decks; 1 does the work in a single process')
+    apar.add_argument('--chunksize', type=int, metavar='COUNT',
+            help='number of records handed to a worker at a time; default of 64 for --batch, and '+str(ARCHIVE_CHUNK_DECKS)+' decks when decoding with --archive')
+    apar.add_argument('--window', type=int, metavar='COUNT',
+            help='when decoding with --archive, most chunks of decks being decoded at once, bounding memory use; defaults to 4 per worker')
+    apar.add_argument('--serve', metavar='ADDRESS',
+            help='run as a server answering line delimited JSON requests on a UNIX socket path, localhost port, or HOST:PORT, using -w worker processes; see scs28_server.py; requires Python 3.7 or later')
+    apar.add_argument('--allow-remote', action='store_true',
+            help='with --serve, allow a HOST that is not a loopback address; anyone who can reach it can use the server, which has no authentication')
+    apar.add_argument('--profile', metavar='FILE',
+            help='time each stage of the run (parsing, ranking, SSS, hex conversion, output) and write a JSON report to FILE ("-" for stderr); with --batch, only covers worker processes if -w 1 is given')
+    apar.add_argument('--cprofile', metavar='FILE',
+            help='also dump full cProfile statistics of the run to FILE, for reading with pstats')
     apar.add_argument('--test', action='store_true',
             help=argparse.SUPPRESS)
 
-    global pargs
     pargs = apar.parse_args(argv)
+    if not pargs.format:
+        pargs.format = "vertical" if pargs.vertical else "text"
+
+    try:
+        if not (pargs.profile or pargs.cprofile):
+            return runCommand(apar, pargs)
+
+        from scs28_profile import StageProfiler, writeProfileReport
+        profiler = StageProfiler()
+        if pargs.cprofile:
+            import cProfile
+            profiler.cprofile = cProfile.Profile()
+        try:
+            with profiler:
+                return runCommand(apar, pargs)
+        finally:
+            if pargs.cprofile:
+                profiler.cprofile.dump_stats(pargs.cprofile)
+            if pargs.profile:
+                writeProfileReport(profiler.report(), pargs.profile)
+    except EOFError:
+        # card entry was quit
+        return 0
+    except DeckParseError as e:
+        print ("FAILURE:", e.reason + ".", file=sys.stderr)
+        return 1
+
+
+def runCommand(apar, pargs):
+    """
+    Performs the action chosen by the parsed command line flags.
+    """
+    if pargs.archive and (pargs.decode or pargs.decrypt):
+        # a missing or damaged archive, or a range outside of it, fails before any output
+        from scs28_archive import DeckArchive, parseRange
+        try:
+            archive = DeckArchive(pargs.archive)
+            try:
+                parseRange(pargs.range, len(archive))
+            finally:
+                archive.close()
+        except ValueError as e:
+            print ("FAILURE:", e, file=sys.stderr)
+            sys.exit(1)
 
     # Choose action to perform
     if pargs.test:
         test()
 
+    elif pargs.serve:
+        ######################
+        #### SERVE DAEMON ####
+        ######################
+        if sys.version_info < (3, 7):
+            print ("FAILURE: Server mode requires Python 3.7 or later.", file=sys.stderr)
+            sys.exit(1)
+        import scs28_server
+        try:
+            scs28_server.serve(pargs.serve, pargs.workers, allowRemote=pargs.allow_remote)
+        except ValueError as e:
+            print ("FAILURE:", e, file=sys.stderr)
+            sys.exit(1)
+
+    elif pargs.plan:
+        ########################
+        #### STACKING PLANS ####
+        ########################
+        from scs28_plan import describePlan, planStacking
+        if pargs.message:
+            decks = [ parseCardNumbers(pargs.message) ]
+        else:
+            decks = linesToDecks(open(pargs.file) if pargs.file else sys.stdin)
+        previous = None
+        total = 0.0
+        di = 0
+        for di, deck in enumerate(decks, 1):
+            seconds, steps = planStacking(deck, previous)
+            total += seconds
+            print ("Deck", str(di) + ":", len(steps), "steps, about", int(round(seconds)), "seconds")
+            for si, line in enumerate(describePlan(steps), 1):
+                print ("  " + str(si) + ". " + line)
+            if pargs.plan == 'previous':
+                previous = list(deck)
+        if di > 1:
+            print ("All", di, "decks: about", int(round(total / 60)), "minutes")
+
+    elif pargs.deck:
+        ####################
+        #### DECK MODEL ####
+        ####################
+        from scs28_models import deckModel
+        try:
+            model = deckModel(pargs.deck)
+        except ValueError as e:
+            print ("FAILURE:", e, file=sys.stderr)
+            sys.exit(1)
+        if not (pargs.encode or pargs.decode) or pargs.stream or pargs.packed or pargs.archive or pargs.lines or pargs.batch:
+            print ("FAILURE: --deck only works with -e or -d of a single message.", file=sys.stderr)
+            sys.exit(1)
+        if pargs.format == "binary":
+            print ("FAILURE: --deck does not work with --format binary, as a deck may have more cards than a byte can number.", file=sys.stderr)
+            sys.exit(1)
+
+        if pargs.encode:
+            if pargs.message:
+                msg = b(pargs.message)
+            else:
+                qprint (pargs.quiet, "Enter your message to encode:")
+                qprint (pargs.quiet, "|--- " + str(model.capacity) + " chars max ---|")
+                msg = breadline()
+            if len(msg) > model.capacity:
+                msg = msg[:model.capacity]
+                print ("NOTICE: Message too long; truncating to:", msg, file=sys.stderr)
+            names = [ model.cards[c] for c in model.messageToCards(msg) ]
+            if pargs.format == "vertical":
+                print ("\n".join(names))
+            elif pargs.format == "json":
+                import json
+                print (json.dumps({ "deck": " ".join(names) }))
+            elif pargs.format == "csv":
+                print (",".join(names))
+            else:
+                print (" ".join(names))
+        else:
+            if pargs.message:
+                xnum = model.cardsToNumber(model.parseCards(pargs.message))
+            else:
+                xnum = deckInput(pargs.quiet, model).number
+            msg = numberToMessage(xnum, model.capacity)
+            if pargs.quiet:
+                print (msg)
+            else:
+                print ("\nDecoded:", msg)
+
+    elif pargs.encode and pargs.stream:
+        #######################
+        #### ENCODE STREAM ####
+        #######################
+        infile = open(pargs.file, 'rb') if pargs.file else bstdin()
+        if pargs.erasure is None:
+            from scs28_stream import streamToDecks
+            decks = streamToDecks(infile)
+        else:
+            from scs28_erasure import erasureStreamToDecks, MAX_ERASURE_PARITY, parseErasure
+            data, parity = parseErasure(pargs.erasure)
+            if not 1 <= data <= MAX_ERASURE_DATA or not 1 <= parity <= MAX_ERASURE_PARITY:
+                print ("FAILURE: The erasure coding is not set properly (--erasure flag). It must be DATA:PARITY, with 1 to "+str(MAX_ERASURE_DATA)+" data decks and 1 to "+str(MAX_ERASURE_PARITY)+" parity decks.", file=sys.stderr)
+                sys.exit(1)
+            decks = erasureStreamToDecks(infile, data, parity)
+        try:
+            writeDecks(decks, pargs.archive, pargs.ranks, pargs.index, pargs.format)
+        except ValueError as e:
+            # the decks before the error have been written; the stream is too long
+            print ("FAILURE:", e, file=sys.stderr)
+            sys.exit(1)
+
+    elif pargs.encode and pargs.packed:
+        #######################
+        #### ENCODE PACKED ####
+        #######################
+        from scs28_packing import packedStreamToDecks
+        infile = open(pargs.file, 'rb') if pargs.file else bstdin()
+        writeDecks(packedStreamToDecks(infile), pargs.archive, pargs.ranks, pargs.index, pargs.format)
+
+    elif pargs.decode and pargs.packed:
+        #######################
+        #### DECODE PACKED ####
+        #######################
+        from scs28_packing import packedNumbersToStream
+        if pargs.archive:
+            from scs28_archive import decodeArchive
+            nums = decodeArchive(pargs.archive, pargs.range, False, pargs.workers, pargs.chunksize or ARCHIVE_CHUNK_DECKS, pargs.window)
+        else:
+            infile = open(pargs.file, 'r') if pargs.file else sys.stdin
+            nums = ( decodeCardsToNumber(deck) for deck in linesToDecks(infile) )
+        outfile = bstdout()
+        try:
+            for data in packedNumbersToStream(nums):
+                outfile.write(data)
+        except ValueError as e:
+            outfile.flush()
+            print("FAILURE:", e, file=sys.stderr)
+            sys.exit(1)
+        outfile.flush()
+
+    elif pargs.decode and pargs.stream:
+        #######################
+        #### DECODE STREAM ####
+        #######################
+        from scs28_erasure import repairErasures
+        from scs28_stream import framesToStream
+        if pargs.archive:
+            from scs28_archive import decodeArchive
+            nums = decodeArchive(pargs.archive, pargs.range, False, pargs.workers, pargs.chunksize or ARCHIVE_CHUNK_DECKS, pargs.window)
+        else:
+            infile = open(pargs.file, 'r') if pargs.file else sys.stdin
+            nums = ( decodeCardsToNumber(deck) for deck in linesToDecks(infile) )
+        outfile = bstdout()
+        try:
+            for data in framesToStream(nums if pargs.erasure is None else repairErasures(nums)):
+                outfile.write(data)
+        except ValueError as e:
+            outfile.flush()
+            print("FAILURE:", e, file=sys.stderr)
+            sys.exit(1)
+        outfile.flush()
+
+    elif pargs.decode and pargs.lines:
+        ######################
+        #### DECODE LINES ####
+        ######################
+        import json
+        infile = open(pargs.file, 'r') if pargs.file else sys.stdin
+        outfile = bstdout()
+        failed = False
+        for lineno, msg, err in decodeDeckLines(infile):
+            if err is not None:
+                failed = True
+                outfile.write(b('\n'))
+                outfile.flush()
+                print (json.dumps({ "line": err.line, "card": err.card, "error": err.reason }), file=sys.stderr)
+            else:
+                outfile.write(msg + b('\n'))
+        outfile.flush()
+        if failed:
+            sys.exit(1)
+
+    elif pargs.decode and pargs.archive:
+        ########################
+        #### DECODE ARCHIVE ####
+        ########################
+        from scs28_archive import decodeArchive
+        outfile = bstdout()
+        for msg in decodeArchive(pargs.archive, pargs.range, True, pargs.workers, pargs.chunksize or ARCHIVE_CHUNK_DECKS, pargs.window):
+            outfile.write(msg + b('\n'))
+        outfile.flush()
+
     elif pargs.encode:
         ######################
         #### ENCODE CARDS ####
@@ -106,8 +448,8 @@ def main(argv=None):
         if pargs.message:
             msg = b(pargs.message)
         else:
-            qprint ("Enter your message to encode:")
-            qprint ("|------ 28 chars max ------|")
+            qprint (pargs.quiet, "Enter your message to encode:")
+            qprint (pargs.quiet, "|------ 28 chars max ------|")
             msg = breadline()
 
         if len(msg) > 28:
@@ -122,36 +464,27 @@ def main(argv=None):
             deck.append(en)
         decks = [ deck ]
 
-        if pargs.vertical:
-            outputDecksVertical(decks)
-        else:
-            for d in decks:
-                outputDeckHorizontal(d)
+        writeDecks(decks, fmt=pargs.format)
 
     elif pargs.decode:
         ######################
         #### DECODE CARDS ####
         ######################
         if pargs.message:
-            card_strs = pargs.message.split()
-            deck = []
-            for cstr in card_strs:
-                cnum = cardToNumber(cstr)
-                if cnum is None:
-                    print ("FAILURE: Could not parse", cstr, "as a card. Use characters: C D H S A 1-10 T J Q K", file=sys.stderr)
-                elif cnum in deck:
-                    print ("FAILURE: Duplicate card", numberToCard(cnum), "detected. Please check your input.", file=sys.stderr)
+            try:
+                deck = parseCardNumbers(pargs.message)
+            except DeckParseError as e:
+                if e.card is not None and CARD_LOOKUP.get(compat_translate(e.card)) is None:
+                    print ("FAILURE:", e.reason + ". Use characters: C D H S A 1-10 T J Q K", file=sys.stderr)
                 else:
-                    deck.append(cnum)
-
-            if len(deck) != 52:
-                print("FAILURE: Given card list requires 52 cards, but", len(deck), "were provided.", file=sys.stderr)
+                    print ("FAILURE:", e.reason + ". Please check your input.", file=sys.stderr)
                 sys.exit(1)
         else:
-            deck = deckInput()
+            deck = deckInput(pargs.quiet)
 
         if len(deck) == 52:
-            xnum = decodeCardsToNumber(deck)
+            # entered decks are decoded as their cards come in
+            xnum = decodeCardsToNumber(deck) if pargs.message else deck.number
             if pargs.quiet:
                 print (numberToMessage(xnum))
             else:
@@ -165,74 +498,224 @@ def main(argv=None):
         if not pargs.t or pargs.t < 2:
             print ("FAILURE: The threshold is not set properly (-t flag). If must be at least 2 and no more than the number of shares (the -n flag).", file=sys.stderr)
             sys.exit(1)
-        if not pargs.n or pargs.t > pargs.n:
-            print ("FAILURE: The number of shares is not set properly (-n flag). If must be at least as large as the threshold (the -t flag) and no larger than 64.", file=sys.stderr)
+        if not pargs.n or pargs.t > pargs.n or pargs.n > MAX_SHARES:
+            print ("FAILURE: The number of shares is not set properly (-n flag). If must be at least as large as the threshold (the -t flag) and no larger than "+str(MAX_SHARES)+".", file=sys.stderr)
+            sys.exit(1)
+
+        if pargs.k is not None:
+            from scs28_packed import MAX_PACKED_SHARES
+            if not (1 <= pargs.k and pargs.t + pargs.k - 1 <= pargs.n <= MAX_PACKED_SHARES):
+                print ("FAILURE: The packing is not set properly (-k flag). It must be at least 1, with the threshold (the -t flag) plus the packing minus 1 no more than the number of shares, and no more than "+str(MAX_PACKED_SHARES)+" shares.", file=sys.stderr)
+                sys.exit(1)
+
+        if pargs.bytewise and (pargs.k or pargs.archive or pargs.batch):
+            print ("FAILURE: --bytewise cannot be used with -k, --archive or --batch.", file=sys.stderr)
             sys.exit(1)
 
+        if pargs.hybrid and (pargs.k or pargs.bytewise or pargs.archive or pargs.batch or pargs.t > MAX_ERASURE_DATA):
+            print ("FAILURE: --hybrid cannot be used with -k, --bytewise, --archive or --batch, and allows a threshold of at most "+str(MAX_ERASURE_DATA)+".", file=sys.stderr)
+            sys.exit(1)
+        anyLength = pargs.k or pargs.bytewise or pargs.hybrid
+
+        if pargs.batch:
+            from scs28_batch import batchEncryptRecord, runBatch
+            worker = functools.partial(batchEncryptRecord, thresh=pargs.t, total=pargs.n, pack=pargs.k)
+            runBatch(pargs.batch, worker, pargs.workers, pargs.chunksize or 64)
+            return
+
         if pargs.message:
             msg = b(pargs.message)
+        elif anyLength and pargs.file:
+            with open(pargs.file, 'rb') as infile:
+                msg = infile.read()
         else:
-            qprint ("Enter your message to encrypt:")
-            qprint ("|------ 27 chars max -----|")
+            qprint (pargs.quiet, "Enter your message to encrypt:")
+            qprint (pargs.quiet, "(any length)" if anyLength else "|------ 27 chars max -----|")
             msg = breadline()
 
-        secrets = messageToSecrets(msg, int(pargs.t), int(pargs.n))
+        if len(msg) > 27 and not anyLength:
+            print("WARNING: Message length truncated "+str(len(msg)-27)+" chars off the end (27 chars max).", file=sys.stderr)
+
+        if pargs.archive:
+            if pargs.k:
+                from scs28_packed import messageToPackedShares
+                nums = [ n for share in messageToPackedShares(msg, pargs.t, pargs.n, pargs.k) for n in share ]
+            else:
+                nums = [ recordToNumber(r) for r in messageToShareRecords(msg, pargs.t, pargs.n) ]
+            decks = ( encodeNumberToCards(n) for n in nums )
+            writeDecks(decks, pargs.archive, pargs.ranks, pargs.index, thresh=pargs.t, total=pargs.n, pack=pargs.k)
+            return
+
+        if anyLength:
+            if pargs.hybrid:
+                from scs28_hybrid import messageToHybridShares
+                try:
+                    shares = messageToHybridShares(msg, pargs.t, pargs.n)
+                except ValueError as e:
+                    print ("FAILURE:", e, file=sys.stderr)
+                    sys.exit(1)
+            elif pargs.bytewise:
+                from scs28_gf256 import messageToBytewiseShares
+                shares = messageToBytewiseShares(msg, pargs.t, pargs.n)
+            else:
+                from scs28_packed import messageToPackedShares
+                shares = messageToPackedShares(msg, pargs.t, pargs.n, pargs.k)
+            with OUTPUT_FORMATS[pargs.format]() as formatter:
+                for nums in shares:
+                    formatter.write([ encodeNumberToCards(n) for n in nums ])
+            return
+
+        records = messageToShareRecords(msg, int(pargs.t), int(pargs.n))
 
         decks = []
-        for sec in secrets:
-            decks.append( secretToCards(sec) )
+        for rec in records:
+            decks.append( encodeNumberToCards(recordToNumber(rec)) )
 
-        if pargs.vertical:
-            outputDecksVertical(decks)
-        else:
-            for d in decks:
-                outputDeckHorizontal(d)
+        writeDecks(decks, fmt=pargs.format)
 
     elif pargs.decrypt:
         #######################
         #### DECRYPT CARDS ####
         #######################
-        if not pargs.t or pargs.t < 2 or pargs.t > 64:
-            print ("FAILURE: The threshold is not set properly (-t flag). If must match the threshold that was set when the decks were encrypted; can range from 2 to 64.", file=sys.stderr)
+        from scs28_packed import MAX_PACKED_SHARES, packedNumberHasMore, sharedNumbersToMessage
+        if pargs.archive and not pargs.t:
+            from scs28_archive import DeckArchive
+            archive = DeckArchive(pargs.archive)
+            pargs.t = archive.thresh
+            pargs.k = pargs.k or archive.pack
+            archive.close()
+        if not pargs.t or pargs.t < 2 or pargs.t > MAX_SHARES:
+            print ("FAILURE: The threshold is not set properly (-t flag). If must match the threshold that was set when the decks were encrypted; can range from 2 to "+str(MAX_SHARES)+".", file=sys.stderr)
+            sys.exit(1)
+        if pargs.k is not None and not (1 <= pargs.k and pargs.t + pargs.k - 1 <= MAX_PACKED_SHARES):
+            print ("FAILURE: The packing is not set properly (-k flag). It must match the packing that was set when the decks were encrypted.", file=sys.stderr)
+            sys.exit(1)
+        # packed shares need the threshold plus the packing minus 1 of them
+        need = pargs.t + (pargs.k - 1 if pargs.k else 0)
+        count = pargs.n or need
+        if count < need or count > MAX_SHARES:
+            print ("FAILURE: The number of decks to read is not set properly (-n flag). It must be at least the threshold (the -t flag), plus the packing minus 1 for packed shares, and no more than "+str(MAX_SHARES)+".", file=sys.stderr)
             sys.exit(1)
 
-        secrets = []
-        for di in range(0,pargs.t):
-            secrets.append( cardsToSecret(deckInput()) )
+        if (pargs.bytewise or pargs.hybrid) and (pargs.k or pargs.archive or pargs.batch):
+            print ("FAILURE: --bytewise and --hybrid cannot be used with -k, --archive or --batch.", file=sys.stderr)
+            sys.exit(1)
 
-        msg = secretsToMessage(secrets)
-        if pargs.quiet:
-            print (msg)
-        else:
-            print ("\nDecrypted:", msg)
+        if pargs.batch:
+            from scs28_batch import batchDecryptRecord, runBatch
+            worker = functools.partial(batchDecryptRecord, thresh=pargs.t, pack=pargs.k)
+            runBatch(pargs.batch, worker, pargs.workers, pargs.chunksize or 64)
+            return
+
+        nums = []
+        if pargs.hybrid:
+            # a courier's decks are read whole, up to the blank line after them
+            qprint (pargs.quiet, "Enter the decks of at least", pargs.t, "couriers, one deck per line, with a blank line after each courier:")
+            infile = open(pargs.file, 'r') if pargs.file else sys.stdin
+            for decks in linesToDeckGroups(infile):
+                nums.append([ decodeCardsToNumber(d) for d in decks ])
+                if len(nums) == count:
+                    break
+        elif pargs.archive:
+            from scs28_archive import archiveShares
+            nums = [ [ decodeCardsToNumber(d) for d in decks ] for decks in archiveShares(pargs.archive)[:count] ]
+            if len(nums) < count:
+                print("FAILURE: The archive holds only", len(nums), "shares, but", count, "are required.", file=sys.stderr)
+                sys.exit(1)
+        hasMore = packedNumberHasMore
+        if pargs.bytewise:
+            from scs28_gf256 import bytewiseNumberHasMore as hasMore
+        for di in range(len(nums), 0 if pargs.hybrid else count):
+            # each deck is decoded as its cards are entered
+            share = [ deckInput(pargs.quiet).number ]
+            while hasMore(share[-1]):
+                qprint (pargs.quiet, "This share continues on deck", len(share)+1)
+                share.append( deckInput(pargs.quiet).number )
+            nums.append(share)
+
+        try:
+            if pargs.bytewise:
+                from scs28_gf256 import bytewiseSharesToMessage
+                msg = bytewiseSharesToMessage(nums)
+            elif pargs.hybrid or count > need:
+                if pargs.hybrid:
+                    from scs28_hybrid import hybridSharesToMessage
+                    msg, bad = hybridSharesToMessage(nums, pargs.t)
+                else:
+                    from scs28_robust import robustSharedNumbersToMessage
+                    msg, bad = robustSharedNumbersToMessage(nums, need)
+                if bad:
+                    print("WARNING: Left out", len(bad), "inconsistent deck(s), which may have been tampered with or mistyped:",
+                        " ".join([ str(i+1) for i in bad ]), file=sys.stderr)
+            else:
+                msg = sharedNumbersToMessage(nums)
+        except ValueError as e:
+            print("FAILURE:", e, file=sys.stderr)
+            sys.exit(1)
+        # the message may be a whole binary file, so its bytes go out unchanged
+        if not pargs.quiet:
+            print ("\nDecrypted:", file=sys.stderr)
+        writeMessage(msg, pargs.output)
 
     else:
         apar.print_help()
 
-def breadline():
-    """
-    Having nothing to do with bread or rationing, this function grabs a
-    binary line of data from input and returns it, for both Python 2 and 3
-    """
-    pyVer = sys.version_info
-    if pyVer[0] == 2:
+if sys.version_info[0] == 2:
+    def breadline():
+        """
+        Having nothing to do with bread or rationing, this function grabs a
+        binary line of data from input and returns it, for both Python 2 and 3
+        """
         return sys.stdin.readline().strip()
-    return sys.stdin.buffer.readline().strip()
 
-def b(s):
-    """
-    Shorthand function to convert str to bytes if running Python 3
-    """
-    pyVer = sys.version_info
-    if pyVer[0] == 2:
+    def bstdin():
+        """
+        Binary stdin stream, for both Python 2 and 3
+        """
+        return sys.stdin
+
+    def bstdout():
+        """
+        Binary stdout stream, for both Python 2 and 3
+        """
+        return sys.stdout
+
+    def b(s):
+        """
+        Shorthand function to convert str to bytes if running Python 3
+        """
         return s
-    return str.encode(s)
-
-def qprint(*args, **kwargs):
+else:
+    def breadline():
+        """
+        Having nothing to do with bread or rationing, this function grabs a
+        binary line of data from input and returns it, for both Python 2 and 3
+        """
+        return sys.stdin.buffer.readline().strip()
+
+    def bstdin():
+        """
+        Binary stdin stream, for both Python 2 and 3
+        """
+        return sys.stdin.buffer
+
+    def bstdout():
+        """
+        Binary stdout stream, for both Python 2 and 3
+        """
+        return sys.stdout.buffer
+
+    def b(s):
+        """
+        Shorthand function to convert str to bytes if running Python 3
+        """
+        return str.encode(s)
+
+def qprint(quiet, *args, **kwargs):
     """
-    Print function, unless quiet flag was set
+    Print function, unless quiet is set
     """
-    if not pargs.quiet:
+    if not quiet:
         print(*args, **kwargs)
 
 
@@ -240,62 +723,100 @@ def qprint(*args, **kwargs):
 ## Input and Output
 ###############################
 
-def deckInput():
+def deckInput(quiet=False, model=None):
     """
     Loop user input into to grab a whole deck of cards. Provides prompts, already entered
     cards summary, options for canceling, and re-entering the previous card.
-    User can choose the option to exit the program from within this loop.
+    User can choose the option to quit card entry from within this loop.
+    The deck is decoded as each card is entered, so its number is ready with the last card.
+
+    Args:
+        quiet (bool): Do not print prompts
+        model (DeckModel): Kind of deck to enter, if not the standard 52 cards
 
     Returns:
-        list: Always contains numbers 0 through 51 inclusive, ordered based on user input
+        DeckDecoder: Always contains numbers 0 through 51 inclusive (or each card of the
+            model), ordered based on user input, with the number of the deck already decoded
+
+    Raises:
+        EOFError: If the user chose to quit
+        DeckParseError: If input ended before a full deck, or had too many failures
     """
-    cards = []
+    size = 52 if model is None else model.size
+    names = CARD_NAMES if model is None else model.cards
+    cards = DeckDecoder(size=size)
     instr = 'NONE'
     failcount = 0
-    qprint ("Input your deck of cards below.")
-    while len(cards) != 52 and instr:
+    qprint (quiet, "Input your deck of cards below.")
+    while len(cards) != size and instr:
         if instr == 'QUIT':
-            sys.exit(0)
+            raise EOFError("Card entry was quit")
 
         cnums = []
         if instr == 'BACK':
-            cards = cards[:-1]
+            cards.undo()
         elif instr == 'REVIEW':
-            outputDeckHorizontal(cards, "Deck so far: ")
+            print ("Deck so far: " + "".join([ names[num] + " " for num in cards ]))
         elif instr != 'NONE':
             clist = instr.split()
             for cl in clist:
-                cnums.append(cardToNumber(cl))
+                cnum = cardToNumber(cl) if model is None else model.cardToNumber(cl)
+                if cnum is None:
+                    print("FAILURE: Invalid card "+compat_translate(cl), file=sys.stderr)
+                cnums.append(cnum)
 
         for cnum in cnums:
             if cnum is not None:
                 failcount = 0
                 if cnum in cards:
-                    print ("FAILURE: Card", numberToCard(cnum), "is already in deck. Type 'review' to check.", file=sys.stderr)
+                    print ("FAILURE: Card", names[cnum], "is already in deck. Type 'review' to check.", file=sys.stderr)
                 else:
-                    cards.append(cnum)
+                    cards.add(cnum)
             else:
                 # to prevent piping in bad input from making a loop, quit if have too many failures
                 failcount = failcount + 1
                 if failcount > 12:
-                    print("FAILURE: Too many failures during card entry. Quitting.", file=sys.stderr)
-                    sys.exit(1)
+                    raise DeckParseError("Too many failures during card entry. Quitting")
 
-        if len(cards) < 52:
-            qprint("Cards entered:" ,len(cards), (" " if len(cards) == 0 else " Last card: " + numberToCard(cards[-1])))
-            qprint("Enter card(s) [C D H S A 1-10 T J Q K] (review, back, quit): ", end='')
-            instr = sys.stdin.readline().upper().strip()
+        if len(cards) < size:
+            qprint(quiet, "Cards entered:" ,len(cards), (" " if len(cards) == 0 else " Last card: " + names[cards.cards[-1]]))
+            qprint(quiet, "Enter card(s) [C D H S A 1-10 T J Q K] (review, back, quit): ", end='')
+            line = sys.stdin.readline()
+            instr = line.upper().strip()
+            if line and not instr:
+                # blank lines, like those printed between shares, are skipped
+                instr = 'NONE'
 
     if not instr:
         print ("")
 
-    if len(cards) != 52:
-        print ("FAILURE: Did not receive a full deck as input where one was expected.", file=sys.stderr)
-        sys.exit(1)
+    if len(cards) != size:
+        raise DeckParseError("Did not receive a full deck as input where one was expected")
 
     return cards
 
 
+def writeMessage(msg, path=None):
+    """
+    Writes the bytes of a message unchanged to a file, or to stdout, where a
+    newline follows only if stdout is a terminal.
+
+    Args:
+        msg (bytes): The message
+        path (string): File to write instead of stdout
+    """
+    if path:
+        with open(path, 'wb') as outfile:
+            outfile.write(msg)
+        return
+    sys.stdout.flush()
+    outfile = bstdout()
+    outfile.write(msg)
+    if sys.stdout.isatty():
+        outfile.write(b('\n'))
+    outfile.flush()
+
+
 def outputDecksVertical(decks):
     """
     Prints tab delimited vertical columns of card identifiers to stdout.
@@ -303,19 +824,38 @@ def outputDecksVertical(decks):
     Args:
         decks (list): A list containing decks; where a deck is a list of 52 unique numbers (0 - 51)
     """
-    # reorder decks for output
-    odecks = []
-    for di in range(0,len(decks)):
-        for ci in range(0,len(decks[di])):
-            if len(odecks) < (ci+1):
-                odecks.append( [decks[di][ci]] )
-            else:
-                odecks[ci].append( decks[di][ci] )
+    for row in zip(*decks):
+        print("".join([ CARD_NAMES[cnum] + "\t" for cnum in row ]))
+
 
-    for cidx in odecks:
-        for cnum in cidx:
-            print(numberToCard(cnum)+"\t", end='')
-        print("")
+def deckToString(deck):
+    """
+    Returns the space delimited card identifiers of a deck as one string.
+    """
+    return " ".join([ CARD_NAMES[num] for num in deck ])
+
+
+def decodeDeckLines(infile):
+    """
+    Generator decoding the message of a deck on each non-blank line of a text
+    file, without prompting and without stopping at lines that fail to parse.
+
+    Args:
+        infile: File object of text lines, each a deck of space separated card identifiers
+
+    Yields:
+        tuple: The line number, and either the message and None, or None and the
+            DeckParseError for that line
+    """
+    for lineno, line in enumerate(infile, 1):
+        if not line.strip():
+            continue
+        try:
+            nums = parseCardNumbers(line)
+        except DeckParseError as e:
+            yield lineno, None, DeckParseError(e.reason, e.card, lineno)
+            continue
+        yield lineno, numberToMessage(decodeCardsToNumber(nums)), None
 
 
 def outputDeckHorizontal(deck, prefix=''):
@@ -326,10 +866,178 @@ def outputDeckHorizontal(deck, prefix=''):
         deck (list): A deck, which is a list of 52 unique numbers (0 - 51)
         prefix (string): A label to print at the start of the line before the first deck is output
     """
-    print (prefix, end='')
-    for num in deck:
-        print (numberToCard(num)+" ", end='')
-    print("")
+    print (prefix + "".join([ CARD_NAMES[num] + " " for num in deck ]))
+
+
+class DeckFormatter(object):
+    """
+    Writes decks to a buffered binary stream, rendering each line of output with a
+    single join over precomputed card identifiers. This base class writes each deck
+    on a single line; subclasses override renderDeck or writeGroup for other formats.
+
+    Args:
+        outfile: Binary file object to write to; defaults to stdout
+    """
+    def __init__(self, outfile=None):
+        # anything already printed, like prompts, must come out first
+        sys.stdout.flush()
+        self.outfile = outfile if outfile is not None else bstdout()
+        self.groups = 0
+
+    def write(self, decks):
+        """
+        Writes a group of decks, such as the shares of a message or the decks of one
+        packed share. Decks may be any iterable, and are written as they come.
+        """
+        if self.groups:
+            self.writeBreak()
+        self.groups += 1
+        self.writeGroup(decks)
+
+    def writeGroup(self, decks):
+        write = self.outfile.write
+        render = self.renderDeck
+        for deck in decks:
+            write(render(deck))
+
+    def writeBreak(self):
+        self.outfile.write(b('\n'))
+
+    def renderDeck(self, deck):
+        return b('').join(map(CARD_TOKENS.__getitem__, deck)) + b('\n')
+
+    def close(self):
+        self.outfile.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class VerticalFormatter(DeckFormatter):
+    """
+    Writes each group of decks as tab delimited vertical columns, one deck per column.
+    """
+    def writeGroup(self, decks):
+        write = self.outfile.write
+        for row in zip(*decks):
+            write(b('').join(map(CARD_CELLS.__getitem__, row)) + b('\n'))
+
+
+class JsonFormatter(DeckFormatter):
+    """
+    Writes JSON lines of the form {"deck": "AH 2H ..."}.
+    """
+    def __init__(self, outfile=None):
+        import json
+        DeckFormatter.__init__(self, outfile)
+        self.dumps = json.dumps
+
+    def writeBreak(self):
+        pass
+
+    def renderDeck(self, deck):
+        return b(self.dumps({ "deck": deckToString(deck) }) + "\n")
+
+
+class CsvFormatter(DeckFormatter):
+    """
+    Writes a CSV row of 52 card identifiers per deck; no identifier needs quoting.
+    """
+    def writeBreak(self):
+        pass
+
+    def renderDeck(self, deck):
+        return b(",".join([ CARD_NAMES[num] for num in deck ]) + "\n")
+
+
+class BinaryFormatter(DeckFormatter):
+    """
+    Writes each deck as 52 bytes of card numbers, the same as an archive record.
+    """
+    def writeBreak(self):
+        pass
+
+    def renderDeck(self, deck):
+        if isinstance(deck, Deck):
+            return deck.cards
+        return bytes(bytearray(deck))
+
+
+OUTPUT_FORMATS = {
+    "text": DeckFormatter,
+    "vertical": VerticalFormatter,
+    "json": JsonFormatter,
+    "csv": CsvFormatter,
+    "binary": BinaryFormatter,
+}
+
+
+def readFully(infile, size):
+    """
+    Reads size bytes from a binary file, fewer only once the end is reached.
+    """
+    data = infile.read(size)
+    while 0 < len(data) < size:
+        more = infile.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def linesToDecks(infile):
+    """
+    Generator yielding a deck for each non-blank line of a text file.
+    """
+    for lineno, line in enumerate(infile, 1):
+        if not line.strip():
+            continue
+        try:
+            yield Deck.fromString(line)
+        except DeckParseError as e:
+            raise DeckParseError(e.reason, e.card, lineno)
+
+
+def linesToDeckGroups(infile):
+    """
+    Generator yielding a list of decks for each group of lines of a text file,
+    groups being separated by one or more blank lines.
+    """
+    group = []
+    for lineno, line in enumerate(infile, 1):
+        if line.strip():
+            try:
+                group.append(Deck.fromString(line))
+            except DeckParseError as e:
+                raise DeckParseError(e.reason, e.card, lineno)
+        elif group:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def writeDecks(decks, archive=None, ranks=False, index=False, fmt="text", **sss):
+    """
+    Writes decks to stdout in one of the OUTPUT_FORMATS, or to an archive file if
+    one is given, along with any SSS parameters (thresh, total, pack) and an
+    optional index.
+    """
+    if not archive:
+        with OUTPUT_FORMATS[fmt]() as formatter:
+            formatter.write(decks)
+        return
+    from scs28_archive import DeckArchive, DeckArchiveWriter
+    with DeckArchiveWriter(archive, ranks, **sss) as writer:
+        for deck in decks:
+            writer.write(deck)
+    if index:
+        reader = DeckArchive(archive)
+        reader.buildIndex()
+        reader.close()
 
 
 ###############################
@@ -340,61 +1048,219 @@ def outputDeckHorizontal(deck, prefix=''):
 # Encrypter/decrypter must be using the same prime number.
 PRIME = 105312291668557186697918027683670432318895095400549111254310977959
 
+# Share x coordinates are stored in a single byte, which limits the share count.
+MAX_SHARES = 255
+
+# Lagrange weights recently used by sssJoin, keyed by the share x coordinates
+LAGRANGE_CACHE_SIZE = 128
+lagrangeCache = collections.OrderedDict()
+
+
 def decGCD(a, b):
-    if b == 0:
-        return [a, 1, 0]
+    """
+    Extended Euclidean algorithm.
 
-    recur = decGCD(b, a % b)
-    return [ recur[0], recur[2], recur[1] - recur[2] * (a//b) ]
+    Returns:
+        list: [gcd, x, y] such that a*x + b*y == gcd
+    """
+    x0, y0, x1, y1 = 1, 0, 0, 1
+    while b:
+        q = a // b
+        a, b = b, a - q * b
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    return [a, x0, y0]
 
 
-def modInv(k):
-    k = k % PRIME
-    n = -1 if k < 0 else 1
-    r = n * decGCD(PRIME, n*k)[2]
-    return (PRIME + r) % PRIME
+def modInv(k, prime=PRIME):
+    k = k % prime
+    if k == 0:
+        raise ZeroDivisionError("Zero has no inverse")
+    return decGCD(k, prime)[1] % prime
 
 
-def sssJoin(shares):
-    joined = 0
-    den = 1
-    for f in range(0, len(shares)):
-        num = den
-        for c in range(0, len(shares)):
-            if f == c:
-                continue
-            pstart = shares[f][0]
-            pnext = shares[c][0]
-            num = (num * -pnext) % PRIME
-            den = (den * (pstart - pnext)) % PRIME
+def modInvBatch(values, prime=PRIME):
+    """
+    Inverts every value with a single modInv call using Montgomery's trick: invert
+    the product of all values, then peel off one value at a time.
+    """
+    prefix = []
+    acc = 1
+    for v in values:
+        prefix.append(acc)
+        acc = (acc * v) % prime
 
-        val = shares[f][1]
-        joined = (PRIME + joined + (val * num * modInv(den))) % PRIME
+    inv = modInv(acc, prime)
+    result = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        result[i] = (inv * prefix[i]) % prime
+        inv = (inv * values[i]) % prime
+    return result
 
-    return joined
 
+def lagrangeWeights(xs, at=0, prime=PRIME):
+    """
+    Weights of the Lagrange basis polynomials at a point for the given x
+    coordinates, so the polynomial's value there is the dot product of the weights
+    and the share values; at zero, that value is the secret. The weights only
+    depend on which shares are used, so they are cached.
 
-def sssSplit(num, thresh, total):
-    r = random.SystemRandom()
-    shares = []
-    coef = [num]
+    Args:
+        xs (tuple): Distinct share x coordinates
+        at (int): The point to evaluate at
+        prime (int): The field modulus; PRIME for SSS
 
-    for x in range(1, thresh):
-        coef.append( r.randint(0, PRIME-1) )
+    Raises:
+        ValueError: If an x coordinate is repeated
+    """
+    key = (xs, at, prime)
+    weights = lagrangeCache.get(key)
+    if weights is not None:
+        lagrangeCache.pop(key)
+        lagrangeCache[key] = weights
+        return weights
+
+    nums = []
+    dens = []
+    for i, xi in enumerate(xs):
+        num = 1
+        den = 1
+        for j, xj in enumerate(xs):
+            if i != j:
+                num = (num * (at - xj)) % prime
+                den = (den * (xi - xj)) % prime
+        nums.append(num)
+        dens.append(den)
+    if 0 in dens:
+        raise ValueError("The same share was given more than once")
+
+    weights = [ (n * d) % prime for n, d in zip(nums, modInvBatch(dens, prime)) ]
+    lagrangeCache[key] = weights
+    if len(lagrangeCache) > LAGRANGE_CACHE_SIZE:
+        lagrangeCache.popitem(last=False)
+    return weights
 
-    for x in range(1, total+1):
-        accum = coef[0]
-        for exp in range(1, thresh):
-            accum = (accum + (coef[exp] * ((x ** exp) % PRIME) % PRIME)) % PRIME
 
+def sssJoin(shares):
+    weights = lagrangeWeights(tuple([ s[0] for s in shares ]))
+    joined = 0
+    for w, s in zip(weights, shares):
+        joined += w * s[1]
+    return joined % PRIME
+
+
+def sssSplit(num, thresh, total):
+    coef = entropyPool.fieldElements(thresh - 1)
+    coef.append(num)
+
+    # evaluate the polynomial at each x by Horner's rule
+    shares = []
+    for x in range(1, total+1):
+        accum = 0
+        for c in coef:
+            accum = (accum * x + c) % PRIME
         shares.append( [x, accum] )
 
     return shares
 
+###############################
+## Randomness
+###############################
+
+# Random field elements are drawn from a pool that reads os.urandom in large
+# blocks, instead of making a system call per coefficient. Values are drawn with
+# a byte to spare over the prime's size, rejected only in the last partial
+# multiple of the prime, then reduced; for PRIME under 1 in 200 draws is wasted.
+# The draws are parsed from one hex conversion and checked one at a time, not
+# vectorized: nearly all of the time goes into making each value a Python int,
+# and a NumPy mask over the bytes, tried for 16 to 100000 values, was no faster
+# while costing a NumPy import.
+ENTROPY_BLOCK_SIZE = 4096
+
+
+class EntropyPool(object):
+    """
+    Buffered source of cryptographically secure random bytes and field elements.
+    Safe to share between threads. After a fork, the child throws away the
+    buffer it inherited, so pool workers never reuse their parent's randomness.
+
+    Given a seed, the bytes come from a seeded random.Random instead, repeating
+    exactly from run to run. That is only for tests and benchmarks; shares made
+    with a seeded pool are not secret.
+
+    Args:
+        blockSize (int): Number of bytes read from the source at a time
+        seed (int): Seed for deterministic output; never for real shares
+    """
+    def __init__(self, blockSize=ENTROPY_BLOCK_SIZE, seed=None):
+        import threading
+        self.blockSize = blockSize
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.buffer = b('')
+        self.pos = 0
+        self.pid = os.getpid()
+        if seed is None:
+            self.source = os.urandom
+        else:
+            seeded = random.Random(seed)
+            self.source = lambda size: numberToRecord(seeded.getrandbits(size * 8), size)
+
+    def randomBytes(self, count):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.buffer = b('')
+                self.pos = 0
+            if len(self.buffer) - self.pos < count:
+                self.buffer = self.buffer[self.pos:] + self.source(max(self.blockSize, count))
+                self.pos = 0
+            data = self.buffer[self.pos:self.pos+count]
+            self.pos += count
+            return data
+
+    def fieldElements(self, count, prime=PRIME):
+        """
+        Returns:
+            list: count values drawn uniformly from 0 up to prime
+        """
+        size = prime.bit_length() // 8 + 1
+        limit = (1 << (size * 8)) // prime * prime
+        values = []
+        while len(values) < count:
+            hexed = codecs.encode(self.randomBytes((count - len(values)) * size), 'hex')
+            for i in range(0, len(hexed), size * 2):
+                v = int(hexed[i:i+size*2], 16)
+                if v < limit:
+                    values.append(v % prime)
+        return values
+
+
+# The pool used for every share; may be replaced, for example by a seeded pool in tests
+entropyPool = EntropyPool()
+
+
 ###############################
 ## Shares and Secrets
 ###############################
 
+# A share deck's number holds x in its top byte, and y in the 216 bits below
+SECRET_MASK = (1 << 216) - 1
+
+# A share as a 28 byte record: the same bytes as the number of its deck, so it
+# converts with recordToNumber and numberToRecord instead of through hex secrets
+SHARE_RECORD = struct.Struct('>B27s')
+
+
+def shareToRecord(share):
+    return SHARE_RECORD.pack(share[0], numberToRecord(share[1], 27))
+
+
+def recordToShare(record):
+    x, y = SHARE_RECORD.unpack(record)
+    return [x, recordToNumber(y)]
+
+
 def shareToSecret(share):
     phex = "{0:0{1}x}".format(share[1], 54)
     return "{0:02x}".format(share[0]) + phex
@@ -433,24 +1299,23 @@ def cardsToSecret(encodedCards):
 
 def hexSecret(secret_num):
     """
-    Secret num to hex differences between Python 2 and 3
+    Secret num to hex, without the L suffix Python 2 gives long numbers
     """
-    pyVer = sys.version_info
-    if pyVer[0] == 3:
-        return hex(secret_num)[2:]
-    else:
-        return hex(secret_num)[2:-1]
+    return "{0:x}".format(secret_num)
 
 ###############################
 ## Converting Messages
 ###############################
 
 def messageToSecrets(msg, thresh=2, total=3):
-    if total > 64:
-        print("FAILURE: Max of 64 decks for secrets. You entered "+str(total)+", which is too many.", file=sys.stderr)
-        sys.exit(1)
-    if len(msg) > 27:
-        print("WARNING: Message length truncated "+str(len(msg)-27)+" chars off the end (27 chars max).", file=sys.stderr)
+    """
+    Splits a message of up to 27 bytes into SSS secrets; a longer message is truncated.
+
+    Raises:
+        ValueError: If total is more than MAX_SHARES
+    """
+    if total > MAX_SHARES:
+        raise ValueError("Max of "+str(MAX_SHARES)+" decks for secrets. You entered "+str(total)+", which is too many")
 
     msg = msg[:27]
     num = messageToNumber(msg)
@@ -473,180 +1338,740 @@ def secretsToMessage(secrets):
     return msg
 
 
-def messageToNumber(msg):
-    msg = msg.rjust(27,b('\0'))
-    hexnum = codecs.encode(msg, 'hex');
-    return int(hexnum,16)
+def messageToShareRecords(msg, thresh=2, total=3):
+    """
+    Splits a message of up to 27 bytes into share records, which give the same
+    decks as the secrets of messageToSecrets; a longer message is truncated.
+
+    Raises:
+        ValueError: If total is more than MAX_SHARES
+    """
+    if total > MAX_SHARES:
+        raise ValueError("Max of "+str(MAX_SHARES)+" decks for secrets. You entered "+str(total)+", which is too many")
+    return [ shareToRecord(s) for s in sssSplit(messageToNumber(msg[:27]), thresh, total) ]
+
 
+def shareRecordsToMessage(records):
+    return numberToMessage(sssJoin([ recordToShare(r) for r in records ]))
 
-def numberToMessage(num):
-    hexnum = b("{0:0{1}x}".format(num, 54))
-    return codecs.decode(hexnum, 'hex').strip(b('\0'))
+
+def checkShareMessage(msg):
+    """
+    Checks that a message comes back unchanged from single deck shares: it must
+    be at most 27 bytes, and not start or end with a null byte, as those are
+    stripped when decrypting.
+
+    Raises:
+        ValueError: If the message would not come back unchanged
+    """
+    if len(msg) > 27:
+        raise ValueError("Message is longer than 27 bytes")
+    if msg.strip(b('\0')) != msg:
+        raise ValueError("Message starts or ends with a null byte, which would be lost; use packing to keep it")
+
+
+def messageToNumber(msg, size=27):
+    return recordToNumber(msg.rjust(size, b('\0')))
+
+
+def numberToMessage(num, size=27):
+    # whole bytes only; a 28 byte message can start with a zero nibble
+    size = max(size, (num.bit_length() + 7) // 8)
+    return numberToRecord(num, size).strip(b('\0'))
+
+
+if hasattr(int, 'from_bytes'):
+    def recordToNumber(record):
+        """
+        Converts a fixed length byte record to a number, keeping any null bytes.
+        """
+        return int.from_bytes(record, 'big')
+
+    def numberToRecord(num, size=28):
+        """
+        Converts a number back into a byte record of exactly size bytes.
+        """
+        if num >> (size * 8):
+            raise ValueError("Number does not fit in a "+str(size)+" byte record")
+        return num.to_bytes(size, 'big')
+else:
+    # Python 2 has no int.from_bytes, so records go through hex
+    def recordToNumber(record):
+        """
+        Converts a fixed length byte record to a number, keeping any null bytes.
+        """
+        if not record:
+            return 0
+        return int(codecs.encode(record, 'hex'), 16)
+
+    def numberToRecord(num, size=28):
+        """
+        Converts a number back into a byte record of exactly size bytes.
+        """
+        if num >> (size * 8):
+            raise ValueError("Number does not fit in a "+str(size)+" byte record")
+        if size == 0:
+            return b('')
+        return codecs.decode(b("{0:0{1}x}".format(num, size * 2)), 'hex')
 
 
 ###############################
 ## Cards as Numbers
 ###############################
 
-def compat_translate(s):
+# Card identifiers by card number; clubs, diamonds, hearts then spades
+SUITS = "CDHS"
+RANKS = ("A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K")
+CARD_NAMES = tuple([ rank + suit for suit in SUITS for rank in RANKS ])
+
+# Card identifiers as bytes followed by a space or a tab, for formatted output
+CARD_TOKENS = tuple([ b(name + " ") for name in CARD_NAMES ])
+CARD_CELLS = tuple([ b(name + "\t") for name in CARD_NAMES ])
+
+# Other ways of writing each rank that are accepted as input
+RANK_ALIASES = { "A": ("1",), "10": ("T",), "J": ("11",), "Q": ("12",), "K": ("13",) }
+
+# Characters allowed between the rank and suit of a card, and dropped when parsing
+CARD_PUNCTUATION = ".-_:'"
+
+# Iterating over bytes gives numbers in Python 3, but 1 character strings in Python 2
+byteValues = bytes if sys.version_info[0] >= 3 else bytearray
+
+
+if sys.version_info[0] == 2:
+    def compat_translate(s):
+        """
+        Compatability function to support Python 2 and 3.1 style tranlate functions
+        """
+        return s.translate(None, CARD_PUNCTUATION)
+else:
+    PUNCTUATION_TABLE = str.maketrans('', '', CARD_PUNCTUATION)
+
+    def compat_translate(s):
+        """
+        Compatability function to support Python 2 and 3.1 style tranlate functions
+        """
+        return s.translate(PUNCTUATION_TABLE)
+
+
+def buildCardLookup():
     """
-    Compatability function to support Python 2 and 3.1 style tranlate functions
+    Maps every accepted way of writing a card, upper case and without punctuation,
+    to its card number. The rank may come before or after the suit, and numeric
+    ranks may have a leading zero.
     """
-    pyVer = sys.version_info
-    if pyVer[0] == 3 and pyVer[1] >= 1:
-        return s.translate(str.maketrans('','',".-_:'"))
-    else:
-        return s.translate(None,".-_:'")
+    lookup = {}
+    for num in range(0, 52):
+        rank = RANKS[num % 13]
+        suit = SUITS[num // 13]
+        for r in (rank,) + RANK_ALIASES.get(rank, ()):
+            spellings = (r, "0" + r) if r.isdigit() else (r,)
+            for s in spellings:
+                lookup[s + suit] = num
+                lookup[suit + s] = num
+    return lookup
+
+CARD_LOOKUP = buildCardLookup()
+
+# Bit for each card number, and the mask of a full deck with every bit set
+CARD_BITS = tuple([ 1 << num for num in range(0, 52) ])
+FULL_DECK_MASK = (1 << 52) - 1
+
+
+class DeckParseError(ValueError):
+    """
+    Raised when card identifiers do not make up a deck. As well as the message,
+    holds the reason alone, the card identifier at fault (None if the deck is
+    simply short or long) and the line number the deck was read from, if known.
+    """
+    def __init__(self, reason, card=None, line=None):
+        ValueError.__init__(self, reason if line is None else "Line "+str(line)+": "+reason)
+        self.reason = reason
+        self.card = card
+        self.line = line
+
+
+def stringToDeck(cstr):
+    """
+    Parses a full deck from a string of space separated card identifiers.
+
+    Raises:
+        ValueError: If a card is invalid or repeated, or the deck is not complete
+    """
+    return list(Deck.fromString(cstr))
+
+
+def parseCardNumbers(cstr):
+    """
+    Parses a full deck from a string of space separated card identifiers. Valid
+    decks take one table lookup per card and a check of the 52 bit mask of the
+    cards; only a deck that fails is gone through again card by card, to allow
+    punctuation in identifiers and to find which card is at fault.
+
+    Returns:
+        list: The 52 card numbers, in the order given
+
+    Raises:
+        DeckParseError: If a card is invalid or repeated, or the deck is not complete
+    """
+    tokens = cstr.upper().split()
+    nums = list(map(CARD_LOOKUP.get, tokens))
+    # a sum of 52 card bits only makes the full mask if no card is repeated
+    if len(nums) == 52 and None not in nums and sum(map(CARD_BITS.__getitem__, nums)) == FULL_DECK_MASK:
+        return nums
+
+    nums = []
+    seen = 0
+    for cl in tokens:
+        cnum = CARD_LOOKUP.get(cl)
+        if cnum is None:
+            cnum = CARD_LOOKUP.get(compat_translate(cl))
+            if cnum is None:
+                raise DeckParseError("Could not parse "+cl+" as a card", cl)
+        if seen & CARD_BITS[cnum]:
+            raise DeckParseError("Duplicate card "+CARD_NAMES[cnum], cl)
+        seen |= CARD_BITS[cnum]
+        nums.append(cnum)
+    if len(nums) != 52:
+        raise DeckParseError("A deck requires 52 cards, but "+str(len(nums))+" were provided")
+    return nums
 
 
 def numberToCard(num):
     if num > 51 or num < 0:
-        print("FAILURE: Invalid card number: "+str(num), file=sys.stderr)
-        sys.exit(1)
-
-    nsuit = num // 13
-    suit = "C"
-    if (nsuit == 1):
-        suit = "D"
-    elif (nsuit == 2):
-        suit = "H"
-    elif (nsuit == 3):
-        suit = "S"
-
-    card = str((num % 13) + 1)
-    if (card == "1"):
-        card = "A"
-    elif (card == "11"):
-        card = "J"
-    elif (card == "12"):
-        card = "Q"
-    elif (card == "13"):
-        card = "K"
-
-    return card + suit
+        raise ValueError("Invalid card number: "+str(num))
+    return CARD_NAMES[num]
 
 
 def cardToNumber(cstr):
-    cstr = compat_translate( cstr.upper().strip() )
-    suit = ""
-    card = ""
-    if (cstr[0] in "CDHS"):
-        suit = cstr[0]
-        card = cstr[1:]
-    elif (cstr[-1] in "CDHS"):
-        suit = cstr[-1]
-        card = cstr[:-1]
-
-    nsuit = 0;
-    if (suit == "D"):
-        nsuit = 1
-    elif (suit == "H"):
-        nsuit = 2
-    elif (suit == "S"):
-        nsuit = 3
-
-    ncard = -1
-    if (card == "A"):
-        card = "1"
-    elif (card == "T"):
-        card = "10"
-    elif (card == "J"):
-        card = "11"
-    elif (card == "Q"):
-        card = "12"
-    elif (card == "K"):
-        card = "13"
-
-    if (card.isdigit()):
-        ncard = int(card) - 1
-        if ncard < 0 or ncard > 12:
-            ncard = -1
-
-    num = None
-    if ncard == -1 or suit == "":
-        print("FAILURE: Invalid card "+cstr, file=sys.stdout)
-    else:
-        num = (nsuit * 13) + ncard
-
+    """
+    Returns the card number of a card identifier, or None if it is not a card.
+    """
+    cstr = cstr.upper().strip()
+    num = CARD_LOOKUP.get(cstr)
+    if num is None:
+        num = CARD_LOOKUP.get(compat_translate(cstr))
     return num
 
 
 ###############################
-## Encoding Data into Decks
+## Permutation Rank/Unrank
 ###############################
 
-def swap(l, p1, p2):
-    t = l[p1]
-    l[p1] = l[p2]
-    l[p2] = t
-    return l
+# Place values of the factorial number system; FACTORIALS[v] is v!
+FACTORIALS = [math.factorial(v) for v in range(0, 53)]
 
 
-def swapLeft(l, v, n):
-    for x in range(0,n):
-        i1 = l.index(v)
-        i2 = i1 - 1
-        if i2 < 0:
-            i2 = len(l) - 1;
-        l = swap(l, i1, i2)
-    return l
+def numberToDigits(number, size):
+    """
+    Splits a number into factorial base digits. Digit v has a place value of v!
+    and ranges from 0 to v, so digit 0 is always 0.
 
+    Args:
+        number (int): A value from 0 up to (but not including) size!
+        size (int): Number of digits to produce
 
-def swapRight(l, v, n):
-    for x in range(0,n):
-        i1 = l.index(v)
-        i2 = i1 + 1
-        if i2 >= len(l):
-            i2 = 0;
-        l = swap(l, i1, i2)
-    return l
+    Returns:
+        list: The digits, least significant first
+    """
+    if number < 0:
+        raise ValueError("Cannot encode a negative number")
+    digits = [0] * size
+    for v in range(1, size):
+        number, digits[v] = divmod(number, v + 1)
+    if number:
+        raise ValueError("Number is too large to fit into "+str(size)+" cards")
+    return digits
+
+
+def digitsToNumber(digits):
+    """
+    Combines factorial base digits (least significant first) back into a number.
+    """
+    extendFactorials(len(digits))
+    number = 0
+    for v in range(1, len(digits)):
+        number += digits[v] * FACTORIALS[v]
+    return number
+
+
+def extendFactorials(size):
+    """
+    Adds place values to FACTORIALS until it covers permutations of size values.
+    """
+    while len(FACTORIALS) <= size:
+        FACTORIALS.append(FACTORIALS[-1] * len(FACTORIALS))
+
+
+def unrankPermutation(number, size):
+    """
+    Builds the permutation of 0 through size-1 whose Lehmer code is the factorial
+    base representation of number. The digit for value v counts how many smaller
+    values sit to the right of v.
+
+    Values are placed largest first, each one into the free slot that leaves
+    exactly its digit worth of free slots to its right. A Fenwick tree counting
+    the free slots finds that slot in O(log size).
+    """
+    digits = numberToDigits(number, size)
+
+    # Fenwick tree over slots 1..size with every slot free
+    tree = [0] * (size + 1)
+    for i in range(1, size + 1):
+        tree[i] = i & -i
+    top = 1
+    while top * 2 <= size:
+        top *= 2
+
+    perm = [0] * size
+    for v in range(size - 1, -1, -1):
+        # find the (v - digit + 1)th free slot by binary lifting
+        want = v - digits[v] + 1
+        pos = 0
+        step = top
+        while step:
+            nxt = pos + step
+            if nxt <= size and tree[nxt] < want:
+                pos = nxt
+                want -= tree[nxt]
+            step //= 2
+        perm[pos] = v
+
+        # mark slot as used
+        i = pos + 1
+        while i <= size:
+            tree[i] -= 1
+            i += i & -i
+
+    return perm
+
+
+def rankPermutation(perm):
+    """
+    Inverse of unrankPermutation; computes the number for a permutation of
+    0 through len(perm)-1 by walking it right to left and counting the smaller
+    values already seen with a Fenwick tree.
+    """
+    size = len(perm)
+    if size >= len(FACTORIALS):
+        extendFactorials(size)
+    tree = [0] * (size + 1)
+    seen = 0
+    number = 0
+    for pos in range(size - 1, -1, -1):
+        v = perm[pos]
+        if v < 0 or v >= size or (seen >> v) & 1:
+            raise ValueError("Not a permutation of "+str(size)+" values")
+        seen |= 1 << v
+
+        # count smaller values to the right
+        smaller = 0
+        i = v
+        while i > 0:
+            smaller += tree[i]
+            i -= i & -i
+        number += smaller * FACTORIALS[v]
+
+        i = v + 1
+        while i <= size:
+            tree[i] += 1
+            i += i & -i
+
+    return number
+
+
+###############################
+## Encoding Data into Decks
+###############################
 
+# Decks are stored as a Lehmer coded permutation that is rotated by one position
+# and one card value from the deck as printed. This keeps the numbering identical
+# to the original card swapping encoder, where card c was moved left by its
+# factorial digit and the last card wrapped around to the front.
 
 def encodeNumberToCards(number):
-    cardList = range(0,52)
-    # card values
-    cv = []
-    for i,c in reversed(list(enumerate(cardList))):
-        cv.append( (c, math.factorial(i+1)) )
-
-    # generate encoding instructions
-    instr = []
-    i = len(cv)
-    cn = number
-    for c,v in cv:
-        instr.append( (c, cn // v) )
-        cn = cn - (cn // v) * v
-        i = i - 1
-    instr.reverse()
-
-    # encode number in cards
-    ec = list(cardList)
-    for cmd in instr:
-        crd, cnt = cmd
-        ec = swapLeft(ec, crd, cnt)
-
-    return ec
+    """
+    Converts a number from 0 up to 52! into a deck of cards.
+
+    Returns:
+        list: A deck, which is a list of 52 unique numbers (0 - 51)
+    """
+    perm = unrankPermutation(number, 52)
+    return [ (perm[(p + 1) % 52] + 51) % 52 for p in range(0, 52) ]
 
 
 def decodeCardsToNumber(encodedCards):
-    cardList = range(0,52)
-    # card values
-    cv = []
-    for i,c in reversed(list(enumerate(cardList))):
-        cv.append( (c, math.factorial(i+1)) )
-    cv.pop(0)
-
-    # decode cards to extract number
-    xnum = 0
-    es = list(encodedCards)
-    i = len(cv)
-    for c,v in cv:
-        i = i - 1
-        while es[i] != c:
-            es = swapRight(es, c, 1)
-            xnum = xnum + v
-
-    return xnum
+    """
+    Converts a deck of cards back into the number it encodes.
+
+    Args:
+        encodedCards (list): A deck, which is a list of 52 unique numbers (0 - 51)
+    """
+    if len(encodedCards) != 52:
+        raise ValueError("A deck requires 52 cards")
+    perm = [0] * 52
+    for p, card in enumerate(encodedCards):
+        perm[(p + 1) % 52] = (card + 1) % 52
+    return rankPermutation(perm)
+
+
+class DeckDecoder(object):
+    """
+    Decodes a deck one card at a time as it is entered, so that its number is ready
+    as soon as the last card is in. Iterating a DeckDecoder gives the cards entered
+    so far, so a full one can be used anywhere a deck is expected.
+
+    Cards are ranked left to right. The digit of each new card's value is how many
+    smaller values come after it, which is its value less the smaller values
+    already entered, counted in a bitmask of the values entered. That leaves out the
+    last card, which wraps around to the front of the permutation
+    decodeCardsToNumber ranks, so it takes back one weight from every larger value
+    and adds its own digit, its value. Each card's contribution is kept on a stack,
+    so undo just pops it.
+
+    Args:
+        cards (list): Cards to start with
+        size (int): Number of cards in a full deck, for decks of a DeckModel
+
+    Attributes:
+        number (int): The number the cards so far add up to; the deck's number once
+            all of its cards are in
+    """
+    __slots__ = ('size', 'cards', 'number', 'used', 'values', 'larger', 'steps')
+
+    def __init__(self, cards=(), size=52):
+        extendFactorials(size)
+        self.size = size
+        self.cards = []
+        self.number = 0
+        self.used = 0
+        self.values = 0
+        # larger[v] is the sum of the weights of every value above v
+        self.larger = [0] * size
+        for v in range(size - 2, -1, -1):
+            self.larger[v] = self.larger[v + 1] + FACTORIALS[v + 1]
+        self.steps = []
+        for card in cards:
+            self.add(card)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __contains__(self, card):
+        return 0 <= card < self.size and (self.used >> card) & 1 == 1
+
+    def add(self, card):
+        """
+        Adds the next card of the deck.
+
+        Raises:
+            ValueError: If card is not a card number, or is already in the deck
+        """
+        size = self.size
+        if not 0 <= card < size or (self.used >> card) & 1:
+            raise ValueError("Card "+str(card)+" is not a card missing from the deck")
+        value = (card + 1) % size
+        if len(self.cards) == size - 1:
+            step = value * FACTORIALS[value] - self.larger[value]
+        else:
+            smaller = bin(self.values & ((1 << value) - 1)).count('1')
+            step = (value - smaller) * FACTORIALS[value]
+        self.number += step
+        self.used |= 1 << card
+        self.values |= 1 << value
+        self.steps.append(step)
+        self.cards.append(card)
+
+    def undo(self):
+        """
+        Removes the last card entered, if any, popping the contribution recorded
+        for it.
+        """
+        if not self.cards:
+            return
+        card = self.cards.pop()
+        self.number -= self.steps.pop()
+        self.used ^= 1 << card
+        self.values ^= 1 << ((card + 1) % self.size)
+
+
+###############################
+## Decks
+###############################
+
+# Every card number as a byte, for checking that a deck only holds valid cards
+CARD_BYTES = bytes(bytearray(range(0, 52)))
+
+
+class Deck(object):
+    """
+    A deck of cards held as 52 bytes, one card number per byte in deck order.
+    Iterating a Deck gives the card numbers, so it can be used anywhere a list of
+    card numbers is expected. Decks compare and hash by their cards, and print as
+    their card identifiers.
+
+    Args:
+        cards: Card numbers as a list, bytes or bytearray
+
+    Raises:
+        ValueError: If the cards are not each of the 52 cards exactly once
+    """
+    __slots__ = ('cards',)
+
+    def __init__(self, cards):
+        cards = bytes(bytearray(cards))
+        if len(cards) != 52 or cards.translate(None, CARD_BYTES) or len(set(cards)) != 52:
+            raise ValueError("A deck must hold each of the 52 cards exactly once")
+        self.cards = cards
+
+    @classmethod
+    def fromNumber(cls, number):
+        return cls(encodeNumberToCards(number))
+
+    @classmethod
+    def fromString(cls, cstr):
+        """
+        Parses a deck from space separated card identifiers.
+
+        Raises:
+            DeckParseError: If a card is invalid or repeated, or the deck is not complete
+        """
+        deck = cls.__new__(cls)
+        deck.cards = bytes(bytearray(parseCardNumbers(cstr)))
+        return deck
+
+    def toNumber(self):
+        return decodeCardsToNumber(byteValues(self.cards))
+
+    def __iter__(self):
+        return iter(byteValues(self.cards))
+
+    def __len__(self):
+        return 52
+
+    def __getitem__(self, index):
+        return byteValues(self.cards)[index]
+
+    def __eq__(self, other):
+        return isinstance(other, Deck) and self.cards == other.cards
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.cards)
+
+    def __str__(self):
+        return " ".join([ CARD_NAMES[c] for c in byteValues(self.cards) ])
+
+    def __repr__(self):
+        return "Deck('" + str(self) + "')"
+
+
+###############################
+## Library API
+###############################
+
+# Modules holding the features beyond single decks and plain SSS, each imported
+# the first time it is needed. Their names are also attributes of this module.
+FEATURE_MODULES = ("scs28_stream", "scs28_packing", "scs28_archive", "scs28_batch",
+    "scs28_packed", "scs28_robust", "scs28_gf256", "scs28_erasure", "scs28_hybrid",
+    "scs28_models", "scs28_plan", "scs28_numpy", "scs28_profile")
+
+
+def featureModules():
+    """
+    Imports every feature module, and returns them in FEATURE_MODULES order.
+    """
+    import importlib
+    return [ importlib.import_module(name) for name in FEATURE_MODULES ]
+
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        """
+        Looks up a name that is not in this module in the feature modules, so that
+        scs28.DeckArchive and the like keep working, importing them as needed.
+        """
+        if not name.startswith('__'):
+            import importlib
+            for modname in FEATURE_MODULES:
+                namespace = vars(importlib.import_module(modname))
+                if name in namespace:
+                    return namespace[name]
+        raise AttributeError("module 'scs28' has no attribute '" + name + "'")
+else:
+    # without module __getattr__, the feature modules are all imported up front
+    for featureModule in featureModules():
+        for featureName, featureValue in vars(featureModule).items():
+            if not featureName.startswith('_'):
+                globals().setdefault(featureName, featureValue)
+    del featureModule, featureName, featureValue
+
+
+class Codec(object):
+    """
+    Converts messages, numbers and card text to and from Decks, for use from other
+    Python code. Holds the card tables it parses and formats with. Problems are
+    raised as ValueError, or its subclass DeckParseError for card text, instead
+    of being printed.
+    """
+    names = CARD_NAMES
+    lookup = CARD_LOOKUP
+    factorials = FACTORIALS
+
+    def encode(self, msg):
+        """
+        Encodes a message of up to 28 bytes into a Deck.
+        """
+        if len(msg) > 28:
+            raise ValueError("Message is longer than 28 bytes")
+        return Deck(encodeNumberToCards(messageToNumber(msg)))
+
+    def decode(self, deck):
+        """
+        Decodes the message held by a deck; trailing and leading null bytes are dropped.
+        """
+        return numberToMessage(decodeCardsToNumber(deck))
+
+    def encodeNumber(self, number):
+        return Deck(encodeNumberToCards(number))
+
+    def decodeNumber(self, deck):
+        return decodeCardsToNumber(deck)
+
+    def parse(self, text):
+        """
+        Parses a Deck from space separated card identifiers.
+        """
+        return Deck.fromString(text)
+
+    def format(self, deck):
+        """
+        Returns the space separated card identifiers of a deck.
+        """
+        return " ".join(map(self.names.__getitem__, deck))
+
+    def encodeStream(self, data, packed=False, erasure=None):
+        """
+        Encodes bytes of any length into a list of Decks; numbered stream decks,
+        or the fewest possible decks if packed. An erasure pair of (data, parity)
+        deck counts adds parity decks to a numbered stream.
+        """
+        import io
+        if erasure:
+            from scs28_erasure import erasureStreamToDecks
+            return [ Deck(d) for d in erasureStreamToDecks(io.BytesIO(data), *erasure) ]
+        from scs28_packing import packedStreamToDecks
+        from scs28_stream import streamToDecks
+        encode = packedStreamToDecks if packed else streamToDecks
+        return [ Deck(d) for d in encode(io.BytesIO(data)) ]
+
+    def decodeStream(self, decks, packed=False, erasure=False):
+        """
+        Inverse of encodeStream; packed decks must be in order. With erasure, lost
+        decks of a numbered stream are rebuilt from its parity decks.
+        """
+        if erasure:
+            from scs28_erasure import erasureDecksToStream
+            return b('').join(erasureDecksToStream(decks))
+        from scs28_packing import packedDecksToStream
+        from scs28_stream import decksToStream
+        decode = packedDecksToStream if packed else decksToStream
+        return b('').join(decode(decks))
+
+
+class SecretSharer(object):
+    """
+    Encrypts messages into decks with Shamir's Secret Sharing and decrypts them,
+    for use from other Python code. Messages hold up to 27 bytes, or any length
+    with packed SSS, which hides pack blocks of 27 bytes in each deck, with
+    byte-wise sharing over GF(256), or in hybrid mode, which shares only a key.
+
+    Args:
+        thresh (int): Number of shares needed to decrypt, from 2 to total; any
+            fewer reveal nothing
+        total (int): Number of shares made; up to MAX_SHARES, or MAX_PACKED_SHARES when packed
+        pack (int): Blocks per deck for packed SSS, which then needs thresh+pack-1
+            shares to decrypt; at most total-thresh+1
+        bytewise (bool): Share each byte over GF(256) instead; cannot be packed
+        hybrid (bool): Encrypt under a key and share only the key instead; cannot
+            be packed or byte-wise
+
+    Raises:
+        ValueError: If the threshold, share count or packing are out of range
+    """
+    def __init__(self, thresh, total, pack=None, bytewise=False, hybrid=False):
+        from scs28_packed import MAX_PACKED_SHARES
+        if thresh < 2 or thresh > total:
+            raise ValueError("The threshold must be at least 2 and no more than the number of shares")
+        if total > (MAX_PACKED_SHARES if pack else MAX_SHARES):
+            raise ValueError("Too many shares; the maximum is "+str(MAX_PACKED_SHARES if pack else MAX_SHARES))
+        if pack is not None and not (1 <= pack <= total - thresh + 1):
+            raise ValueError("The packing must be at least 1, with the threshold plus the packing minus 1 no more than the number of shares")
+        if pack and bytewise:
+            raise ValueError("Byte-wise sharing cannot be packed")
+        if hybrid and (pack or bytewise or thresh > MAX_ERASURE_DATA):
+            raise ValueError("Hybrid mode cannot be packed or byte-wise, and allows a threshold of at most "+str(MAX_ERASURE_DATA))
+        self.thresh = thresh
+        self.total = total
+        self.pack = pack
+        self.bytewise = bytewise
+        self.hybrid = hybrid
+
+    def split(self, msg):
+        """
+        Encrypts a message into shares.
+
+        Returns:
+            list: For each share, the list of its Decks in order; only one deck unless
+                packed, byte-wise or hybrid
+        """
+        if self.pack or self.bytewise or self.hybrid:
+            from scs28_gf256 import messageToBytewiseShares
+            from scs28_hybrid import messageToHybridShares
+            from scs28_packed import messageToPackedShares
+            if self.hybrid:
+                shares = messageToHybridShares(msg, self.thresh, self.total)
+            elif self.bytewise:
+                shares = messageToBytewiseShares(msg, self.thresh, self.total)
+            else:
+                shares = messageToPackedShares(msg, self.thresh, self.total, self.pack)
+            return [ [ Deck(encodeNumberToCards(n)) for n in nums ] for nums in shares ]
+        checkShareMessage(msg)
+        return [ [ Deck.fromNumber(recordToNumber(r)) ] for r in messageToShareRecords(msg, self.thresh, self.total) ]
+
+    def join(self, shares):
+        """
+        Decrypts a message from at least thresh shares, or thresh+pack-1 when
+        packed, each given as a Deck or a list of decks as returned by split.
+        Shares beyond that are used to find and leave out bad ones.
+        """
+        return self.joinRobust(shares)[0]
+
+    def joinRobust(self, shares):
+        """
+        Like join, but also returns the sorted indexes of the shares that did not
+        agree with the rest and were left out. Byte-wise shares are not checked.
+        """
+        shares = [ [s] if isinstance(s, Deck) else list(s) for s in shares ]
+        need = self.thresh + (self.pack - 1 if self.pack else 0)
+        if len(shares) < need:
+            raise ValueError(str(need)+" shares are required, but "+str(len(shares))+" were provided")
+        from scs28_gf256 import bytewiseSharesToMessage
+        from scs28_hybrid import hybridSharesToMessage
+        from scs28_packed import sharedDecksToMessage
+        from scs28_robust import robustSharedDecksToMessage
+        if self.bytewise:
+            return bytewiseSharesToMessage([ [ decodeCardsToNumber(d) for d in decks ] for decks in shares ]), []
+        if self.hybrid:
+            return hybridSharesToMessage([ [ decodeCardsToNumber(d) for d in decks ] for decks in shares ], self.thresh)
+        if len(shares) == need:
+            return sharedDecksToMessage(shares), []
+        return robustSharedDecksToMessage(shares, need)
 
 
 ###############################
@@ -657,6 +2082,20 @@ def test():
     """
     Perform a quick test to make sure everything works.
     """
+    from scs28_archive import DeckArchive, decodeArchive
+    from scs28_batch import batchDecryptRecord, batchEncryptRecord
+    from scs28_erasure import erasureDecksToStream, erasureStreamToDecks
+    from scs28_gf256 import (bytewiseNumberHasMore, bytewiseSharesToMessage, gf256Join,
+        gf256Split, messageToBytewiseShares)
+    from scs28_hybrid import hybridSharesToMessage, messageToHybridShares
+    from scs28_models import deckModel
+    from scs28_packed import messageToPackedShares, packedSharesToMessage
+    from scs28_packing import packedDecksToStream, packedStreamToDecks
+    from scs28_plan import describePlan, followPlan, planStacking
+    from scs28_profile import PROFILE_LOCK, StageProfiler
+    from scs28_robust import robustSharedDecksToMessage
+    from scs28_stream import decksToStream, framesToStream, streamToDecks
+
     message = b("Super Card Shuffle 28!")
 
     print("Encoding message: ", message)
@@ -664,6 +2103,200 @@ def test():
     deck = encodeNumberToCards(mnum)
     xnum = decodeCardsToNumber(deck)
     print("Decoded message:", numberToMessage(xnum))
+    print("Deck parsing ok:", Deck.fromString(deckToString(deck)) == Deck(deck))
+    lines = [ deckToString(deck), "", deckToString(deck[1:] + deck[:1]), deckToString(deck[:51] + deck[:1]) ]
+    results = [ (l, m, e and e.card) for l, m, e in decodeDeckLines(lines) ]
+    print("Deck lines ok:", results[0] == (1, message, None) and results[1][2] is None and results[2] == (4, None, CARD_NAMES[deck[0]]))
+
+    try:
+        import numpy
+    except ImportError:
+        print("Batch encoding skipped; NumPy is not installed")
+    else:
+        from scs28_numpy import decodeDecksToMessages, encodeMessagesToDecks
+        bdecks = encodeMessagesToDecks([message, b("")])
+        print("Batch encoding ok:", list(bdecks[0]) == deck and decodeDecksToMessages(bdecks) == [message, b("")])
+
+    import io
+    sdata = message * 5
+    sdecks = list(streamToDecks(io.BytesIO(sdata)))
+    sdecks.reverse()
+    print("Stream of", len(sdecks), "decks ok:", b('').join(decksToStream(sdecks)) == sdata)
+    pdecks = list(packedStreamToDecks(io.BytesIO(sdata)))
+    print("Packed into", len(pdecks), "decks ok:", b('').join(packedDecksToStream(pdecks)) == sdata)
+    pshares = messageToPackedShares(sdata, 3, 5, 2)
+    print("Packed SSS into", len(pshares[0]), "decks per share ok:", packedSharesToMessage(pshares[1:]) == sdata)
+    rshares = [ [ secretToCards(sec) ] for sec in messageToSecrets(message, 2, 5) ]
+    rshares[3][0][-2:] = rshares[3][0][:-3:-1]
+    print("Robust decrypt ok:", robustSharedDecksToMessage(rshares, 2) == (message, [3]))
+    entered = DeckDecoder(rshares[0][0][:40])
+    entered.undo()
+    for card in rshares[0][0][39:]:
+        entered.add(card)
+    shoe = deckModel("shoe2")
+    print("Deck models ok:", deckModel("standard").messageToCards(message) == encodeNumberToCards(messageToNumber(message))
+        and shoe.cardsToMessage(shoe.parseCards(shoe.cardsToString(shoe.messageToCards(sdata[:68])))) == sdata[:68]
+        and shoe.cardsToMessage(shoe.messageToCards(b('\0ab\0'))) == numberToMessage(messageToNumber(b('\0ab\0')))
+        and deckModel("jokers").capacity == 29 and DeckDecoder(shoe.numberToCards(12345), 104).number == 12345)
+    seconds, steps = planStacking(rshares[1][0], rshares[0][0])
+    print("Stacking plan ok:", followPlan(steps, rshares[0][0]) == rshares[1][0] and len(describePlan(steps)) == len(steps)
+        and planStacking(list(range(0, 52)))[1] == [("take", list(range(0, 52)), None)])
+    print("Incremental decode ok:", entered.number == decodeCardsToNumber(rshares[0][0]) and rshares[0][0][7] in entered)
+    bshares = messageToBytewiseShares(sdata, 3, 5)
+    print("Byte-wise SSS ok:", bytewiseSharesToMessage(bshares[::-2]) == sdata
+        and gf256Join(gf256Split(b(''), 2, 2)) == b('') and not bytewiseNumberHasMore(bshares[0][-1]))
+    hshares = messageToHybridShares(sdata, 3, 5)
+    hshares[0][0] ^= 1
+    print("Hybrid encryption ok:", hybridSharesToMessage(hshares, 3) == (sdata, [0])
+        and hybridSharesToMessage(hshares[2:], 3)[0] == sdata and len(hshares[4]) < len(bshares[4]))
+    values = EntropyPool(seed=28).fieldElements(100)
+    print("Entropy pool ok:", values == EntropyPool(seed=28).fieldElements(100)
+        and len(set(values + entropyPool.fieldElements(100))) == 200 and max(values) < PRIME)
+    edecks = list(erasureStreamToDecks(io.BytesIO(sdata), 4, 2))
+    print("Erasure coded into", len(edecks), "decks ok:", b('').join(decksToStream(edecks)) == sdata
+        and b('').join(erasureDecksToStream(edecks[:1:-1])) == sdata)
+
+    outputs = []
+    for fmt in sorted(OUTPUT_FORMATS):
+        out = io.BytesIO()
+        with OUTPUT_FORMATS[fmt](out) as formatter:
+            formatter.write([ deck, Deck(deck) ])
+        outputs.append(out.getvalue())
+    print("Output formats ok:", outputs[0] == bytes(bytearray(deck)) * 2
+        and outputs[1] == b(deckToString(deck).replace(" ", ",") + "\n") * 2
+        and outputs[3] == b(deckToString(deck) + " \n") * 2 and len(outputs[4].splitlines()) == 52)
+
+    codec = Codec()
+    sharer = SecretSharer(3, 5)
+    shares = sharer.split(message)
+    nulls = batchEncryptRecord({ 'message_hex': '00ff10' }, 2, 3)
+    packed = batchEncryptRecord({ 'message_hex': '00ff1000' }, 2, 3, 1)
+    print("Batch hex ok:", 'error' in nulls and batchDecryptRecord(packed, 2) == { 'message_hex': '00ff1000' }
+        and batchDecryptRecord(batchEncryptRecord({ 'message_hex': 'ff10' }, 2, 3), 2) == { 'message_hex': 'ff10' })
+    print("Library API ok:", codec.decode(codec.parse(codec.format(codec.encode(message)))) == message
+        and sharer.join(shares[1:4]) == message and codec.decodeStream(codec.encodeStream(sdata, True), True) == sdata)
+
+    original = sssJoin
+    hooked = []
+    with StageProfiler() as profiler:
+        profiler.addHook(lambda stage, name, seconds: hooked.append(name))
+        cardsToSecret(secretToCards(shareToSecret([1, mnum])))
+    report = profiler.report()
+    try:
+        with StageProfiler():
+            sssJoin([])
+    except IndexError:
+        pass
+    print("Profiling ok:", sssJoin is original and report["functions"]["secretToCards"]["calls"] == 1
+        and report["stages"]["rank"]["calls"] == 2 and hooked[-1] == "cardsToSecret" and PROFILE_LOCK.acquire(False))
+    PROFILE_LOCK.release()
+
+    # archives and files for the command line go in a directory removed after
+    import shutil
+    import tempfile
+    tdir = tempfile.mkdtemp()
+    try:
+        apath = os.path.join(tdir, 'test.arc')
+        writeDecks(sdecks, apath, ranks=True, index=True)
+        archive = DeckArchive(apath)
+        print("Archive of", len(archive), "decks ok:", list(archive) == [ Deck(d) for d in sdecks ] and archive.find(sdecks[2]) == 2)
+        archive.close()
+        parallel = list(decodeArchive(apath, "1:", workers=2, chunkDecks=2, window=2))
+        print("Parallel archive decoding ok:", parallel == [ decodeCardsToNumber(d) for d in sdecks[1:] ]
+            and b('').join(framesToStream(decodeArchive(apath, workers=2, chunkDecks=3))) == sdata)
+
+        # binary files must come back unchanged through the command line
+        import subprocess
+        bpath = os.path.join(tdir, 'message.bin')
+        with open(bpath, 'wb') as outfile:
+            outfile.write(b('\0') + bytes(bytearray(range(256))) * 2 + b('\n\0'))
+        roundTrips = []
+        for flags in (['-k', '2'], ['--bytewise'], ['--hybrid']):
+            run = [ sys.executable, os.path.abspath(__file__), '-q', '-t', '3' ] + flags
+            proc = subprocess.Popen(run + ['-E', '-n', '4', '-f', bpath], stdout=subprocess.PIPE)
+            shares = proc.communicate()[0]
+            proc = subprocess.Popen(run + ['-D'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            roundTrips.append(proc.communicate(shares)[0])
+        with open(bpath, 'rb') as infile:
+            print("Binary file round trip ok:", roundTrips == [infile.read()] * 3)
+
+        # decoded lines are written as the bytes of each message, on Python 3 too
+        lpath = os.path.join(tdir, 'decks.txt')
+        with open(lpath, 'w') as outfile:
+            outfile.write('\n'.join([ deckToString(d) for d in sdecks ]) + '\n')
+        expected = b('').join([ numberToMessage(decodeCardsToNumber(d)) + b('\n') for d in sdecks ])
+        outputs = []
+        for flags in (['-l', '-f', lpath], ['-a', apath]):
+            proc = subprocess.Popen([ sys.executable, os.path.abspath(__file__), '-d' ] + flags, stdout=subprocess.PIPE)
+            outputs.append(proc.communicate()[0])
+        print("Decoded lines ok:", outputs == [expected] * 2)
+
+        # bad archives and ranges fail with a message, not a traceback
+        failures = []
+        for flags in (['--range', '2:1'], ['--range', '0:' + str(len(sdecks) + 1)], ['--range=-1:']):
+            failures.append(['-d', '-a', apath] + flags)
+        failures += [ ['-d', '-a', bpath], ['-d', '-a', os.path.join(tdir, 'missing.arc')], ['-D', '-a', bpath] ]
+        errors = []
+        for flags in failures:
+            proc = subprocess.Popen([ sys.executable, os.path.abspath(__file__) ] + flags, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            out, err = proc.communicate()
+            errors.append(proc.returncode == 1 and not out and err.startswith(b('FAILURE:')) and b('Traceback') not in err)
+        try:
+            list(decodeArchive(apath, "2:" + str(len(sdecks) + 1), workers=2))
+        except ValueError:
+            errors.append(True)
+        else:
+            errors.append(False)
+        print("Archive errors ok:", all(errors) and list(decodeArchive(apath, "1:2")) == [ decodeCardsToNumber(sdecks[1]) ])
+
+        # packed shares in CSV batches keep each share's decks in one column
+        cpath = os.path.join(tdir, 'messages.csv')
+        with open(cpath, 'w') as outfile:
+            outfile.write('Talk is cheap\n"Show me, the code"\n' + 'Read the source ' * 8 + '\n')
+        run = [ sys.executable, os.path.abspath(__file__), '-t', '2', '-k', '2', '-w', '1' ]
+        dpath = os.path.join(tdir, 'decks.csv')
+        with open(dpath, 'wb') as outfile:
+            subprocess.call(run + ['-E', '-n', '3', '--batch', cpath], stdout=outfile)
+        proc = subprocess.Popen(run + ['-D', '--batch', dpath], stdout=subprocess.PIPE)
+        with open(cpath, 'rb') as infile:
+            print("Packed CSV batch ok:", proc.communicate()[0] == infile.read())
+
+        # a bad request must get an error and leave the rest of its connection working
+        if sys.version_info >= (3, 7):
+            import asyncio
+            import threading
+            import time
+            from scs28_server import DeckServer, DeckClient
+            spath = os.path.join(tdir, 'test.sock')
+            loop = asyncio.new_event_loop()
+            server = DeckServer(workers=0)
+            serving = loop.create_task(server.serve(spath))
+            thread = threading.Thread(target=loop.run_until_complete, args=(asyncio.gather(serving, return_exceptions=True),))
+            thread.start()
+            try:
+                while not os.path.exists(spath) and not serving.done():
+                    time.sleep(0.01)
+                with DeckClient(spath) as client:
+                    responses = client.pipeline([ { "op": "decode", "deck": 123 },
+                        { "op": "decrypt", "decks": [[], []], "thresh": 2 },
+                        { "op": "decrypt", "decks": [], "thresh": 2 }, { "op": "ping" } ])
+                print("Server errors ok:", [ "error" in r for r in responses ] == [True, True, True, False]
+                    and responses[3].get("pong") is True)
+            finally:
+                loop.call_soon_threadsafe(serving.cancel)
+                thread.join()
+                # connections still open are cancelled, as asyncio.run does
+                tasks = asyncio.all_tasks(loop)
+                for task in tasks:
+                    task.cancel()
+                if tasks:
+                    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+                loop.close()
+                server.close()
+        else:
+            print("Server errors skipped; the server requires Python 3.7")
+    finally:
+        shutil.rmtree(tdir)
 
     print("Encrypting message: ", message)
     secrets = messageToSecrets(message)
@@ -683,6 +2316,10 @@ def test():
         ctransformed = cardsToSecret( secretToCards(secrets[si]) )
         print ("Cards in deck", si+1, "decoded ok:", (ctransformed == secrets[si]))
 
+    records = [ codecs.decode(b(sec), 'hex') for sec in secrets ]
+    print("Share records ok:", [ recordToShare(r) for r in records ] == [ secretToShare(sec) for sec in secrets ]
+        and [ shareToRecord(recordToShare(r)) for r in records ] == records and shareRecordsToMessage(records[1:]) == message)
+
     print("\nTesting combine...")
     secrets.pop( random.randint(0, len(secrets)-1) )
     message = secretsToMessage(secrets)
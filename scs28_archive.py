@@ -0,0 +1,348 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Deck Archives
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Binary archives of decks with memory mapped random access, an optional
+index, and parallel decoding.
+"""
+
+from __future__ import print_function
+import collections
+import struct
+
+from scs28 import (ARCHIVE_CHUNK_DECKS, ARCHIVE_SERIAL_DECKS, b, byteValues, Deck,
+    decodeCardsToNumber, numberToMessage, numberToRecord, recordToNumber)
+from scs28_packed import packedShareHasMore
+
+
+###############################
+## Deck Archives
+###############################
+
+# A deck archive is a binary file of fixed size deck records behind a 32 byte
+# header. Records are either the 52 card numbers of a deck, or its number from
+# encodeNumberToCards as 29 big endian bytes. The header holds the record kind,
+# the deck count and, for decks of SSS shares, the threshold, share count and
+# packing. An optional sidecar index (the archive path plus ".idx") lists the
+# deck numbers of all records in sorted order, to find where a deck is stored.
+ARCHIVE_MAGIC = b('SC28')
+ARCHIVE_VERSION = 1
+ARCHIVE_HEADER = struct.Struct('>4sBBBBBB2xQ12x')
+ARCHIVE_PERMUTATION = 0
+ARCHIVE_RANK = 1
+ARCHIVE_RECORD_SIZES = { ARCHIVE_PERMUTATION: 52, ARCHIVE_RANK: 29 }
+ARCHIVE_SSS = 0x01
+
+INDEX_MAGIC = b('SC2I')
+INDEX_HEADER = struct.Struct('>4sB3xQ')
+INDEX_ENTRY = struct.Struct('>29sQ')
+
+
+class DeckArchiveWriter(object):
+    """
+    Writes decks to a new archive one at a time. The deck count in the header is
+    filled in when the writer is closed.
+
+    Args:
+        path (string): The archive file to create
+        ranks (bool): Store 29 byte deck numbers instead of 52 byte permutations
+        thresh, total, pack (int): SSS parameters to record, if the decks hold shares
+    """
+    def __init__(self, path, ranks=False, thresh=None, total=None, pack=None):
+        self.kind = ARCHIVE_RANK if ranks else ARCHIVE_PERMUTATION
+        self.sss = (thresh or 0, total or 0, pack or 0)
+        self.count = 0
+        self.outfile = open(path, 'wb')
+        self.writeHeader()
+
+    def writeHeader(self):
+        flags = ARCHIVE_SSS if self.sss[0] else 0
+        self.outfile.seek(0)
+        self.outfile.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, self.kind, flags,
+            self.sss[0], self.sss[1], self.sss[2], self.count))
+
+    def write(self, deck):
+        if self.kind == ARCHIVE_RANK:
+            self.outfile.write(numberToRecord(decodeCardsToNumber(deck), 29))
+        else:
+            self.outfile.write(Deck(deck).cards)
+        self.count += 1
+
+    def close(self):
+        self.writeHeader()
+        self.outfile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DeckArchive(object):
+    """
+    Reads a deck archive through a read only memory map, so any deck can be
+    fetched without reading or copying the rest of the file.
+
+    Args:
+        path (string): The archive file
+
+    Raises:
+        ValueError: If the file cannot be opened, or is not a deck archive
+    """
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, 'rb') as infile:
+                header = infile.read(ARCHIVE_HEADER.size)
+                if len(header) < ARCHIVE_HEADER.size or header[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC:
+                    raise ValueError(path+" is not a deck archive")
+                import mmap
+                self.map = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        except EnvironmentError as e:
+            raise ValueError("Could not open archive "+path+": "+(e.strerror or str(e)))
+        try:
+            self.view = memoryview(self.map)
+        except TypeError:
+            # Python 2 memory maps can only be sliced into copies
+            self.view = self.map
+        magic, version, self.kind, flags, thresh, total, pack, self.count = ARCHIVE_HEADER.unpack_from(header)
+        if version != ARCHIVE_VERSION or self.kind not in ARCHIVE_RECORD_SIZES:
+            self.map.close()
+            raise ValueError(path+" is from a newer version, or is damaged")
+        self.recordSize = ARCHIVE_RECORD_SIZES[self.kind]
+        if len(self.map) < ARCHIVE_HEADER.size + self.count * self.recordSize:
+            self.map.close()
+            raise ValueError(path+" is truncated")
+        self.thresh = thresh if flags & ARCHIVE_SSS else None
+        self.total = total if flags & ARCHIVE_SSS else None
+        self.pack = (pack or None) if flags & ARCHIVE_SSS else None
+        self.index = None
+
+    def __len__(self):
+        return self.count
+
+    def record(self, i):
+        """
+        Returns the raw record of deck i as a memoryview into the archive.
+        """
+        if not 0 <= i < self.count:
+            raise IndexError("Deck "+str(i)+" is not in the archive")
+        start = ARCHIVE_HEADER.size + i * self.recordSize
+        return self.view[start:start+self.recordSize]
+
+    def number(self, i):
+        """
+        Returns the number that deck i encodes.
+        """
+        if self.kind == ARCHIVE_RANK:
+            return recordToNumber(bytes(self.record(i)))
+        return decodeCardsToNumber(byteValues(bytes(self.record(i))))
+
+    def __getitem__(self, i):
+        if self.kind == ARCHIVE_RANK:
+            return Deck.fromNumber(self.number(i))
+        return Deck(bytes(self.record(i)))
+
+    def decks(self, start=0, stop=None):
+        """
+        Generator yielding the decks from start up to (not including) stop.
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        for i in range(start, stop):
+            yield self[i]
+
+    def __iter__(self):
+        return self.decks()
+
+    def buildIndex(self):
+        """
+        Writes the sidecar index of this archive.
+        """
+        entries = sorted([ (numberToRecord(self.number(i), 29), i) for i in range(0, self.count) ])
+        with open(self.path + '.idx', 'wb') as outfile:
+            outfile.write(INDEX_HEADER.pack(INDEX_MAGIC, ARCHIVE_VERSION, len(entries)))
+            for key, i in entries:
+                outfile.write(INDEX_ENTRY.pack(key, i))
+
+    def find(self, deck):
+        """
+        Looks up where a deck is stored with a binary search of the sidecar index.
+
+        Returns:
+            int: The index of the deck in the archive, or None if it is not stored
+        """
+        if self.index is None:
+            with open(self.path + '.idx', 'rb') as infile:
+                import mmap
+                self.index = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, count = INDEX_HEADER.unpack_from(self.index)
+            if magic != INDEX_MAGIC or count != self.count:
+                raise ValueError(self.path+".idx is not the index of this archive")
+
+        key = numberToRecord(decodeCardsToNumber(deck), 29)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry, i = INDEX_ENTRY.unpack_from(self.index, INDEX_HEADER.size + mid * INDEX_ENTRY.size)
+            if entry < key:
+                lo = mid + 1
+            elif entry > key:
+                hi = mid
+            else:
+                return i
+        return None
+
+    def close(self):
+        if isinstance(self.view, memoryview):
+            self.view.release()
+        self.map.close()
+        if self.index is not None:
+            self.index.close()
+
+
+def archiveDecks(path, span=None):
+    """
+    Generator yielding the decks of an archive file within a "START:STOP" range.
+    """
+    archive = DeckArchive(path)
+    try:
+        start, stop = parseRange(span, archive.count)
+        for deck in archive.decks(start, stop):
+            yield deck
+    finally:
+        archive.close()
+
+
+def archiveShares(path):
+    """
+    Reads the decks of an archive of SSS shares, grouped into a list per share.
+    """
+    shares = []
+    current = []
+    for deck in archiveDecks(path):
+        current.append(deck)
+        if not packedShareHasMore(deck):
+            shares.append(current)
+            current = []
+    if current:
+        raise ValueError("The last share in "+path+" is missing decks")
+    return shares
+
+
+def decodeArchiveChunk(kind, data, messages=False):
+    """
+    Pool worker; ranks a chunk of raw archive records into the numbers their
+    decks hold, or into messages.
+    """
+    size = ARCHIVE_RECORD_SIZES[kind]
+    records = [ data[i:i+size] for i in range(0, len(data), size) ]
+    if kind == ARCHIVE_RANK:
+        nums = [ recordToNumber(r) for r in records ]
+    else:
+        nums = [ decodeCardsToNumber(byteValues(r)) for r in records ]
+    if messages:
+        return [ numberToMessage(n) for n in nums ]
+    return nums
+
+
+def decodeArchive(path, span=None, messages=False, workers=None, chunkDecks=ARCHIVE_CHUNK_DECKS, window=None):
+    """
+    Generator yielding the number held by every deck of an archive within a
+    "START:STOP" range, or its message, in archive order. Decks are decoded by a
+    pipeline: this reader cuts the records into chunks, a pool of worker
+    processes ranks them, and a queue of pending chunks, in the order they were
+    handed out, holds finished ones until all before them are yielded. At most
+    window chunks are in flight, so memory stays bounded however large the
+    archive is. A range of fewer than ARCHIVE_SERIAL_DECKS decks is decoded in
+    this process unless workers is given.
+
+    Args:
+        path (string): The archive file
+        span (string): Range of deck positions to decode
+        messages (bool): Yield messages, as -d prints them, instead of numbers
+        workers (int): Number of processes; defaults to the CPU count for large
+            ranges, and 1 decodes in this process
+        chunkDecks (int): Number of decks handed to a worker at a time
+        window (int): Most chunks in flight at once; defaults to 4 per worker
+
+    Raises:
+        ValueError: If the file is not a deck archive, or the range is not within it
+    """
+    import multiprocessing
+    archive = DeckArchive(path)
+    pool = None
+    try:
+        # checked before any chunk is handed out, so no worker reads past the archive
+        start, stop = parseRange(span, archive.count)
+        if not workers:
+            workers = 1 if stop - start < ARCHIVE_SERIAL_DECKS else multiprocessing.cpu_count()
+        if workers == 1:
+            for i in range(start, stop):
+                num = archive.number(i)
+                yield numberToMessage(num) if messages else num
+            return
+
+        pool = multiprocessing.Pool(workers)
+        window = window or 4 * workers
+        size = archive.recordSize
+        pending = collections.deque()
+        for first in range(start, stop, chunkDecks):
+            last = min(first + chunkDecks, stop)
+            data = bytes(archive.view[ARCHIVE_HEADER.size+first*size:ARCHIVE_HEADER.size+last*size])
+            pending.append( pool.apply_async(decodeArchiveChunk, (archive.kind, data, messages)) )
+            if len(pending) >= window:
+                for result in pending.popleft().get():
+                    yield result
+        while pending:
+            for result in pending.popleft().get():
+                yield result
+    finally:
+        if pool is not None:
+            pool.terminate()
+        archive.close()
+
+
+def parseRange(span, count=None):
+    """
+    Parses a "START:STOP" range of deck positions; either end may be left out.
+
+    Args:
+        span (string): The range, or None for all decks
+        count (int): Number of decks in the archive, which a missing STOP
+            stands for and which the range must be within
+
+    Raises:
+        ValueError: If the range is malformed, or not within 0:count
+    """
+    start, sep, stop = (span or ':').partition(':')
+    try:
+        start, stop = int(start or 0), (int(stop) if stop else count)
+    except ValueError:
+        raise ValueError("The range must be START:STOP, but was "+str(span))
+    if start < 0 or (stop is not None and stop < start) or (count is not None and stop > count):
+        within = " is not within the "+str(count)+" decks of the archive" if count is not None else " is not a range of deck positions"
+        raise ValueError("The range "+str(span)+within)
+    return start, stop
@@ -0,0 +1,203 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Batch Processing
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Encrypts or decrypts every record of a JSON lines or CSV file on a pool of
+worker processes, writing the results in the same order.
+"""
+
+from __future__ import print_function
+import codecs
+import sys
+
+from scs28 import (b, checkShareMessage, deckToString, encodeNumberToCards,
+    messageToShareRecords, recordToNumber, stringToDeck)
+from scs28_packed import messageToPackedShares, sharedDecksToMessage
+from scs28_robust import robustSharedDecksToMessage
+
+
+###############################
+## Batch Processing
+###############################
+
+# Batch records are JSON objects, one per line. Encrypting reads "message" (or
+# "message_hex" for binary data) and writes "decks"; decrypting does the reverse.
+# With packing, each entry of "decks" is the list of decks for one share.
+# Any other keys, such as an id, are passed through unchanged. A line holding just
+# a JSON string is taken as the message. Records which fail get an "error" key,
+# including unpacked messages that would not come back unchanged.
+# CSV files hold the message in the first column, or one share per column. A
+# packed share's decks go in one column, separated by CSV_DECK_SEPARATOR.
+
+CSV_DECK_SEPARATOR = " / "
+
+def batchEncryptRecord(record, thresh, total, pack=None):
+    """
+    Pool worker; encrypts one batch record into decks. With packing, each share
+    becomes a list of decks.
+    """
+    result = dict(record)
+    try:
+        if 'message_hex' in result:
+            msg = codecs.decode(b(result.pop('message_hex')), 'hex')
+        elif 'message' in result:
+            msg = textToBytes(result.pop('message'))
+        else:
+            raise ValueError("Record has no message")
+        if pack:
+            shares = messageToPackedShares(msg, thresh, total, pack)
+            result['decks'] = [ [ deckToString(encodeNumberToCards(n)) for n in nums ] for nums in shares ]
+        else:
+            checkShareMessage(msg)
+            result['decks'] = [ deckToString(encodeNumberToCards(recordToNumber(r))) for r in messageToShareRecords(msg, thresh, total) ]
+    except (TypeError, ValueError) as e:
+        result['error'] = "Could not encrypt record: "+str(e)
+    return result
+
+
+def batchDecryptRecord(record, thresh, pack=None):
+    """
+    Pool worker; decrypts one batch record from its decks. Packed shares need
+    the packing they were encrypted with.
+    """
+    result = dict(record)
+    try:
+        decks = result.pop('decks', [])
+        need = thresh + (pack - 1 if pack else 0)
+        if len(decks) < need:
+            raise ValueError(str(need)+" decks are required, but "+str(len(decks))+" were provided")
+        shares = [ [ stringToDeck(str(d)) for d in (share if isinstance(share, list) else [share]) ] for share in decks ]
+        if len(shares) > need:
+            msg, bad = robustSharedDecksToMessage(shares, need)
+            if bad:
+                result['inconsistent'] = bad
+        else:
+            msg = sharedDecksToMessage(shares)
+        try:
+            result['message'] = msg.decode('utf-8')
+        except UnicodeDecodeError:
+            result['message_hex'] = codecs.encode(msg, 'hex').decode('ascii')
+    except (TypeError, ValueError) as e:
+        result['error'] = "Could not decrypt record: "+str(e)
+    return result
+
+
+def readBatchRecords(infile, csvMode):
+    """
+    Generator yielding batch records as dicts from a JSON lines or CSV file.
+    """
+    if csvMode:
+        import csv
+        for row in csv.reader(infile):
+            if row:
+                yield { 'message': row[0], 'decks': [ csvCellToShare(cell) for cell in row ] }
+        return
+    import json
+    for line in infile:
+        if line.strip():
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                record = { 'message': record }
+            yield record
+
+
+def csvCellToShare(cell):
+    """
+    Returns the deck in a CSV cell, or the list of decks of a packed share.
+    """
+    if CSV_DECK_SEPARATOR.strip() not in cell:
+        return cell
+    return [ d.strip() for d in cell.split(CSV_DECK_SEPARATOR.strip()) ]
+
+
+def writeBatchRecord(writer, result, csvMode):
+    if not csvMode:
+        import json
+        writer.write(json.dumps(result) + "\n")
+    elif 'error' in result:
+        writer.writerow([ "ERROR: " + result['error'] ])
+    elif 'decks' in result:
+        writer.writerow([ CSV_DECK_SEPARATOR.join(s) if isinstance(s, list) else s for s in result['decks'] ])
+    elif 'message' in result:
+        writer.writerow([ result['message'] ])
+    else:
+        writer.writerow([ "HEX:" + result['message_hex'] ])
+
+
+def runBatch(path, worker, workers=None, chunksize=64):
+    """
+    Runs worker over every record of a batch file with a process pool, writing
+    the results to stdout in input order as they complete.
+
+    Args:
+        path (string): The batch file; a .csv extension selects CSV, and "-" reads stdin
+        worker (function): Picklable function turning a record into a result record
+        workers (int): Number of processes; defaults to the CPU count
+        chunksize (int): Number of records sent to a process at a time
+    """
+    import csv
+    import multiprocessing
+    csvMode = path.lower().endswith('.csv')
+    infile = sys.stdin if path == '-' else open(path, 'r')
+    writer = csv.writer(sys.stdout, lineterminator="\n") if csvMode else sys.stdout
+    records = readBatchRecords(infile, csvMode)
+    if csvMode:
+        # trim the CSV record down to what the worker will read
+        key = 'decks' if worker.func is batchDecryptRecord else 'message'
+        records = ( { key: r[key] } for r in records )
+
+    workers = workers or multiprocessing.cpu_count()
+    if workers == 1:
+        results = ( worker(r) for r in records )
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap(worker, records, max(1, chunksize))
+
+    try:
+        for result in results:
+            writeBatchRecord(writer, result, csvMode)
+    except BaseException:
+        # on an error or KeyboardInterrupt, stop the workers without finishing their chunks
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        raise
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if infile is not sys.stdin:
+        infile.close()
+
+
+def textToBytes(s):
+    """
+    Encodes text as UTF-8, passing byte strings through as they are.
+    """
+    if isinstance(s, bytes):
+        return s
+    if not hasattr(s, 'encode'):
+        raise TypeError("Expected text, not "+type(s).__name__)
+    return s.encode('utf-8')
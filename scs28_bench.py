@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Benchmarks
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Checks that scs28.py still turns messages and secrets into exactly the same
+decks as the golden corpus, then times its hot paths and the command line.
+
+Checking the golden corpus and running every benchmark:
+    ./scs28_bench.py
+
+Saving a baseline, then comparing a later version against it:
+    ./scs28_bench.py --save before.json
+    ./scs28_bench.py --compare before.json --max-slowdown 10
+
+Only the SSS benchmarks, with fewer rounds:
+    ./scs28_bench.py --only sss --quick
+"""
+
+from __future__ import print_function
+import argparse
+import binascii
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+
+import scs28
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(HERE, 'scs28.py')
+GOLDEN = os.path.join(HERE, 'scs28_golden.json')
+
+# Thresholds that the SSS benchmarks split and join at
+SSS_THRESHOLDS = (2, 4, 8, 16, 32, 64)
+
+
+###############################
+## Bench Start
+###############################
+def main(argv=None):
+    apar = argparse.ArgumentParser(prog='scs28_bench',
+    description="""    Super Card Shuffle 28 benchmarks --
+    Checks the golden deck corpus, then reports ops/sec and per-op percentiles.
+    """)
+    apar.add_argument('--only', metavar='TEXT',
+            help='only run benchmarks with TEXT in their name')
+    apar.add_argument('--quick', action='store_true',
+            help='run fewer and shorter rounds')
+    apar.add_argument('--save', metavar='FILE',
+            help='write the results as a JSON baseline to FILE')
+    apar.add_argument('--compare', metavar='FILE',
+            help='compare the results with a JSON baseline saved by --save')
+    apar.add_argument('--max-slowdown', type=float, metavar='PCT',
+            help='with --compare, exit with status 1 if any benchmark is more than PCT percent slower')
+    apar.add_argument('--golden', default=GOLDEN, metavar='FILE',
+            help='golden corpus to check against; defaults to scs28_golden.json')
+    apar.add_argument('--write-golden', action='store_true',
+            help='regenerate the golden corpus from the current scs28.py instead of checking it; only do this when the deck format is meant to change')
+    apar.add_argument('--no-cli', action='store_true',
+            help='skip the command line benchmarks')
+    apar.add_argument('--seeded', action='store_true',
+            help='draw SSS coefficients from a seeded entropy pool, so runs repeat exactly; the command line benchmarks still use os.urandom')
+    pargs = apar.parse_args(argv)
+
+    if pargs.seeded:
+        scs28.entropyPool = scs28.EntropyPool(seed=28)
+
+    if pargs.write_golden:
+        with open(pargs.golden, 'w') as outfile:
+            json.dump(buildGolden(), outfile, indent=1, sort_keys=True)
+            outfile.write("\n")
+        print ("Wrote golden corpus to", pargs.golden)
+        return 0
+
+    with open(pargs.golden) as infile:
+        golden = json.load(infile)
+    failures = checkGolden(golden)
+    for failure in failures[:20]:
+        print ("GOLDEN MISMATCH:", failure, file=sys.stderr)
+    if failures:
+        print ("FAILURE:", len(failures), "golden corpus checks failed.", file=sys.stderr)
+        return 1
+    print ("Golden corpus ok:", sum([ len(v) for v in golden.values() ]), "cases")
+
+    rounds, target = (5, 0.005) if pargs.quick else (30, 0.02)
+    results = {}
+    for name, func, cli in benchmarks(pargs.no_cli):
+        if pargs.only and pargs.only not in name:
+            continue
+        results[name] = timeBenchmark(func, 3 if cli else rounds, target)
+        printResult(name, results[name])
+
+    if pargs.save:
+        with open(pargs.save, 'w') as outfile:
+            json.dump(baselineRecord(results), outfile, indent=1, sort_keys=True)
+            outfile.write("\n")
+
+    if pargs.compare:
+        with open(pargs.compare) as infile:
+            baseline = json.load(infile)
+        slowest = compareResults(results, baseline['results'])
+        if pargs.max_slowdown is not None and slowest > pargs.max_slowdown:
+            print ("FAILURE: A benchmark is", "%.1f%%" % slowest, "slower than the baseline.", file=sys.stderr)
+            return 1
+    return 0
+
+
+###############################
+## Timing
+###############################
+
+def timeBenchmark(func, rounds, target):
+    """
+    Times a function over a number of rounds, each running it enough times to
+    take about target seconds.
+
+    Returns:
+        dict: ops_per_sec, and p50_us, p90_us and p99_us per op times across rounds
+    """
+    clock = timeit.default_timer
+    inner = 1
+    while True:
+        start = clock()
+        for _ in range(inner):
+            func()
+        elapsed = clock() - start
+        if elapsed >= target or inner >= 1 << 20:
+            break
+        inner *= 2 if elapsed <= 0 else max(2, min(10, int(target / elapsed) + 1))
+
+    samples = []
+    for _ in range(rounds):
+        start = clock()
+        for _ in range(inner):
+            func()
+        samples.append((clock() - start) / inner)
+    samples.sort()
+    return {
+        "ops_per_sec": len(samples) / sum(samples),
+        "p50_us": percentile(samples, 50) * 1e6,
+        "p90_us": percentile(samples, 90) * 1e6,
+        "p99_us": percentile(samples, 99) * 1e6,
+    }
+
+
+def percentile(ordered, pct):
+    """
+    Nearest rank percentile of an already sorted list.
+    """
+    rank = int(round(pct / 100.0 * len(ordered) + 0.5)) - 1
+    return ordered[max(0, min(len(ordered) - 1, rank))]
+
+
+def printResult(name, result):
+    print ("{0:<28} {1:>12.1f} ops/s   p50 {2:>10.2f} us   p90 {3:>10.2f} us   p99 {4:>10.2f} us".format(
+        name, result["ops_per_sec"], result["p50_us"], result["p90_us"], result["p99_us"]))
+
+
+def baselineRecord(results):
+    return {
+        "scs28_version": scs28.__version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compareResults(results, baseline):
+    """
+    Prints the change in ops/sec of each benchmark against a baseline.
+
+    Returns:
+        float: The largest slowdown as a percentage; 0 if nothing got slower
+    """
+    slowest = 0.0
+    print ("\nCompared with baseline:")
+    for name in sorted(results):
+        if name not in baseline:
+            print ("{0:<28} {1:>12}".format(name, "new"))
+            continue
+        change = results[name]["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1
+        slowest = max(slowest, -change / (1 + change) * 100)
+        print ("{0:<28} {1:>+11.1f}%".format(name, change * 100))
+    return slowest
+
+
+###############################
+## Benchmarks
+###############################
+
+def benchmarks(noCli=False):
+    """
+    Builds every benchmark as a (name, function, runs the CLI) tuple.
+    """
+    msg = b"Super Card Shuffle 28!!!!!!"
+    num = scs28.messageToNumber(msg)
+    deck = scs28.encodeNumberToCards(num)
+    line = scs28.deckToString(deck)
+    secret = scs28.messageToSecrets(msg, 2, 3)[0]
+    sdeck = scs28.secretToCards(secret)
+    share = scs28.secretToShare(secret)
+    record = scs28.shareToRecord(share)
+    formatter = scs28.VerticalFormatter(io.BytesIO())
+    group = [ deck ] * 8
+
+    benches = [
+        ("messageToNumber", lambda: scs28.messageToNumber(msg), False),
+        ("numberToMessage", lambda: scs28.numberToMessage(num), False),
+        ("encodeNumberToCards", lambda: scs28.encodeNumberToCards(num), False),
+        ("decodeCardsToNumber", lambda: scs28.decodeCardsToNumber(deck), False),
+        ("DeckDecoder-52", lambda: scs28.DeckDecoder(deck).number, False),
+        ("secretToCards", lambda: scs28.secretToCards(secret), False),
+        ("cardsToSecret", lambda: scs28.cardsToSecret(sdeck), False),
+        ("shareToSecret", lambda: scs28.shareToSecret(share), False),
+        ("secretToShare", lambda: scs28.secretToShare(secret), False),
+        ("shareToRecord", lambda: scs28.shareToRecord(share), False),
+        ("recordToShare", lambda: scs28.recordToShare(record), False),
+        ("parseCardNumbers", lambda: scs28.parseCardNumbers(line), False),
+        ("Deck.fromString", lambda: scs28.Deck.fromString(line), False),
+        ("deckToString", lambda: scs28.deckToString(deck), False),
+        ("render-text", lambda: formatter.renderDeck(deck), False),
+        ("render-vertical-8", lambda: formatter.writeGroup(group), False),
+        ("sssFieldElements-63", lambda: scs28.entropyPool.fieldElements(63), False),
+    ]
+    for thresh in SSS_THRESHOLDS:
+        shares = scs28.sssSplit(num, thresh, thresh)
+        benches.append(("sssSplit-t" + str(thresh), splitBench(num, thresh), False))
+        benches.append(("sssJoin-t" + str(thresh), joinBench(shares, False), False))
+        benches.append(("sssJoin-t" + str(thresh) + "-cold", joinBench(shares, True), False))
+
+    longSecret = bytes(bytearray(range(256))) * 256
+    gshares = scs28.gf256Split(longSecret, 3, 5)
+    pshares = scs28.messageToPackedShares(longSecret, 3, 5, 1)
+    hshares = scs28.messageToHybridShares(longSecret, 3, 5)
+    benches.extend([
+        ("gf256Split-t3-64k", lambda: scs28.gf256Split(longSecret, 3, 5), False),
+        ("gf256Join-t3-64k", lambda: scs28.gf256Join(gshares[:3]), False),
+        ("packedSplit-t3-64k", lambda: scs28.messageToPackedShares(longSecret, 3, 5, 1), False),
+        ("packedJoin-t3-64k", lambda: scs28.packedSharesToMessage(pshares[:3]), False),
+        ("hybridSplit-t3-64k", lambda: scs28.messageToHybridShares(longSecret, 3, 5), False),
+        ("hybridJoin-t3-64k", lambda: scs28.hybridSharesToMessage(hshares[2:], 3), False),
+    ])
+
+    if not noCli:
+        sharedDecks = cliOutput(['-E', '-t', '3', '-n', '5', '-q', msg.decode()])
+        benches.extend([
+            ("cli-encode", lambda: cliOutput(['-e', msg.decode()]), True),
+            ("cli-decode", lambda: cliOutput(['-d', '-q', line]), True),
+            ("cli-encrypt-t3n5", lambda: cliOutput(['-E', '-t', '3', '-n', '5', msg.decode()]), True),
+            ("cli-decrypt-t3", lambda: cliOutput(['-D', '-t', '3', '-q'], sharedDecks), True),
+            ("cli-stream-64k", lambda: cliOutput(['-e', '--stream'], b"\xa5" * 65536), True),
+        ])
+    return benches
+
+
+def splitBench(num, thresh):
+    return lambda: scs28.sssSplit(num, thresh, thresh)
+
+
+def joinBench(shares, cold):
+    """
+    Joins the same shares each time; a cold join clears the Lagrange weight cache first.
+    """
+    if cold:
+        def join():
+            scs28.lagrangeCache.clear()
+            return scs28.sssJoin(shares)
+        return join
+    return lambda: scs28.sssJoin(shares)
+
+
+def cliOutput(args, data=b""):
+    proc = subprocess.Popen([sys.executable, SCRIPT] + args,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate(data)
+    if proc.returncode:
+        raise RuntimeError("scs28.py " + " ".join(args) + " failed: " + err.decode())
+    return out
+
+
+###############################
+## Golden Corpus
+###############################
+
+def hexBytes(data):
+    return binascii.hexlify(data).decode()
+
+
+def buildGolden(seed=28):
+    """
+    Builds the golden corpus from the current scs28.py with a fixed seed: messages
+    and their decks, SSS secrets and their decks, shares and the number they join
+    to, and a stream and a packed payload with their decks.
+    """
+    rand = random.Random(seed)
+
+    messages = [ b"", b"A", b"Hello there.", b"Super Card Shuffle 28!", b"x" * 27, b"x" * 28,
+            b"\0\0\0abc", b"\xff" * 28, b"\x01" + b"\0" * 27, b"\x0f" + b"\xff" * 27 ]
+    for _ in range(0, 30):
+        messages.append(randomBytes(rand, rand.randint(1, 28)))
+    golden = { "messages": [], "secrets": [], "joins": [], "streams": [], "packed": [] }
+    for msg in messages:
+        deck = scs28.encodeNumberToCards(scs28.messageToNumber(msg))
+        golden["messages"].append({ "message_hex": hexBytes(msg), "deck": scs28.deckToString(deck) })
+
+    shares = [ [1, 0], [255, (1 << 216) - 1] ]
+    for _ in range(0, 30):
+        shares.append([ rand.randint(1, 255), rand.randint(0, scs28.PRIME - 1) ])
+    for share in shares:
+        secret = scs28.shareToSecret(share)
+        golden["secrets"].append({ "secret": secret, "deck": scs28.deckToString(scs28.secretToCards(secret)) })
+
+    for thresh in SSS_THRESHOLDS + (255,):
+        xs = rand.sample(range(1, 256), thresh)
+        shares = [ [x, rand.randint(0, scs28.PRIME - 1)] for x in xs ]
+        golden["joins"].append({ "shares": [ [x, str(y)] for x, y in shares ], "number": str(scs28.sssJoin(shares)) })
+
+    for kind, encode, sizes in (("streams", scs28.streamToDecks, (0, 1, 23, 24, 1000)),
+            ("packed", scs28.packedStreamToDecks, (0, 1, 30, scs28.PACK_GROUP_BYTES, scs28.PACK_GROUP_BYTES + 1))):
+        for size in sizes:
+            data = randomBytes(rand, size)
+            decks = list(encode(io.BytesIO(data)))
+            golden[kind].append({ "data_hex": hexBytes(data), "deck_count": len(decks), "decks_sha256": decksDigest(decks) })
+    return golden
+
+
+def decksDigest(decks):
+    """
+    SHA-256 of decks as lines of card identifiers, to pin long runs of decks.
+    """
+    text = "".join([ scs28.deckToString(d) + "\n" for d in decks ])
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def randomBytes(rand, size):
+    return bytes(bytearray([ rand.randint(0, 255) for _ in range(0, size) ]))
+
+
+def checkGolden(golden):
+    """
+    Checks every case of the golden corpus in both directions.
+
+    Returns:
+        list: A description of each case that does not match
+    """
+    failures = []
+    for case in golden["messages"]:
+        msg = binascii.unhexlify(case["message_hex"])
+        num = scs28.messageToNumber(msg)
+        if scs28.deckToString(scs28.encodeNumberToCards(num)) != case["deck"]:
+            failures.append("message " + case["message_hex"] + " encodes to a different deck")
+        elif scs28.decodeCardsToNumber(scs28.parseCardNumbers(case["deck"])) != num:
+            failures.append("deck of message " + case["message_hex"] + " decodes to a different number")
+
+    for case in golden["secrets"]:
+        if scs28.deckToString(scs28.secretToCards(case["secret"])) != case["deck"]:
+            failures.append("secret " + case["secret"] + " encodes to a different deck")
+        elif scs28.cardsToSecret(scs28.parseCardNumbers(case["deck"])) != case["secret"]:
+            failures.append("deck of secret " + case["secret"] + " decodes to a different secret")
+
+    for case in golden["joins"]:
+        shares = [ [x, int(y)] for x, y in case["shares"] ]
+        if scs28.sssJoin(shares) != int(case["number"]):
+            failures.append("join of " + str(len(shares)) + " shares gives a different number")
+
+    for kind, encode, decode in (("streams", scs28.streamToDecks, scs28.decksToStream),
+            ("packed", scs28.packedStreamToDecks, scs28.packedDecksToStream)):
+        for case in golden[kind]:
+            data = binascii.unhexlify(case["data_hex"])
+            label = kind + " payload of " + str(len(data)) + " bytes"
+            decks = list(encode(io.BytesIO(data)))
+            if len(decks) != case["deck_count"] or decksDigest(decks) != case["decks_sha256"]:
+                failures.append(label + " encodes to different decks")
+            elif b"".join(decode(decks)) != data:
+                failures.append(label + " decodes to different data")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(main())
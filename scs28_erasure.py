@@ -0,0 +1,267 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Erasure Coding
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Parity decks for streams, so that lost decks can be rebuilt.
+"""
+
+from __future__ import print_function
+from scs28 import (b, decodeCardsToNumber, encodeNumberToCards, lagrangeWeights,
+    MAX_ERASURE_DATA, numberToRecord, PRIME, recordToNumber)
+from scs28_packed import EXT_BASE, EXT_HEADERS, MAX_PACKED_SHARES
+from scs28_stream import (FRAME_PAYLOAD, framesToStream, packFrame, streamFrames,
+    unpackFrame)
+
+
+###############################
+## Erasure Coding
+###############################
+
+# Erasure coding adds parity decks to a stream, without any secrecy, so that
+# lost decks can be rebuilt. The frames are split into stripes of up to DATA
+# frames, and each stripe is followed by PARITY decks; any DATA decks of a
+# stripe recover all of it. It is systematic: the data decks are the stream's
+# own framed decks, so with nothing lost it decodes as a plain stream, and only
+# missing frames cost any field math.
+#
+# A stripe of k frames is the polynomial of degree k-1 over ERASURE_PRIME that
+# takes the frames' symbols at 1..k, and parity deck j holds its value at k+1+j.
+# A symbol is a frame's 23 data bytes, above which a state tells whether it is
+# the last frame, padded after a 0x80 byte, or a full last frame. Parity decks
+# use the extended headers above the packed shares: EXT_BASE + header * PRIME +
+# meta * ERASURE_PRIME + y, where the header is ERASURE_HEADER + j, and meta
+# holds the stripe's first frame number and frame count.
+ERASURE_PRIME = (1 << 186) + 205
+ERASURE_HEADER = 2 * MAX_PACKED_SHARES
+ERASURE_META = PRIME // ERASURE_PRIME
+MAX_ERASURE_PARITY = EXT_HEADERS - ERASURE_HEADER
+SYMBOL_BITS = 8 * FRAME_PAYLOAD
+SYMBOL_MASK = (1 << SYMBOL_BITS) - 1
+SYMBOL_PADDED = 1
+SYMBOL_FULL = 2
+SYMBOL_MARKER = bytes(bytearray([0x80]))
+
+
+def packErasureNumber(base, count, j, y):
+    meta = base * MAX_ERASURE_DATA + count - 1
+    if meta >= ERASURE_META:
+        raise ValueError("Stream is too long for erasure coding; the most it can hold is about "
+            +str(ERASURE_META // MAX_ERASURE_DATA * FRAME_PAYLOAD // 1000000)+" MB")
+    return EXT_BASE + (ERASURE_HEADER + j) * PRIME + meta * ERASURE_PRIME + y
+
+
+def unpackErasureNumber(num):
+    """
+    Returns:
+        tuple: The first frame number and frame count of the stripe, the parity
+            index and the y value of an erasure parity deck number, or None if
+            the number is not one
+    """
+    if num < EXT_BASE:
+        return None
+    header, rest = divmod(num - EXT_BASE, PRIME)
+    if not ERASURE_HEADER <= header < EXT_HEADERS:
+        return None
+    meta, y = divmod(rest, ERASURE_PRIME)
+    if meta >= ERASURE_META:
+        return None
+    base, count = divmod(meta, MAX_ERASURE_DATA)
+    return base, count + 1, header - ERASURE_HEADER, y
+
+
+def frameToSymbol(last, data):
+    if not last:
+        return recordToNumber(data)
+    if len(data) == FRAME_PAYLOAD:
+        return (SYMBOL_FULL << SYMBOL_BITS) | recordToNumber(data)
+    return (SYMBOL_PADDED << SYMBOL_BITS) | recordToNumber((data + SYMBOL_MARKER).ljust(FRAME_PAYLOAD, b('\0')))
+
+
+def symbolToFrame(seq, symbol):
+    """
+    Returns:
+        int: The number of the framed deck holding a rebuilt symbol
+
+    Raises:
+        ValueError: If the symbol is not a valid one
+    """
+    state = symbol >> SYMBOL_BITS
+    data = numberToRecord(symbol & SYMBOL_MASK, FRAME_PAYLOAD)
+    if state == SYMBOL_PADDED:
+        data = data.rstrip(b('\0'))
+        if not data.endswith(SYMBOL_MARKER):
+            raise ValueError("Erasure parity decks are corrupt")
+        data = data[:-1]
+    elif state > SYMBOL_FULL:
+        raise ValueError("Erasure parity decks are corrupt")
+    return recordToNumber(packFrame(seq, state != 0, data))
+
+
+def stripeParity(symbols, parity):
+    """
+    Returns:
+        list: The y values of a stripe's parity decks
+    """
+    count = len(symbols)
+    xs = tuple(range(1, count + 1))
+    values = []
+    for j in range(0, parity):
+        weights = lagrangeWeights(xs, count + 1 + j, ERASURE_PRIME)
+        values.append( sum([ w * v for w, v in zip(weights, symbols) ]) % ERASURE_PRIME )
+    return values
+
+
+def erasureStreamToDecks(infile, data, parity):
+    """
+    Generator reading a binary file incrementally and yielding its framed decks,
+    each stripe of data decks followed by its parity decks.
+
+    Args:
+        infile (file): Binary file to read
+        data (int): Number of frames per stripe
+        parity (int): Number of parity decks per stripe
+
+    Raises:
+        ValueError: If the counts are out of range, or the stream is too long
+    """
+    for num in erasureStreamToNumbers(infile, data, parity):
+        yield encodeNumberToCards(num)
+
+
+def erasureStreamToNumbers(infile, data, parity):
+    """
+    Like erasureStreamToDecks, yielding the deck numbers instead of their cards.
+    """
+    if not 1 <= data <= MAX_ERASURE_DATA or not 1 <= parity <= MAX_ERASURE_PARITY:
+        raise ValueError("Erasure coding requires 1 to "+str(MAX_ERASURE_DATA)+" data decks and 1 to "
+            +str(MAX_ERASURE_PARITY)+" parity decks per stripe")
+    symbols = []
+    for seq, last, chunk in streamFrames(infile):
+        yield recordToNumber(packFrame(seq, last, chunk))
+        symbols.append(frameToSymbol(last, chunk))
+        if len(symbols) == data or last:
+            base = seq + 1 - len(symbols)
+            for j, y in enumerate(stripeParity(symbols, parity)):
+                yield packErasureNumber(base, len(symbols), j, y)
+            symbols = []
+
+
+def repairStripe(base, stripe, symbols, rebuilt):
+    """
+    Rebuilds the missing frames of a stripe once enough of its decks are known,
+    and forgets the stripe's symbols when it is complete.
+
+    Args:
+        base (int): The stripe's first frame number
+        stripe (list): The stripe's frame count, and its parity y values by x
+        symbols (dict): Symbols of the frames received or rebuilt, by number
+        rebuilt (set): Numbers of the frames rebuilt so far; added to
+
+    Returns:
+        list: Numbers of the rebuilt framed decks, or None if the stripe is not
+            complete yet
+    """
+    count, parity = stripe
+    seqs = range(base, base + count)
+    missing = [ seq for seq in seqs if seq not in symbols ]
+    if len(missing) > len(parity):
+        return None
+
+    points = [ (seq - base + 1, symbols[seq]) for seq in seqs if seq in symbols ]
+    points = (points + sorted(parity.items()))[:count]
+    xs = tuple([ p[0] for p in points ])
+    frames = []
+    for seq in missing:
+        weights = lagrangeWeights(xs, seq - base + 1, ERASURE_PRIME)
+        symbol = sum([ w * p[1] for w, p in zip(weights, points) ]) % ERASURE_PRIME
+        frames.append( symbolToFrame(seq, symbol) )
+        rebuilt.add(seq)
+    for seq in seqs:
+        symbols.pop(seq, None)
+    return frames
+
+
+def repairErasures(nums):
+    """
+    Generator taking the deck numbers of an erasure coded stream and yielding
+    those of its framed decks as they arrive, and of lost frames as soon as their
+    stripe has enough decks to rebuild them. Frames arriving after being rebuilt
+    are dropped.
+
+    Raises:
+        ValueError: If parity decks disagree, or rebuild a corrupt frame
+    """
+    symbols = {}
+    stripes = {}
+    done = set()
+    rebuilt = set()
+    for num in nums:
+        parsed = unpackErasureNumber(num)
+        if parsed is None:
+            seq, last, data = unpackFrame(numberToRecord(num))
+            if seq not in rebuilt:
+                symbols[seq] = frameToSymbol(last, data)
+                yield num
+            continue
+
+        base, count, j, y = parsed
+        if base in done:
+            continue
+        stripe = stripes.setdefault(base, [count, {}])
+        if stripe[0] != count:
+            raise ValueError("Erasure parity decks disagree on the size of a stripe")
+        stripe[1][count + 1 + j] = y
+        frames = repairStripe(base, stripe, symbols, rebuilt)
+        if frames is not None:
+            done.add(base)
+            del stripes[base]
+            for frame in frames:
+                yield frame
+
+    # frames that arrived after all of their stripe's parity decks
+    for base in sorted(stripes):
+        for frame in repairStripe(base, stripes[base], symbols, rebuilt) or []:
+            yield frame
+
+
+def erasureDecksToStream(decks):
+    """
+    Generator reassembling an erasure coded stream, with any lost frames rebuilt,
+    into the original data. Decks may arrive in any order.
+
+    Raises:
+        ValueError: If too many decks of a stripe are lost, or on bad decks
+    """
+    return framesToStream(repairErasures( decodeCardsToNumber(deck) for deck in decks ))
+
+
+def parseErasure(spec):
+    """
+    Parses a "DATA:PARITY" pair of erasure coding deck counts; (0, 0) if malformed.
+    """
+    data, sep, parity = spec.partition(':')
+    if not (data.isdigit() and parity.isdigit()):
+        return 0, 0
+    return int(data), int(parity)
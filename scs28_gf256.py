@@ -0,0 +1,179 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Byte-wise Secret Sharing
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Shamir's Secret Sharing of each byte of a message over GF(256).
+"""
+
+from __future__ import print_function
+import struct
+
+import scs28
+from scs28 import b, MAX_SHARES, numberToRecord, recordToNumber
+from scs28_stream import FRAME_PAYLOAD, framesToStream, packFrame, unpackFrame
+
+
+###############################
+## Byte-wise Secret Sharing
+###############################
+
+# Instead of one polynomial over PRIME per 27 bytes, every byte of the message
+# gets its own polynomial over GF(256), all evaluated at once: multiplying each
+# byte of a share by the same constant is a bytes.translate through a 256 byte
+# table, and adding is an XOR, done on the share as one big number. The share
+# for x is the x byte then as many bytes as the message, carried on stream frame
+# decks, so it takes a deck per 23 bytes.
+
+def gf256Tables():
+    """
+    Returns:
+        tuple: The antilog table, doubled in length so that the sum of two logs
+            needs no reduction, and the log table, both for the generator 3 of
+            GF(256) with the AES polynomial x^8 + x^4 + x^3 + x + 1
+    """
+    exp = [0] * 510
+    log = [0] * 256
+    v = 1
+    for i in range(0, 255):
+        exp[i] = exp[i + 255] = v
+        log[v] = i
+        # v * 3 is v * 2 plus v; doubling past 8 bits subtracts the polynomial
+        v ^= (v << 1) ^ (0x11b if v & 0x80 else 0)
+    return exp, log
+
+GF256_EXP, GF256_LOG = gf256Tables()
+
+# Translate tables multiplying every byte by a constant, made as they are needed
+gf256MulTables = {}
+
+
+def gf256MulTable(c):
+    table = gf256MulTables.get(c)
+    if table is None:
+        if c == 0:
+            table = b('\0') * 256
+        else:
+            logc = GF256_LOG[c]
+            table = bytes(bytearray([0] + [ GF256_EXP[logc + GF256_LOG[v]] for v in range(1, 256) ]))
+        gf256MulTables[c] = table
+    return table
+
+
+def gf256Split(secret, thresh, total):
+    """
+    Splits a secret of any length byte by byte over GF(256).
+
+    Args:
+        secret (bytes): The secret
+        thresh (int): Number of shares needed to recover the secret
+        total (int): Number of shares to create; up to MAX_SHARES
+
+    Returns:
+        list: The x coordinate and bytes of each share
+    """
+    if not 2 <= thresh <= total <= MAX_SHARES:
+        raise ValueError("Sharing requires 2 <= threshold <= shares <= "+str(MAX_SHARES))
+    size = len(secret)
+    randoms = scs28.entropyPool.randomBytes(size * (thresh - 1))
+    coefs = [ randoms[(k-1)*size:k*size] for k in range(1, thresh) ]
+    secretNum = recordToNumber(secret)
+
+    # the share for x is the secret plus each coefficient times x^k, which turns
+    # the bytes into a number only once per term
+    shares = []
+    for x in range(1, total+1):
+        y = secretNum
+        for k, c in enumerate(coefs, 1):
+            y ^= recordToNumber(c.translate(gf256MulTable(GF256_EXP[GF256_LOG[x] * k % 255])))
+        shares.append((x, numberToRecord(y, size)))
+    return shares
+
+
+def gf256Join(shares):
+    """
+    Recovers a secret from at least the threshold count of shares made by
+    gf256Split.
+
+    Raises:
+        ValueError: If the shares have different lengths or repeat an x coordinate
+    """
+    xs = [ s[0] for s in shares ]
+    if len(set(xs)) != len(xs) or 0 in xs:
+        raise ValueError("The same share was given more than once")
+    size = len(shares[0][1])
+    if [ len(s[1]) for s in shares ] != [size] * len(shares):
+        raise ValueError("Shares do not all have the same length")
+
+    # the Lagrange weight at 0 is the product of xj / (xj - xi), as logs; in
+    # GF(256) subtracting is XOR
+    joined = 0
+    for xi, yi in shares:
+        logw = sum([ GF256_LOG[xj] - GF256_LOG[xj ^ xi] for xj in xs if xj != xi ])
+        joined ^= recordToNumber(yi.translate(gf256MulTable(GF256_EXP[logw % 255])))
+    return numberToRecord(joined, size)
+
+
+def messageToBytewiseShares(msg, thresh, total):
+    """
+    Splits a message of any length with byte-wise secret sharing.
+
+    Returns:
+        list: For each share, the list of frame deck numbers that carry it
+    """
+    shares = []
+    for x, y in gf256Split(msg, thresh, total):
+        data = struct.pack('>B', x) + y
+        shares.append([ recordToNumber(packFrame(i // FRAME_PAYLOAD, i + FRAME_PAYLOAD >= len(data), data[i:i+FRAME_PAYLOAD]))
+            for i in range(0, len(data), FRAME_PAYLOAD) ])
+    return shares
+
+
+def bytewiseNumberHasMore(num):
+    """
+    True if the deck number is a frame of a byte-wise share other than its last.
+    """
+    try:
+        return not unpackFrame(numberToRecord(num))[1]
+    except ValueError:
+        return False
+
+
+def bytewiseSharesToMessage(shares):
+    """
+    Recovers a message from at least the threshold count of byte-wise shares.
+
+    Args:
+        shares (list): For each share, the list of frame deck numbers that carry it
+
+    Raises:
+        ValueError: If a share is incomplete, or the shares do not match
+    """
+    parsed = []
+    for nums in shares:
+        data = b('').join(framesToStream(nums))
+        if not data:
+            raise ValueError("Deck does not hold a byte-wise share")
+        parsed.append((struct.unpack('>B', data[:1])[0], data[1:]))
+    return gf256Join(parsed)
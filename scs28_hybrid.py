@@ -0,0 +1,206 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Hybrid Encryption
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Encrypts a message of any length under a random key, and splits only the
+key with Shamir's Secret Sharing.
+"""
+
+from __future__ import print_function
+import collections
+import struct
+
+import scs28
+from scs28 import (b, MAX_ERASURE_DATA, MAX_SHARES, numberToRecord, recordToNumber,
+    SECRET_MASK, shareToRecord, sssJoin, sssSplit)
+from scs28_erasure import erasureStreamToNumbers, repairErasures
+from scs28_packed import EXT_BASE
+from scs28_robust import findBadShares
+from scs28_stream import framesToStream, packFrame, streamFrames
+
+
+###############################
+## Hybrid Encryption
+###############################
+
+# Sharing the whole message makes every share as long as the message. Instead,
+# hybrid mode encrypts the message under a random 27 byte key, and splits only
+# the key with SSS, one key deck per courier. The key is stretched into a
+# keystream by SHA-256 over the key and a block counter, and an HMAC-SHA256 tag,
+# cut to 16 bytes, is added to the ciphertext; a key is only ever used once, so
+# no nonce is needed. The ciphertext is framed like a stream and erasure coded
+# in stripes of THRESH data decks and SHARES minus THRESH parity decks, and the
+# nth deck of each stripe goes to the nth courier, so that the decks of any
+# THRESH couriers rebuild it. Each courier then carries one key deck and about
+# 1/THRESH of the ciphertext, instead of a copy of it all.
+HYBRID_KEY_SIZE = 27
+HYBRID_TAG_SIZE = 16
+
+
+def hybridKeys(key):
+    """
+    Returns:
+        tuple: The keystream key and the tag key, each derived from the shared key
+    """
+    import hashlib
+    return (hashlib.sha256(b('scs28 hybrid stream') + key).digest(),
+        hashlib.sha256(b('scs28 hybrid tag') + key).digest())
+
+
+def hybridKeystream(streamKey, size):
+    import hashlib
+    # the key is hashed once, and copied for each 32 byte block
+    keyed = hashlib.sha256(streamKey)
+    blocks = []
+    for i in range(0, (size + 31) // 32):
+        block = keyed.copy()
+        block.update(struct.pack('>Q', i))
+        blocks.append(block.digest())
+    return b('').join(blocks)[:size]
+
+
+def hybridEncrypt(msg, key):
+    """
+    Encrypts a message of any length under a key used only once.
+
+    Returns:
+        bytes: The ciphertext, followed by its tag
+    """
+    import hmac
+    import hashlib
+    streamKey, tagKey = hybridKeys(key)
+    stream = hybridKeystream(streamKey, len(msg))
+    cipher = numberToRecord(recordToNumber(msg) ^ recordToNumber(stream), len(msg))
+    return cipher + hmac.new(tagKey, cipher, hashlib.sha256).digest()[:HYBRID_TAG_SIZE]
+
+
+def hybridDecrypt(cipher, key):
+    """
+    Checks the tag of a ciphertext made by hybridEncrypt, and decrypts it.
+
+    Raises:
+        ValueError: If the tag does not match
+    """
+    import hmac
+    import hashlib
+    streamKey, tagKey = hybridKeys(key)
+    cipher, tag = cipher[:-HYBRID_TAG_SIZE], cipher[-HYBRID_TAG_SIZE:]
+    expected = hmac.new(tagKey, cipher, hashlib.sha256).digest()[:HYBRID_TAG_SIZE]
+    if len(tag) < HYBRID_TAG_SIZE or not hmac.compare_digest(tag, expected):
+        raise ValueError("The decks do not decrypt to an authentic message; a deck was mistyped or tampered with")
+    stream = hybridKeystream(streamKey, len(cipher))
+    return numberToRecord(recordToNumber(cipher) ^ recordToNumber(stream), len(cipher))
+
+
+def messageToHybridShares(msg, thresh, total):
+    """
+    Encrypts a message of any length in hybrid mode.
+
+    Args:
+        msg (bytes): The message
+        thresh (int): Number of couriers needed to decrypt; up to MAX_ERASURE_DATA
+        total (int): Number of couriers; up to MAX_SHARES
+
+    Returns:
+        list: For each courier, the list of deck numbers to carry: a key share
+            deck, then its part of the ciphertext
+
+    Raises:
+        ValueError: If the threshold or courier count are out of range
+    """
+    import io
+    if not 2 <= thresh <= total <= MAX_SHARES or thresh > MAX_ERASURE_DATA:
+        raise ValueError("Hybrid mode requires 2 <= threshold <= shares <= "+str(MAX_SHARES)
+            +", with a threshold of at most "+str(MAX_ERASURE_DATA))
+    key = scs28.entropyPool.randomBytes(HYBRID_KEY_SIZE)
+    shares = [ [ recordToNumber(shareToRecord(s)) ] for s in sssSplit(recordToNumber(key), thresh, total) ]
+
+    infile = io.BytesIO(hybridEncrypt(msg, key))
+    parity = total - thresh
+    if parity:
+        nums = erasureStreamToNumbers(infile, thresh, parity)
+    else:
+        nums = ( recordToNumber(packFrame(seq, last, data)) for seq, last, data in streamFrames(infile) )
+
+    # deal the decks of each stripe out to the couriers; a stripe ends after its
+    # parity decks, or with every courier dealt a deck when there are none
+    k = run = 0
+    for num in nums:
+        shares[k].append(num)
+        k += 1
+        run += num >= EXT_BASE
+        if k == total or (parity and run == parity):
+            k = run = 0
+    return shares
+
+
+def hybridSharesToMessage(shares, thresh):
+    """
+    Decrypts a message from the decks of at least thresh couriers. With more, key
+    decks that do not agree with the rest are found and left out.
+
+    Args:
+        shares (list): For each courier, its list of deck numbers, key deck first
+        thresh (int): The threshold the message was encrypted with
+
+    Returns:
+        tuple: The message, and the sorted indexes of the couriers whose key
+            decks were left out
+
+    Raises:
+        ValueError: If too few or too many bad decks were given, or the message
+            fails its tag check
+    """
+    if len(shares) < thresh:
+        raise ValueError(str(thresh)+" shares are required, but "+str(len(shares))+" were provided")
+
+    # exact repeats of a courier's key deck are skipped
+    points = collections.OrderedDict()
+    for i, nums in enumerate(shares):
+        x = nums[0] >> 216 if nums else 0
+        if not 1 <= x <= MAX_SHARES:
+            raise ValueError("Share "+str(i+1)+" does not start with a key deck")
+        point = points.setdefault(x, (i, nums[0] & SECRET_MASK))
+        if point[1] != nums[0] & SECRET_MASK:
+            raise ValueError("Two key decks were given for share "+str(x)+", which do not agree")
+    if len(points) < thresh:
+        raise ValueError(str(thresh)+" different key decks are required, but "+str(len(points))+" were provided")
+    xs = list(points)
+    ys = [ points[x][1] for x in xs ]
+    bad = findBadShares(xs, ys, thresh)
+    good = [ i for i in range(0, len(xs)) if i not in bad ][:thresh]
+    keyNum = sssJoin([ [ xs[i], ys[i] ] for i in good ])
+    if keyNum >> (8 * HYBRID_KEY_SIZE):
+        raise ValueError("The decks do not decrypt to an authentic message; a deck was mistyped or tampered with")
+
+    seen = set()
+    nums = []
+    for share in shares:
+        for num in share[1:]:
+            if num not in seen:
+                seen.add(num)
+                nums.append(num)
+    cipher = b('').join(framesToStream(repairErasures(nums)))
+    return hybridDecrypt(cipher, numberToRecord(keyNum, HYBRID_KEY_SIZE)), sorted([ points[xs[i]][0] for i in bad ])
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Load Test
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Sends many pipelined requests to a scs28 server over several connections, and
+reports requests per second and latency percentiles.
+
+Load testing a running server with 4 connections of encrypt requests:
+    ./scs28_loadtest.py /tmp/scs28.sock --op encrypt --connections 4
+
+Starting a server for the test, and comparing with running scs28.py per request:
+    ./scs28_loadtest.py --spawn --cli-baseline 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import scs28_server
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Message and deck used by the requests of each op
+MESSAGE = "Load test message"
+DECK = "JD 6C 3C 4D 3D 10D QD 2D KS AH KC 7C 10C 5D 8C 8D 5H 3H QC AD 2H 4H 7D 9C 6D 5C JC AC 9D 4C 6H KD 7H 8H 9H 10H JH QH KH AS 2S 3S 4S 5S 6S 7S 8S 9S 10S JS QS 2C"
+
+# scs28.py arguments doing the same as each op, for --cli-baseline
+CLI_ARGS = {
+    "encode": ['-e', MESSAGE],
+    "decode": ['-d', '-q', DECK],
+    "encrypt": ['-E', '-t', '3', '-n', '5', MESSAGE],
+}
+
+
+def main(argv=None):
+    apar = argparse.ArgumentParser(prog='scs28_loadtest',
+    description="""    Super Card Shuffle 28 load test --
+    Measures the throughput and latency of a scs28 server.
+    """)
+    apar.add_argument('address', metavar='ADDRESS', nargs='?',
+            help='server address: UNIX socket path, port number, or HOST:PORT')
+    apar.add_argument('--spawn', action='store_true',
+            help='start a server on a temporary UNIX socket for the test')
+    apar.add_argument('-w','--workers', type=int, metavar='COUNT',
+            help='with --spawn, number of worker processes for the server')
+    apar.add_argument('--op', default='encode', choices=('encode', 'decode', 'encrypt', 'decrypt', 'mix'),
+            help='operation to request; mix cycles through all four; default of encode')
+    apar.add_argument('-c','--connections', type=int, default=4, metavar='COUNT',
+            help='number of connections sending at once; default of 4')
+    apar.add_argument('-r','--requests', type=int, default=5000, metavar='COUNT',
+            help='total number of requests; default of 5000')
+    apar.add_argument('--depth', type=int, default=32, metavar='COUNT',
+            help='requests in flight on each connection; default of 32')
+    apar.add_argument('--cli-baseline', type=int, default=0, metavar='COUNT',
+            help='also time COUNT runs of scs28.py doing the same op, one process each')
+    pargs = apar.parse_args(argv)
+
+    if not pargs.address and not pargs.spawn:
+        apar.error("give a server ADDRESS or --spawn")
+
+    server = None
+    tmpdir = None
+    address = pargs.address
+    if pargs.spawn:
+        tmpdir = tempfile.TemporaryDirectory()
+        address = os.path.join(tmpdir.name, 'scs28.sock')
+        cmd = [sys.executable, os.path.join(HERE, 'scs28_server.py'), address]
+        if pargs.workers is not None:
+            cmd += ['-w', str(pargs.workers)]
+        server = subprocess.Popen(cmd)
+        waitForServer(address)
+
+    try:
+        templates = buildRequests(address)
+        ops = list(templates) if pargs.op == 'mix' else [ pargs.op ]
+        requests = [ templates[ops[i % len(ops)]] for i in range(pargs.requests) ]
+        report = runLoad(address, requests, pargs.connections, pargs.depth)
+        print("Requests:    ", report["requests"], "over", pargs.connections, "connections,", pargs.depth, "deep")
+        print("Errors:      ", report["errors"])
+        print("Throughput:  ", "%.1f requests/s" % report["per_sec"])
+        print("Latency:      p50 %.2f ms   p90 %.2f ms   p99 %.2f ms" % (report["p50_ms"], report["p90_ms"], report["p99_ms"]))
+        if pargs.cli_baseline and pargs.op in CLI_ARGS:
+            perSec = cliBaseline(CLI_ARGS[pargs.op], pargs.cli_baseline)
+            print("scs28.py:    ", "%.1f requests/s, one process each" % perSec)
+        elif pargs.cli_baseline:
+            print("scs28.py:     no baseline for op", pargs.op)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+    return 0
+
+
+def waitForServer(address, timeout=30):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            with scs28_server.DeckClient(address) as client:
+                client.request("ping")
+            return
+        except (OSError, ValueError):
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def buildRequests(address):
+    """
+    One request per op; the decrypt request uses shares made by the server.
+    """
+    with scs28_server.DeckClient(address) as client:
+        decks = client.encrypt(b"Load test secret", 3, 5)
+    return {
+        "encode": { "op": "encode", "message": MESSAGE },
+        "decode": { "op": "decode", "deck": DECK },
+        "encrypt": { "op": "encrypt", "message": MESSAGE, "thresh": 3, "total": 5 },
+        "decrypt": { "op": "decrypt", "decks": decks[:3], "thresh": 3 },
+    }
+
+
+def runLoad(address, requests, connections, depth):
+    """
+    Sends the requests split over several connections at once, each keeping depth
+    requests in flight, and times every request from sending to its response.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(share):
+        times = []
+        failed = 0
+        with scs28_server.DeckClient(address) as client:
+            sent = []
+            lines = [ json.dumps(r).encode("utf-8") + b"\n" for r in share ]
+            for i in range(min(depth, len(lines))):
+                sent.append(time.time())
+                client.send([ lines[i] ])
+            for i in range(len(lines)):
+                response = client.receive()
+                times.append(time.time() - sent[i])
+                failed += "error" in response
+                if len(sent) < len(lines):
+                    sent.append(time.time())
+                    client.send([ lines[len(sent) - 1] ])
+        with lock:
+            latencies.extend(times)
+            errors[0] += failed
+
+    threads = [ threading.Thread(target=worker, args=(requests[c::connections],)) for c in range(connections) ]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+
+    latencies.sort()
+    pick = lambda pct: latencies[min(len(latencies) - 1, int(pct / 100.0 * len(latencies)))] * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "per_sec": len(latencies) / elapsed,
+        "p50_ms": pick(50),
+        "p90_ms": pick(90),
+        "p99_ms": pick(99),
+    }
+
+
+def cliBaseline(args, count):
+    """
+    Times running scs28.py once per request, for comparison with the server.
+    """
+    start = time.time()
+    for _ in range(count):
+        subprocess.check_call([sys.executable, os.path.join(HERE, 'scs28.py')] + args, stdout=subprocess.DEVNULL)
+    return count / (time.time() - start)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
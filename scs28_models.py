@@ -0,0 +1,204 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Deck Models
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Decks other than the standard 52 cards: jokers, shoes of several decks with
+different backs, and reduced decks like piquet.
+"""
+
+from __future__ import print_function
+import collections
+
+from scs28 import (CARD_LOOKUP, CARD_NAMES, compat_translate, DeckParseError,
+    extendFactorials, FACTORIALS, MAX_SHOE_DECKS, messageToNumber, numberToMessage,
+    rankPermutation, RANKS, SUITS, unrankPermutation)
+
+
+###############################
+## Deck Models
+###############################
+
+# Decks other than the usual 52 cards hold more or less of a message. A deck of
+# n different cards has n! orders, so holds the whole bytes of log2(n!) bits: 29
+# bytes with two jokers added, and 68 bytes for two decks with different backs.
+# Cards of a shoe are written with their back number after a slash, like QH/2.
+JOKER_NAMES = ("RJ", "BJ")
+
+
+class DeckModel(object):
+    """
+    A kind of deck, given as its card identifiers in card number order. How much
+    of a message a deck holds is worked out from its number of cards. Numbers are
+    put into a deck the same way as encodeNumberToCards, so the standard model
+    gives the same decks as the rest of scs28.
+
+    Args:
+        name (str): Name of the model
+        cards (list): Card identifiers, upper case; a card of a standard deck may
+            be followed by a slash and the back it has, like QH/2
+
+    Attributes:
+        size (int): Number of cards in a deck
+        radix (int): Number of different orders of a deck, size!
+        capacity (int): Bytes of message a deck holds
+
+    Raises:
+        ValueError: If there are fewer than 2 cards, or a card is repeated
+    """
+    def __init__(self, name, cards):
+        if len(cards) < 2 or len(set(cards)) != len(cards):
+            raise ValueError("A deck model needs 2 or more different cards")
+        self.name = name
+        self.cards = tuple(cards)
+        self.size = len(self.cards)
+        extendFactorials(self.size)
+        self.radix = FACTORIALS[self.size]
+        self.capacity = (self.radix.bit_length() - 1) // 8
+
+        # every spelling of a standard card is accepted, with the same back
+        spellings = {}
+        for spelling, num in CARD_LOOKUP.items():
+            spellings.setdefault(CARD_NAMES[num], []).append(spelling)
+        self.lookup = {}
+        for num, ident in enumerate(self.cards):
+            base, slash, back = ident.partition('/')
+            for spelling in spellings.get(base, [base]):
+                self.lookup[spelling + slash + back] = num
+
+    def numberToCards(self, number):
+        """
+        Converts a number from 0 up to radix into a deck of this model.
+        """
+        size = self.size
+        perm = unrankPermutation(number, size)
+        return [ (perm[(p + 1) % size] + size - 1) % size for p in range(0, size) ]
+
+    def cardsToNumber(self, cards):
+        """
+        Converts a deck of this model back into the number it encodes.
+        """
+        size = self.size
+        if len(cards) != size:
+            raise ValueError("A "+self.name+" deck requires "+str(size)+" cards")
+        perm = [0] * size
+        for p, card in enumerate(cards):
+            perm[(p + 1) % size] = (card + 1) % size
+        return rankPermutation(perm)
+
+    def cardToNumber(self, cstr):
+        """
+        Returns the card number of a card identifier, or None if it is not a card
+        of this model.
+        """
+        cstr = cstr.upper().strip()
+        num = self.lookup.get(cstr)
+        if num is None:
+            base, slash, back = cstr.partition('/')
+            num = self.lookup.get(compat_translate(base) + slash + back)
+        return num
+
+    def parseCards(self, cstr):
+        """
+        Parses a full deck of this model from space separated card identifiers.
+
+        Raises:
+            DeckParseError: If a card is invalid or repeated, or the deck is not complete
+        """
+        nums = []
+        seen = 0
+        for cl in cstr.split():
+            cnum = self.cardToNumber(cl)
+            if cnum is None:
+                raise DeckParseError("Could not parse "+cl+" as a card of a "+self.name+" deck", cl)
+            if (seen >> cnum) & 1:
+                raise DeckParseError("Duplicate card "+self.cards[cnum], cl)
+            seen |= 1 << cnum
+            nums.append(cnum)
+        if len(nums) != self.size:
+            raise DeckParseError("A "+self.name+" deck requires "+str(self.size)+" cards, but "+str(len(nums))+" were provided")
+        return nums
+
+    def cardsToString(self, cards):
+        return " ".join([ self.cards[c] for c in cards ])
+
+    def messageToCards(self, msg):
+        """
+        Raises:
+            ValueError: If the message is longer than capacity bytes
+        """
+        if len(msg) > self.capacity:
+            raise ValueError("A "+self.name+" deck holds at most "+str(self.capacity)+" bytes")
+        return self.numberToCards(messageToNumber(msg, self.capacity))
+
+    def cardsToMessage(self, cards):
+        """
+        Converts a deck of this model back into its message; as with
+        numberToMessage, null bytes at either end are dropped.
+        """
+        return numberToMessage(self.cardsToNumber(cards), self.capacity)
+
+    def __repr__(self):
+        return "DeckModel('" + self.name + "', " + str(self.size) + " cards)"
+
+
+def shoeModel(decks):
+    """
+    A model of several standard decks shuffled together, told apart by their backs,
+    which are numbered from 1.
+    """
+    return DeckModel("shoe"+str(decks), [ name + "/" + str(back) for back in range(1, decks + 1) for name in CARD_NAMES ])
+
+
+def reducedModel(name, ranks):
+    """
+    A model of a deck with only the given ranks in each suit, like the 32 card
+    piquet deck.
+    """
+    return DeckModel(name, [ rank + suit for suit in SUITS for rank in ranks ])
+
+
+DECK_MODELS = collections.OrderedDict([
+    ("standard", lambda: DeckModel("standard", CARD_NAMES)),
+    ("jokers", lambda: DeckModel("jokers", CARD_NAMES + JOKER_NAMES)),
+    ("shoe2", lambda: shoeModel(2)),
+    ("piquet", lambda: reducedModel("piquet", RANKS[:1] + RANKS[6:])),
+    ("euchre", lambda: reducedModel("euchre", RANKS[:1] + RANKS[8:])),
+])
+
+
+def deckModel(name):
+    """
+    Returns the deck model of a name from DECK_MODELS, or a shoe of 2 to
+    MAX_SHOE_DECKS decks named like shoe3.
+
+    Raises:
+        ValueError: If there is no model of that name
+    """
+    name = name.lower()
+    if name in DECK_MODELS:
+        return DECK_MODELS[name]()
+    if name.startswith("shoe") and name[4:].isdigit() and 2 <= int(name[4:]) <= MAX_SHOE_DECKS:
+        return shoeModel(int(name[4:]))
+    raise ValueError("Unknown deck model "+name+"; use one of "+", ".join(DECK_MODELS)+", or shoeN for a shoe of 2 to "+str(MAX_SHOE_DECKS)+" decks")
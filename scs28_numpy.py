@@ -0,0 +1,181 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! NumPy Batches
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Encodes and decodes many decks at once with NumPy.
+"""
+
+from __future__ import print_function
+from scs28 import b
+
+
+###############################
+## Batch Encoding with NumPy
+###############################
+
+# Decks in a batch are rows of an (N, 52) uint8 array. Deck numbers are held as
+# little endian rows of 32 bit limbs inside uint64 columns, so the factorial
+# digit arithmetic runs on whole columns at once. NumPy is only needed here and
+# is imported when a batch function is first called.
+LIMB_BITS = 32
+LIMB_MASK = (1 << LIMB_BITS) - 1
+BATCH_LIMBS = 8
+
+
+def messagesToLimbs(msgs):
+    """
+    Packs byte strings of up to 28 bytes each into an (N, 8) array of 32 bit limbs,
+    least significant limb first; the same numbers messageToNumber would produce.
+    """
+    import numpy as np
+    if max(len(msg) for msg in msgs) > 28:
+        raise ValueError("Messages must be 28 bytes or shorter")
+    width = BATCH_LIMBS * 4
+    raw = b('').join([ msg.rjust(width, b('\0')) for msg in msgs ])
+    limbs = np.frombuffer(raw, dtype='>u4').reshape(-1, BATCH_LIMBS)
+    return limbs[:, ::-1].astype(np.uint64)
+
+
+def limbsToMessages(limbs):
+    """
+    Inverse of messagesToLimbs, stripping the null padding like numberToMessage.
+    """
+    import numpy as np
+    raw = np.ascontiguousarray(limbs[:, ::-1]).astype('>u4').tobytes()
+    width = BATCH_LIMBS * 4
+    return [ raw[i:i+width].strip(b('\0')) for i in range(0, len(raw), width) ]
+
+
+def batchDigitsFromLimbs(limbs):
+    """
+    Extracts the factorial base digits of every row by repeated division of the
+    limb columns by 2, 3, ... 52. Consumes the limbs.
+
+    Returns:
+        numpy.ndarray: An (N, 52) array of digits; column v has place value v!
+    """
+    import numpy as np
+    count = limbs.shape[0]
+    digits = np.zeros((count, 52), dtype=np.uint8)
+    for v in range(1, 52):
+        radix = np.uint64(v + 1)
+        rem = np.zeros(count, dtype=np.uint64)
+        for li in range(BATCH_LIMBS - 1, -1, -1):
+            cur = (rem << np.uint64(LIMB_BITS)) | limbs[:, li]
+            limbs[:, li] = cur // radix
+            rem = cur % radix
+        digits[:, v] = rem
+    if limbs.any():
+        raise ValueError("Number is too large to fit into 52 cards")
+    return digits
+
+
+def batchLimbsFromDigits(digits):
+    """
+    Inverse of batchDigitsFromLimbs; Horner evaluation of the factorial base digits.
+    """
+    import numpy as np
+    count = digits.shape[0]
+    limbs = np.zeros((count, BATCH_LIMBS), dtype=np.uint64)
+    for v in range(51, 0, -1):
+        radix = np.uint64(v + 1)
+        carry = digits[:, v].astype(np.uint64)
+        for li in range(0, BATCH_LIMBS):
+            cur = limbs[:, li] * radix + carry
+            limbs[:, li] = cur & np.uint64(LIMB_MASK)
+            carry = cur >> np.uint64(LIMB_BITS)
+    return limbs
+
+
+def batchUnrank(digits):
+    """
+    Vectorized unrankPermutation. Values are inserted smallest first, value v at
+    index v minus its digit, by shifting up the positions of the values already
+    placed at or after that index.
+    """
+    import numpy as np
+    count = digits.shape[0]
+    pos = np.zeros((count, 52), dtype=np.uint8)
+    for v in range(1, 52):
+        want = (v - digits[:, v].astype(np.int16)).astype(np.uint8)[:, None]
+        placed = pos[:, :v]
+        placed += placed >= want
+        pos[:, v] = want[:, 0]
+    perm = np.empty((count, 52), dtype=np.uint8)
+    perm[np.arange(count)[:, None], pos] = np.arange(52, dtype=np.uint8)
+    return perm
+
+
+def batchRank(perm):
+    """
+    Vectorized rankPermutation; digit v counts the smaller values right of v.
+    """
+    import numpy as np
+    count = perm.shape[0]
+    pos = np.empty((count, 52), dtype=np.uint8)
+    pos[np.arange(count)[:, None], perm] = np.arange(52, dtype=np.uint8)
+    digits = np.zeros((count, 52), dtype=np.uint8)
+    for v in range(1, 52):
+        digits[:, v] = (pos[:, :v] > pos[:, v:v+1]).sum(axis=1)
+    return digits
+
+
+def encodeMessagesToDecks(msgs):
+    """
+    Encodes many messages at once; the batch form of messageToNumber followed by
+    encodeNumberToCards.
+
+    Args:
+        msgs (sequence): Byte strings of at most 28 bytes each
+
+    Returns:
+        numpy.ndarray: An (N, 52) uint8 array, one deck per row
+    """
+    import numpy as np
+    if len(msgs) == 0:
+        return np.zeros((0, 52), dtype=np.uint8)
+    perm = batchUnrank(batchDigitsFromLimbs(messagesToLimbs(msgs)))
+    return ((np.roll(perm, -1, axis=1).astype(np.intp) + 51) % 52).astype(np.uint8)
+
+
+def decodeDecksToMessages(decks):
+    """
+    Decodes many decks at once; the batch form of decodeCardsToNumber followed by
+    numberToMessage.
+
+    Args:
+        decks (numpy.ndarray): An (N, 52) array, one deck per row
+
+    Returns:
+        list: The decoded byte strings, in row order
+    """
+    import numpy as np
+    decks = np.asarray(decks)
+    if decks.ndim != 2 or decks.shape[1] != 52:
+        raise ValueError("Decks must be an (N, 52) array")
+    if not (np.sort(decks, axis=1) == np.arange(52)).all():
+        raise ValueError("Every row must contain each of the 52 cards exactly once")
+    perm = np.roll((decks.astype(np.intp) + 1) % 52, 1, axis=1)
+    return limbsToMessages(batchLimbsFromDigits(batchRank(perm)))
@@ -0,0 +1,217 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Packed Secret Sharing
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Packed (ramp) Shamir's Secret Sharing of messages of any length, several
+27 byte blocks to each deck.
+"""
+
+from __future__ import print_function
+import struct
+
+# scs28.entropyPool is looked up on each use, as callers may replace it
+import scs28
+from scs28 import (b, decodeCardsToNumber, lagrangeWeights, numberToRecord, PRIME,
+    recordToNumber, shareRecordsToMessage)
+from scs28_packing import DECK_RADIX
+
+
+###############################
+## Packed Secret Sharing
+###############################
+
+# Packed sharing hides several 27 byte blocks in each polynomial, as its values
+# at 0, -1, ... -(pack-1). The polynomial is fixed by thresh+pack-1 values, of
+# degree thresh+pack-2: the blocks, then random values at the next thresh-1
+# points. So, as with plain SSS, any thresh-1 shares reveal nothing at all, and
+# with pack of 1 it is plain SSS. The price of needing pack times fewer decks is
+# that thresh+pack-1 shares are needed to recover the blocks, instead of thresh.
+#
+# The message is prefixed with the pack size and its length, then spread over as
+# many polynomials as needed. Each share is carried as one deck per polynomial,
+# in order. Share decks use numbers from EXT_BASE up, above anything a plain
+# deck holds: EXT_BASE + header * PRIME + y, where the header is 2 * (x-1),
+# plus 1 on the last deck of a share.
+EXT_BASE = 1 << 224
+EXT_HEADERS = (DECK_RADIX - EXT_BASE) // PRIME
+MAX_PACKED_SHARES = 127
+PACKED_HEADER = struct.Struct('>BI')
+
+
+def packShareNumber(x, last, y):
+    return EXT_BASE + (2 * (x - 1) + (1 if last else 0)) * PRIME + y
+
+
+def unpackShareNumber(num):
+    """
+    Returns:
+        tuple: The x coordinate, last deck flag and y value of a packed share deck
+            number, or None if the number is not one
+    """
+    if num < EXT_BASE:
+        return None
+    header, y = divmod(num - EXT_BASE, PRIME)
+    if header >= 2 * MAX_PACKED_SHARES:
+        return None
+    return header // 2 + 1, bool(header & 1), y
+
+
+def messageToPackedShares(msg, thresh, total, pack):
+    """
+    Splits a message of any length with packed secret sharing.
+
+    Args:
+        msg (bytes): The message
+        thresh (int): Number of shares that reveal nothing, plus 1
+        total (int): Number of shares to create; at least thresh+pack-1, which
+            is the number needed to recover the message
+        pack (int): Number of 27 byte blocks per polynomial
+
+    Returns:
+        list: For each share, the list of deck numbers that carry it
+    """
+    if not (1 <= pack and 2 <= thresh and thresh + pack - 1 <= total <= MAX_PACKED_SHARES):
+        raise ValueError("Packing requires 1 <= pack, 2 <= threshold, and threshold + pack - 1 <= shares <= "+str(MAX_PACKED_SHARES))
+    data = PACKED_HEADER.pack(pack, len(msg)) + msg
+    blocks = [ recordToNumber(data[i:i+27].ljust(27, b('\0'))) for i in range(0, len(data), 27) ]
+    while len(blocks) % pack:
+        blocks.append(0)
+
+    points = tuple([ (PRIME - j) % PRIME for j in range(0, thresh + pack - 1) ])
+    weights = [ lagrangeWeights(points, x) for x in range(1, total+1) ]
+    shares = [ [] for x in range(0, total) ]
+    polys = len(blocks) // pack
+    randoms = scs28.entropyPool.fieldElements(polys * (thresh - 1))
+    for pi in range(0, polys):
+        values = blocks[pi*pack:(pi+1)*pack] + randoms[pi*(thresh-1):(pi+1)*(thresh-1)]
+        for x in range(1, total+1):
+            y = sum([ w * v for w, v in zip(weights[x-1], values) ]) % PRIME
+            shares[x-1].append( packShareNumber(x, pi == polys - 1, y) )
+    return shares
+
+
+def packedSharesToMessage(shares):
+    """
+    Recovers a message from at least thresh+pack-1 packed shares; all of the
+    shares given are used, so the threshold and packing need not be known.
+
+    Args:
+        shares (list): For each share, the list of deck numbers that carry it
+
+    Raises:
+        ValueError: If the shares are inconsistent, corrupt or too few
+    """
+    xs = []
+    ys = []
+    for nums in shares:
+        parsed = [ unpackShareNumber(n) for n in nums ]
+        if None in parsed:
+            raise ValueError("Packed shares cannot be mixed with other decks")
+        if len(set([ p[0] for p in parsed ])) != 1:
+            raise ValueError("Decks from different shares were mixed together")
+        if [ p[1] for p in parsed ] != [False] * (len(parsed) - 1) + [True]:
+            raise ValueError("Decks of a share are missing or out of order")
+        xs.append(parsed[0][0])
+        ys.append([ p[2] for p in parsed ])
+    if len(set([ len(y) for y in ys ])) != 1:
+        raise ValueError("Shares do not all have the same number of decks")
+    xs = tuple(xs)
+
+    corrupt = "Packed shares are corrupt, or fewer than the threshold plus the packing minus 1 were given"
+    def block(pi, j):
+        w = lagrangeWeights(xs, (PRIME - j) % PRIME)
+        value = sum([ wi * y[pi] for wi, y in zip(w, ys) ]) % PRIME
+        if value >> 216:
+            raise ValueError(corrupt)
+        return numberToRecord(value, 27)
+
+    # the first block says how many blocks each polynomial holds
+    first = block(0, 0)
+    pack, length = PACKED_HEADER.unpack(first[:PACKED_HEADER.size])
+    if not 1 <= pack < len(xs) + 1 or length > 27 * pack * len(ys[0]) - PACKED_HEADER.size:
+        raise ValueError(corrupt)
+
+    data = [first]
+    for pi in range(0, len(ys[0])):
+        for j in range(1 if pi == 0 else 0, pack):
+            data.append( block(pi, j) )
+    data = b('').join(data)
+    if len(data) - PACKED_HEADER.size - length >= 27 * pack:
+        raise ValueError(corrupt)
+    return data[PACKED_HEADER.size:PACKED_HEADER.size+length]
+
+
+def parsePackedShare(nums):
+    """
+    Returns:
+        tuple: The x coordinate and list of y values of a packed share from its
+            deck numbers, or None if they are not one whole share in order
+    """
+    parsed = [ unpackShareNumber(n) for n in nums ]
+    if not parsed or None in parsed or len(set([ p[0] for p in parsed ])) != 1:
+        return None
+    if [ p[1] for p in parsed ] != [False] * (len(parsed) - 1) + [True]:
+        return None
+    return parsed[0][0], [ p[2] for p in parsed ]
+
+
+def packedShareHasMore(deck):
+    """
+    True if the deck is a packed share deck with more decks of its share to follow.
+    """
+    return packedNumberHasMore(decodeCardsToNumber(deck))
+
+
+def packedNumberHasMore(num):
+    """
+    Like packedShareHasMore, for a deck number that is already decoded.
+    """
+    parsed = unpackShareNumber(num)
+    return parsed is not None and not parsed[1]
+
+
+def sharedDecksToMessage(shares):
+    """
+    Decrypts a message from the decks of each share, detecting whether they hold
+    plain or packed shares.
+
+    Args:
+        shares (list): For each share, the list of its decks in order
+    """
+    return sharedNumbersToMessage([ [ decodeCardsToNumber(d) for d in decks ] for decks in shares ])
+
+
+def sharedNumbersToMessage(nums):
+    """
+    Like sharedDecksToMessage, for deck numbers that are already decoded.
+
+    Args:
+        nums (list): For each share, the list of its deck numbers in order
+    """
+    if unpackShareNumber(nums[0][0]) is not None:
+        return packedSharesToMessage(nums)
+    if [ len(n) for n in nums ] != [1] * len(nums) or max([ n[0] for n in nums ]) >= EXT_BASE:
+        raise ValueError("Packed shares cannot be mixed with other decks")
+    return shareRecordsToMessage([ numberToRecord(n[0]) for n in nums ])
@@ -0,0 +1,142 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Packing
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Packs a byte stream into the fewest decks possible, using every order of
+every deck.
+"""
+
+from __future__ import print_function
+from scs28 import (decodeCardsToNumber, encodeNumberToCards, FACTORIALS, numberToRecord,
+    readFully, recordToNumber)
+
+
+###############################
+## Mixed Radix Packing
+###############################
+
+# Packed data is one big number written in base 52!, one deck per digit, which
+# uses the full 225.58 bits of each deck instead of 28 whole bytes. To keep the
+# cost linear, data is converted in groups of PACK_GROUP_DECKS decks holding
+# PACK_GROUP_BYTES bytes each. The final group holds the remaining 0 up to
+# PACK_GROUP_BYTES bytes behind a single 1 bit marking its length, and uses only
+# as many decks as that takes. A decoder tells the final group apart by it being
+# followed by no further decks.
+DECK_RADIX = FACTORIALS[52]
+PACK_GROUP_DECKS = 256
+PACK_GROUP_BYTES = ((DECK_RADIX ** PACK_GROUP_DECKS).bit_length() - 2) // 8
+
+
+def packedDeckCount(size):
+    """
+    Number of decks needed for the final group of a packed stream, given the
+    number of data bytes in that group.
+    """
+    top = 1 << (size * 8 + 1)
+    k = 1
+    power = DECK_RADIX
+    while power < top:
+        power *= DECK_RADIX
+        k += 1
+    return k
+
+
+def numberToPackedDecks(num, count):
+    """
+    Writes a number as count base 52! digits, least significant first, as decks.
+    """
+    decks = []
+    for i in range(0, count):
+        num, digit = divmod(num, DECK_RADIX)
+        decks.append( encodeNumberToCards(digit) )
+    return decks
+
+
+def packedDecksToNumber(decks):
+    """
+    Inverse of numberToPackedDecks.
+    """
+    return packedNumbersToNumber([ decodeCardsToNumber(deck) for deck in decks ])
+
+
+def packedNumbersToNumber(nums):
+    num = 0
+    for n in reversed(nums):
+        num = num * DECK_RADIX + n
+    return num
+
+
+def packedStreamToDecks(infile):
+    """
+    Generator reading a binary file incrementally and yielding its packed decks.
+    One group of data is read ahead to know which group is the final one.
+    """
+    data = readFully(infile, PACK_GROUP_BYTES)
+    while True:
+        ahead = readFully(infile, PACK_GROUP_BYTES)
+        if not ahead:
+            break
+        for deck in numberToPackedDecks(recordToNumber(data), PACK_GROUP_DECKS):
+            yield deck
+        data = ahead
+
+    num = (1 << (len(data) * 8)) | recordToNumber(data)
+    for deck in numberToPackedDecks(num, packedDeckCount(len(data))):
+        yield deck
+
+
+def packedDecksToStream(decks):
+    """
+    Generator unpacking decks, in the order they were produced, back into data.
+    Holds at most one group of decks in memory.
+
+    Raises:
+        ValueError: If the decks do not form a complete packed stream
+    """
+    return packedNumbersToStream( decodeCardsToNumber(deck) for deck in decks )
+
+
+def packedNumbersToStream(nums):
+    """
+    Generator unpacking the numbers of packed decks back into data, as
+    packedDecksToStream does.
+    """
+    group = []
+    for n in nums:
+        if len(group) == PACK_GROUP_DECKS:
+            num = packedNumbersToNumber(group)
+            if num >> (PACK_GROUP_BYTES * 8):
+                raise ValueError("Packed decks are corrupt or out of order")
+            yield numberToRecord(num, PACK_GROUP_BYTES)
+            group = []
+        group.append(n)
+
+    if not group:
+        raise ValueError("No packed decks were given")
+    num = packedNumbersToNumber(group)
+    size = (num.bit_length() - 1) // 8
+    if num.bit_length() != size * 8 + 1 or packedDeckCount(size) != len(group):
+        raise ValueError("Packed decks are corrupt, out of order, or missing at the end")
+    yield numberToRecord(num ^ (1 << (size * 8)), size)
@@ -0,0 +1,201 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Stacking Plans
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Plans the steps for putting a deck into order by hand, with an estimate of
+the time they take.
+"""
+
+from __future__ import print_function
+from scs28 import CARD_NAMES, deckToString
+
+
+###############################
+## Stacking Plans
+###############################
+
+# Putting cards into order by hand is slow one card at a time. A plan instead
+# takes whole blocks: runs of cards that already lie together, in the right
+# order, in the deck being taken from. The deck is fanned face up, top card
+# first, and the new deck is built from its top card down.
+#
+# Taking the longest block that starts with the next card needed is never worse
+# than taking a shorter one, so the takes are found greedily. Before them, the
+# source can be turned over, cut, or dealt into suit piles, which changes what
+# lies together and how long each card takes to find. Those preparations are
+# searched cheapest first, and the search stops once a preparation alone costs
+# more than the best whole plan found.
+
+# Estimated seconds for each kind of handling
+PLAN_MOVE = 1.5   # taking a block to the new deck
+PLAN_CARD = 0.2   # each card in a block
+PLAN_SEEK = 0.15  # each card looked past to find a block in a shuffled pile
+PLAN_GLANCE = 0.5 # finding a block in a pile that is in card order
+PLAN_FLIP = 1.5   # turning the deck over
+PLAN_CUT = 2.0    # cutting the deck
+PLAN_DEAL = 0.7   # each card dealt into a suit pile
+
+SUIT_PILES = ("clubs", "diamonds", "hearts", "spades")
+
+
+def pileInOrder(pile):
+    """
+    True if a pile is in card order, either way round, apart from a cut; finding a
+    card in such a pile is quick, and taking cards out keeps it that way.
+    """
+    for p in (pile, pile[::-1]):
+        drops = len([ i for i in range(1, len(p)) if p[i] < p[i-1] ])
+        if drops == 0 or (drops == 1 and p[-1] < p[0]):
+            return True
+    return False
+
+
+def planTakes(piles, target):
+    """
+    Greedily takes the longest block holding the next cards of target from the
+    piles, without changing them.
+
+    Returns:
+        tuple: The estimated seconds, and a ("take", cards, pile) step per block,
+            where pile is the index of the pile or None if there is only one
+    """
+    piles = [ list(p) for p in piles ]
+    ordered = [ pileInOrder(p) for p in piles ]
+    where = {}
+    for pi, pile in enumerate(piles):
+        for card in pile:
+            where[card] = pi
+
+    seconds = 0.0
+    steps = []
+    i = 0
+    while i < len(target):
+        pi = where[target[i]]
+        pile = piles[pi]
+        k = pile.index(target[i])
+        n = 1
+        while k + n < len(pile) and i + n < len(target) and pile[k + n] == target[i + n]:
+            n += 1
+        seconds += PLAN_MOVE + PLAN_CARD * n + (PLAN_GLANCE if ordered[pi] else PLAN_SEEK * k)
+        steps.append(("take", target[i:i+n], pi if len(piles) > 1 else None))
+        del pile[k:k+n]
+        i += n
+    return seconds, steps
+
+
+def planStacking(target, start=None):
+    """
+    Plans how to put a deck into the order of target by hand.
+
+    Args:
+        target (list): The deck to make, as card numbers from the top down
+        start (list): The deck to take cards from, from the top down; a deck in
+            card order (clubs, diamonds, hearts then spades, each ace to king) if
+            not given
+
+    Returns:
+        tuple: The estimated seconds, and the list of steps; followPlan gives
+            the deck the steps make, and describePlan explains them
+    """
+    import heapq
+    start = list(range(0, 52)) if start is None else list(start)
+    target = list(target)
+    if sorted(start) != sorted(target):
+        raise ValueError("The target deck must hold the same cards as the start deck")
+
+    # each preparation is done at most once, in this order, so that no two
+    # sequences give the same piles
+    kinds = ("flip", "cut", "suits")
+    best = None
+    count = 0
+    heap = [(0.0, count, [], [start])]
+    while heap:
+        prep, _, steps, piles = heapq.heappop(heap)
+        if best is not None and prep + PLAN_MOVE + PLAN_CARD * len(target) >= best[0]:
+            break
+        seconds, takes = planTakes(piles, target)
+        if best is None or prep + seconds < best[0]:
+            best = (prep + seconds, steps + takes)
+        if len(piles) > 1:
+            continue
+
+        pile = piles[0]
+        done = kinds.index(steps[-1][0]) + 1 if steps else 0
+        branches = []
+        if done <= 0:
+            branches.append((PLAN_FLIP, ("flip",), [pile[::-1]]))
+        if done <= 1:
+            for k in range(1, len(pile)):
+                branches.append((PLAN_CUT, ("cut", pile[k]), [pile[k:] + pile[:k]]))
+        if done <= 2:
+            suits = [ [ c for c in pile if c // 13 == suit ] for suit in range(0, 4) ]
+            branches.append((PLAN_DEAL * len(pile), ("suits",), suits))
+        for cost, step, nextPiles in branches:
+            count += 1
+            heapq.heappush(heap, (prep + cost, count, steps + [step], nextPiles))
+    return best
+
+
+def followPlan(steps, start=None):
+    """
+    Carries out the steps of a plan from planStacking, returning the deck they make.
+    """
+    piles = [ list(range(0, 52)) if start is None else list(start) ]
+    deck = []
+    for step in steps:
+        if step[0] == "flip":
+            piles = [ piles[0][::-1] ]
+        elif step[0] == "cut":
+            k = piles[0].index(step[1])
+            piles = [ piles[0][k:] + piles[0][:k] ]
+        elif step[0] == "suits":
+            piles = [ [ c for c in piles[0] if c // 13 == suit ] for suit in range(0, 4) ]
+        else:
+            pile = piles[step[2] or 0]
+            k = pile.index(step[1][0])
+            if pile[k:k+len(step[1])] != list(step[1]):
+                raise ValueError("Cards "+deckToString(step[1])+" do not lie together")
+            del pile[k:k+len(step[1])]
+            deck.extend(step[1])
+    return deck
+
+
+def describePlan(steps):
+    """
+    Returns:
+        list: A line of instructions for each step of a plan from planStacking
+    """
+    lines = []
+    for step in steps:
+        if step[0] == "flip":
+            lines.append("Turn the deck over, so its order is reversed")
+        elif step[0] == "cut":
+            lines.append("Cut the deck so that " + CARD_NAMES[step[1]] + " is on top")
+        elif step[0] == "suits":
+            lines.append("Deal the deck into four piles by suit, keeping the cards in order")
+        else:
+            where = "" if step[2] is None else " from the " + SUIT_PILES[step[2]] + " pile"
+            lines.append("Take " + deckToString(step[1]) + where)
+    return lines
@@ -0,0 +1,220 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Profiling
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Times each stage of scs28 for --profile, and calls hooks after every
+profiled call.
+"""
+
+from __future__ import print_function
+import collections
+import functools
+import sys
+import time
+
+import scs28
+
+###############################
+## Profiling
+###############################
+
+# Functions timed by StageProfiler, by stage; names with a dot are methods of a class
+PROFILE_STAGES = collections.OrderedDict([
+    ("parse", ("cardToNumber", "parseCardNumbers")),
+    ("rank", ("encodeNumberToCards", "decodeCardsToNumber", "batchUnrank", "batchRank")),
+    ("sss", ("sssSplit", "sssJoin", "lagrangeWeights", "modInv", "modInvBatch",
+        "messageToPackedShares", "packedSharesToMessage", "stripeParity", "repairStripe",
+        "EntropyPool.fieldElements")),
+    ("hex", ("shareToSecret", "secretToShare", "secretToCards", "cardsToSecret",
+        "messageToNumber", "numberToMessage", "recordToNumber", "numberToRecord",
+        "shareToRecord", "recordToShare")),
+    ("output", ("outputDecksVertical", "outputDeckHorizontal", "DeckFormatter.write")),
+])
+
+# Clock for profiling; perf_counter is only in Python 3
+PROFILE_CLOCK = getattr(time, 'perf_counter', time.time)
+
+# Held by the active profiler; two at once would wrap each other's wrappers,
+# and the one exiting last would leave the other's in place
+try:
+    from _thread import allocate_lock
+except ImportError:
+    from thread import allocate_lock
+PROFILE_LOCK = allocate_lock()
+
+
+class StageProfiler(object):
+    """
+    Counts calls, wall time and memory blocks of the functions in PROFILE_STAGES.
+    While a profiler is active, as a context manager, each of those functions is
+    replaced by a timing wrapper in scs28 and in every feature module that imports
+    it, so calls between the modules are timed too; the originals are put back when
+    it exits, even on an error, so nothing is spent on profiling when no profiler
+    is active. Only one profiler can be active at a time in a process.
+
+    Time is kept both inclusive of, and exclusive of ("self"), the time spent in
+    other profiled functions, so that stage totals do not count nested calls twice.
+    Memory is the net change in allocated blocks over each call, which is not a
+    count of allocations: blocks freed before the call returns cancel out, so it
+    can be zero or negative. It is only measured on Python 3.4 and up.
+
+    Hooks added with addHook are called as hook(stage, name, seconds) after every
+    profiled call. A cProfile.Profile set as the cprofile attribute is enabled
+    for as long as the profiler is active.
+    """
+    def __init__(self):
+        self.stats = collections.OrderedDict()
+        self.hooks = []
+        self.cprofile = None
+        self.originals = []
+        self.stack = []
+        self.started = None
+        self.seconds = 0.0
+
+    def addHook(self, hook):
+        self.hooks.append(hook)
+
+    def removeHook(self, hook):
+        self.hooks.remove(hook)
+
+    def __enter__(self):
+        if not PROFILE_LOCK.acquire(False):
+            raise RuntimeError("A profiler is already active")
+        try:
+            namespaces = [ vars(scs28) ] + [ vars(module) for module in scs28.featureModules() ]
+            for stage, names in PROFILE_STAGES.items():
+                for name in names:
+                    owner, attr = name.split(".") if "." in name else (None, name)
+                    homes = [ ns for ns in namespaces if (owner or attr) in ns ]
+                    if not homes:
+                        continue
+                    if owner:
+                        target = homes[0][owner]
+                        func = target.__dict__[attr]
+                        self.originals.append((target, attr, func))
+                        setattr(target, attr, self.wrap(stage, name, func))
+                        continue
+                    func = homes[0][attr]
+                    wrapped = self.wrap(stage, name, func)
+                    for namespace in homes:
+                        if namespace[attr] is func:
+                            self.originals.append((namespace, attr, func))
+                            namespace[attr] = wrapped
+            if self.cprofile is not None:
+                self.cprofile.enable()
+        except BaseException:
+            self.restore()
+            raise
+        self.started = PROFILE_CLOCK()
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self.seconds += PROFILE_CLOCK() - self.started
+            if self.cprofile is not None:
+                self.cprofile.disable()
+        finally:
+            self.restore()
+
+    def restore(self):
+        """
+        Puts back the original functions, and lets another profiler start.
+        """
+        try:
+            while self.originals:
+                target, attr, func = self.originals.pop()
+                if isinstance(target, dict):
+                    target[attr] = func
+                else:
+                    setattr(target, attr, func)
+        finally:
+            PROFILE_LOCK.release()
+
+    def wrap(self, stage, name, func):
+        """
+        Returns a wrapper of func that adds each call to the stats for name.
+        """
+        stat = self.stats.setdefault(name, [stage, 0, 0.0, 0.0, 0])
+        stack = self.stack
+        hooks = self.hooks
+        clock = PROFILE_CLOCK
+        blocks = getattr(sys, 'getallocatedblocks', lambda: 0)
+
+        def profiled(*args, **kwargs):
+            stack.append(0.0)
+            startBlocks = blocks()
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                inner = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                stat[1] += 1
+                stat[2] += elapsed
+                stat[3] += elapsed - inner
+                stat[4] += blocks() - startBlocks
+                for hook in hooks:
+                    hook(stage, name, elapsed)
+        return functools.wraps(func)(profiled)
+
+    def report(self):
+        """
+        Returns the profile as a dictionary ready for JSON: total wall time, time
+        outside any profiled function, and calls, seconds and the net change in
+        allocated blocks for each stage and for each function that was called.
+        """
+        stages = collections.OrderedDict()
+        functions = collections.OrderedDict()
+        for stage in PROFILE_STAGES:
+            stages[stage] = { "calls": 0, "seconds": 0.0, "net_blocks": 0 }
+        for name, (stage, calls, seconds, selfSeconds, netBlocks) in self.stats.items():
+            if not calls:
+                continue
+            stages[stage]["calls"] += calls
+            stages[stage]["seconds"] += selfSeconds
+            stages[stage]["net_blocks"] += netBlocks
+            functions[name] = { "stage": stage, "calls": calls, "seconds": seconds,
+                    "self_seconds": selfSeconds, "net_blocks": netBlocks }
+        return collections.OrderedDict([
+            ("wall_seconds", self.seconds),
+            ("other_seconds", self.seconds - sum([ s["seconds"] for s in stages.values() ])),
+            ("stages", stages),
+            ("functions", functions),
+        ])
+
+
+def writeProfileReport(report, path):
+    """
+    Writes a profile report as JSON to a file, or to stderr if the path is "-".
+    """
+    import json
+    text = json.dumps(report, indent=2)
+    if path == '-':
+        print (text, file=sys.stderr)
+    else:
+        with open(path, 'w') as outfile:
+            outfile.write(text + "\n")
@@ -0,0 +1,265 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Robust Decryption
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Decrypts from more decks than the threshold, finding and leaving out shares
+that do not agree with the rest.
+"""
+
+from __future__ import print_function
+import collections
+
+from scs28 import (decodeCardsToNumber, lagrangeWeights, modInv, modInvBatch,
+    numberToMessage, PRIME, SECRET_MASK, sssJoin)
+from scs28_packed import EXT_BASE, packedSharesToMessage, parsePackedShare
+
+
+###############################
+## Robust Decryption
+###############################
+
+# Given more shares than the threshold, bad ones (a shuffled or mistyped deck)
+# can be found instead of silently spoiling the message. The shares are first
+# checked against the polynomial through the first thresh of them, which costs
+# almost nothing when they all agree. Only if one disagrees is the polynomial
+# decoded with Gao's algorithm, which finds it as long as no more than half of
+# the shares beyond the threshold are bad, without trying every subset.
+
+def polyTrim(a):
+    while a and a[-1] == 0:
+        a.pop()
+    return a
+
+
+def polyMul(a, b):
+    if not a or not b:
+        return []
+    out = [0] * (len(a) + len(b) - 1)
+    for i, ai in enumerate(a):
+        if ai:
+            for j, bj in enumerate(b):
+                out[i+j] += ai * bj
+    return [ c % PRIME for c in out ]
+
+
+def polySub(a, b):
+    size = max(len(a), len(b))
+    a = a + [0] * (size - len(a))
+    b = b + [0] * (size - len(b))
+    return polyTrim([ (ai - bi) % PRIME for ai, bi in zip(a, b) ])
+
+
+def polyDivmod(a, b):
+    """
+    Returns:
+        tuple: The quotient and remainder of polynomial a divided by b, with
+            coefficients listed lowest power first
+    """
+    rem = list(a)
+    inv = modInv(b[-1])
+    quot = [0] * max(0, len(a) - len(b) + 1)
+    for i in range(len(quot) - 1, -1, -1):
+        c = (rem[i+len(b)-1] * inv) % PRIME
+        quot[i] = c
+        if c:
+            for j, bj in enumerate(b):
+                rem[i+j] = (rem[i+j] - c * bj) % PRIME
+    return polyTrim(quot), polyTrim(rem[:len(b)-1])
+
+
+def polyEval(a, x):
+    accum = 0
+    for c in reversed(a):
+        accum = (accum * x + c) % PRIME
+    return accum
+
+
+def interpolatePoly(xs, ys):
+    """
+    Interpolates through the points, building each Lagrange basis polynomial by
+    dividing the product of (X - x) by one of its factors.
+
+    Returns:
+        tuple: The coefficients, lowest power first, of the polynomial through
+            the points and of the product of (X - x)
+    """
+    g0 = [1]
+    for x in xs:
+        g0 = polyMul(g0, [ (-x) % PRIME, 1 ])
+
+    dens = []
+    for i, xi in enumerate(xs):
+        den = 1
+        for j, xj in enumerate(xs):
+            if i != j:
+                den = (den * (xi - xj)) % PRIME
+        dens.append(den)
+    poly = [0] * len(xs)
+    for x, y, w in zip(xs, ys, modInvBatch(dens)):
+        scale = (y * w) % PRIME
+        carry = 0
+        for k in range(len(g0) - 1, 0, -1):
+            carry = (g0[k] + carry * x) % PRIME
+            poly[k-1] += scale * carry
+    return polyTrim([ c % PRIME for c in poly ]), g0
+
+
+def gaoDecode(xs, ys, thresh):
+    """
+    Finds the polynomial of degree below thresh through all but at most half of
+    the points beyond thresh, with Gao's algorithm: interpolate through every
+    point, then run the extended Euclidean algorithm on the product of (X - x)
+    and that interpolant until the remainder's degree drops below half of the
+    point count plus thresh.
+
+    Returns:
+        list: The polynomial's coefficients, lowest power first
+
+    Raises:
+        ValueError: If no such polynomial exists
+    """
+    g1, g0 = interpolatePoly(xs, ys)
+    r0, r1 = g0, g1
+    v0, v1 = [], [1]
+    while 2 * (len(r1) - 1) >= len(xs) + thresh:
+        q, r = polyDivmod(r0, r1)
+        r0, r1 = r1, r
+        v0, v1 = v1, polySub(v0, polyMul(q, v1))
+    poly, rem = polyDivmod(r1, v1)
+    if rem or len(poly) > thresh:
+        raise ValueError("Too many decks are inconsistent to recover the message")
+    return poly
+
+
+def findBadShares(xs, ys, thresh):
+    """
+    Finds the points that are not on the polynomial of degree below thresh that
+    passes through the rest.
+
+    Args:
+        xs (list): Distinct share x coordinates
+        ys (list): The share y values
+        thresh (int): The threshold; the polynomial has thresh coefficients
+
+    Returns:
+        list: Indexes of the bad points, if any
+
+    Raises:
+        ValueError: If more than half of the points beyond thresh are bad
+    """
+    if len(xs) == thresh:
+        return []
+    poly = interpolatePoly(xs[:thresh], ys[:thresh])[0]
+    for x, y in zip(xs[thresh:], ys[thresh:]):
+        if polyEval(poly, x) != y:
+            break
+    else:
+        return []
+
+    poly = gaoDecode(xs, ys, thresh)
+    bad = [ i for i, (x, y) in enumerate(zip(xs, ys)) if polyEval(poly, x) != y ]
+    if 2 * len(bad) > len(xs) - thresh:
+        raise ValueError("Too many decks are inconsistent to recover the message")
+    return bad
+
+
+def robustSharedDecksToMessage(shares, thresh):
+    """
+    Decrypts a message from any number of shares from the threshold up, like
+    sharedDecksToMessage, leaving out shares that do not agree with the rest.
+    Up to half of the shares beyond the threshold can be bad.
+
+    Args:
+        shares (list): For each share, the list of its decks in order
+        thresh (int): The threshold the message was encrypted with, plus the
+            packing minus 1 for packed shares
+
+    Returns:
+        tuple: The message, and the sorted indexes of the shares left out
+
+    Raises:
+        ValueError: If fewer than thresh shares were given, or too many are bad
+    """
+    return robustSharedNumbersToMessage([ [ decodeCardsToNumber(d) for d in decks ] for decks in shares ], thresh)
+
+
+def robustSharedNumbersToMessage(nums, thresh):
+    """
+    Like robustSharedDecksToMessage, for deck numbers that are already decoded.
+
+    Args:
+        nums (list): For each share, the list of its deck numbers in order
+        thresh (int): The threshold the message was encrypted with, plus the
+            packing minus 1 for packed shares
+    """
+    if len(nums) < thresh:
+        raise ValueError(str(thresh)+" shares are required, but "+str(len(nums))+" were provided")
+    parsed = [ parsePackedShare(n) for n in nums ]
+    packed = 2 * len([ p for p in parsed if p is not None ]) > len(nums)
+    if not packed:
+        parsed = [ (n[0] >> 216, [ n[0] & SECRET_MASK ]) if len(n) == 1 and n[0] < EXT_BASE else None for n in nums ]
+
+    # the most common deck count is taken as right; exact repeats of a share are
+    # skipped, while shares that differ but have the same x are held out, then
+    # checked against the message found from the rest
+    counts = [ len(p[1]) for p in parsed if p is not None ]
+    length = max(set(counts), key=counts.count) if counts else 0
+    bad = set()
+    byX = collections.OrderedDict()
+    for i, p in enumerate(parsed):
+        if p is None or len(p[1]) != length:
+            bad.add(i)
+        else:
+            byX.setdefault(p[0], []).append(i)
+    used = []
+    heldOut = []
+    for x, group in byX.items():
+        if len(set([ tuple(parsed[i][1]) for i in group ])) == 1:
+            used.append(group[0])
+        else:
+            heldOut.extend(group)
+
+    if len(used) >= thresh:
+        xs = [ parsed[i][0] for i in used ]
+        for pi in range(0, length):
+            for b in findBadShares(xs, [ parsed[i][1][pi] for i in used ], thresh):
+                bad.add(used[b])
+    good = [ i for i in used if i not in bad ][:thresh]
+    if len(good) < thresh:
+        raise ValueError("Too many decks are inconsistent to recover the message")
+
+    base = tuple([ parsed[i][0] for i in good ])
+    for i in heldOut:
+        weights = lagrangeWeights(base, parsed[i][0])
+        for pi in range(0, length):
+            if sum([ w * parsed[g][1][pi] for w, g in zip(weights, good) ]) % PRIME != parsed[i][1][pi]:
+                bad.add(i)
+                break
+
+    if packed:
+        msg = packedSharesToMessage([ nums[i] for i in good ])
+    else:
+        msg = numberToMessage(sssJoin([ [ parsed[i][0], parsed[i][1][0] ] for i in good ]))
+    return msg, sorted(bad)
@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Server
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Keeps scs28 loaded and answers encode, decode, encrypt and decrypt requests
+over a UNIX socket or localhost TCP, one JSON object per line. Requires
+Python 3.7 or later.
+
+Serving on a UNIX socket, or on localhost port 2828:
+    ./scs28_server.py /tmp/scs28.sock
+    ./scs28_server.py 2828
+
+Sending requests, one JSON object per line, and printing the responses:
+    echo '{"op": "encode", "message": "Hello there."}' | ./scs28_server.py --client /tmp/scs28.sock
+
+Requests have an "op" and may have an "id", which is copied into the response:
+    {"op": "encode", "message": "..."}              -> {"deck": "AH 2C ..."}
+    {"op": "decode", "deck": "AH 2C ..."}           -> {"message": "..."}
+    {"op": "encrypt", "message": "...", "thresh": 2, "total": 3, "pack": null}
+                                                    -> {"decks": ["...", ...]}
+    {"op": "decrypt", "decks": ["...", ...], "thresh": 2, "pack": null}
+                                                    -> {"message": "..."}
+    {"op": "ping"}                                  -> {"pong": true}
+
+Messages that are not UTF-8 are sent as "message_hex" instead of "message".
+Packed shares are lists of decks; decrypting them needs the "pack" they were
+encrypted with, and the threshold plus the pack minus 1 of them. A decrypt given
+more decks than it needs also gets "inconsistent", the indexes of any decks that
+disagreed with the rest and were left out. A request that fails gets an "error".
+Responses on a connection come back in the order the requests were sent, and
+requests may be sent without waiting for earlier responses.
+"""
+
+import argparse
+import asyncio
+import binascii
+import concurrent.futures
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+
+import scs28
+
+# Longest request line accepted, in bytes
+MAX_LINE = 16 * 1024 * 1024
+
+# Operations that are sent to the worker processes; the others are answered inline
+POOL_OPS = ("encrypt", "decrypt")
+
+
+###############################
+## Requests
+###############################
+
+def parseAddress(address):
+    """
+    Parses a server address: a path for a UNIX socket, a port number, or HOST:PORT.
+
+    Returns:
+        tuple: ("unix", path) or ("tcp", (host, port))
+    """
+    if "/" in address or address.endswith(".sock"):
+        return "unix", address
+    host, _, port = address.rpartition(":")
+    if not port.isdigit():
+        raise ValueError("Address must be a socket path, a port, or HOST:PORT: " + address)
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+def isLoopback(host):
+    """
+    True if every address a host name or IP resolves to is a loopback address.
+    """
+    import ipaddress
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except socket.gaierror:
+        return False
+    return all([ ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback for info in infos ])
+
+
+def requestField(request, name, kinds, what):
+    """
+    Returns a field of a request, checking that it is one of the given JSON types.
+
+    Raises:
+        KeyError: If the request has no such field
+        TypeError: If the field is of another type; what names the types expected
+    """
+    value = request[name]
+    if not isinstance(value, kinds) or isinstance(value, bool):
+        raise TypeError('"' + name + '" must be ' + what)
+    return value
+
+
+def requestMessage(request):
+    if "message_hex" in request:
+        return binascii.unhexlify(requestField(request, "message_hex", str, "a string"))
+    if "message" in request:
+        return scs28.textToBytes(requestField(request, "message", str, "a string"))
+    raise ValueError("Request has no message")
+
+
+def requestShares(request):
+    """
+    Returns the shares of a decrypt request as lists of deck strings; a share may
+    be given as one deck string or as a list of them.
+
+    Raises:
+        TypeError: If the decks are not a list of strings and lists of strings
+        ValueError: If there are no decks, or a share is an empty list
+    """
+    decks = requestField(request, "decks", list, "a list of decks")
+    if not decks:
+        raise ValueError('"decks" is empty')
+    shares = []
+    for share in decks:
+        share = share if isinstance(share, list) else [share]
+        if not share:
+            raise ValueError("A share has no decks")
+        if not all([ isinstance(d, str) for d in share ]):
+            raise TypeError('"decks" must hold deck strings, or lists of deck strings')
+        shares.append(share)
+    return shares
+
+
+def requestPack(request):
+    if request.get("pack") is None:
+        return None
+    return requestField(request, "pack", int, "a whole number")
+
+
+def setMessage(response, msg):
+    try:
+        response["message"] = msg.decode("utf-8")
+    except UnicodeDecodeError:
+        response["message_hex"] = binascii.hexlify(msg).decode("ascii")
+
+
+def handleRequest(request):
+    """
+    Answers one request; runs either inline or in a worker process.
+
+    Returns:
+        dict: The response, with the request's id if it had one
+    """
+    response = {}
+    try:
+        if not isinstance(request, dict):
+            raise TypeError("Request must be a JSON object")
+        if "id" in request:
+            response["id"] = request["id"]
+        op = request.get("op")
+        codec = scs28.Codec()
+        if op == "encode":
+            response["deck"] = codec.format(codec.encode(requestMessage(request)))
+        elif op == "decode":
+            setMessage(response, codec.decode(codec.parse(requestField(request, "deck", str, "a string"))))
+        elif op == "encrypt":
+            sharer = scs28.SecretSharer(requestField(request, "thresh", int, "a whole number"),
+                    requestField(request, "total", int, "a whole number"), requestPack(request))
+            shares = sharer.split(requestMessage(request))
+            if sharer.pack:
+                response["decks"] = [ [ codec.format(d) for d in share ] for share in shares ]
+            else:
+                response["decks"] = [ codec.format(share[0]) for share in shares ]
+        elif op == "decrypt":
+            shares = requestShares(request)
+            thresh = requestField(request, "thresh", int, "a whole number")
+            pack = requestPack(request)
+            sharer = scs28.SecretSharer(thresh, max(thresh + (pack - 1 if pack else 0), len(shares)), pack)
+            msg, bad = sharer.joinRobust([ [ codec.parse(d) for d in share ] for share in shares ])
+            setMessage(response, msg)
+            if bad:
+                response["inconsistent"] = bad
+        elif op == "ping":
+            response["pong"] = True
+        else:
+            raise ValueError("Unknown op: " + str(op))
+    except KeyError as e:
+        response["error"] = "Request has no " + str(e)
+    except (TypeError, ValueError) as e:
+        response["error"] = str(e)
+    except Exception as e:
+        # a request must never take down its connection and the responses queued on it
+        response["error"] = "Request failed: " + type(e).__name__ + ": " + str(e)
+    return response
+
+
+def warmWorker():
+    """
+    Pool initializer; runs one encrypt and decrypt so tables and caches are loaded.
+    """
+    sharer = scs28.SecretSharer(2, 2)
+    sharer.join(sharer.split(b"warm"))
+
+
+###############################
+## Server
+###############################
+
+class DeckServer(object):
+    """
+    Serves requests on any number of connections. Encode and decode are answered
+    on the event loop; encrypt and decrypt go to a pool of worker processes, which
+    stay up so their tables and Lagrange weight caches stay warm.
+
+    Each connection may pipeline requests. Up to maxPending requests per
+    connection are worked on at once; beyond that the server stops reading from
+    the connection until responses have been written, and writing waits for the
+    client to read, so a fast client cannot make the server buffer without limit.
+
+    Args:
+        workers (int): Number of worker processes; 0 answers everything inline
+        maxPending (int): Requests per connection in flight at once
+    """
+    def __init__(self, workers=None, maxPending=128):
+        self.workers = os.cpu_count() if workers is None else workers
+        self.maxPending = maxPending
+        self.pool = None
+        if self.workers:
+            self.pool = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=warmWorker)
+        warmWorker()
+
+    def dispatch(self, line):
+        """
+        Starts work on one request line, returning a future of its response.
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            request = None
+            response = { "error": "Request is not valid JSON: " + str(e) }
+        if request is not None:
+            if self.pool is not None and isinstance(request, dict) and request.get("op") in POOL_OPS:
+                return loop.run_in_executor(self.pool, handleRequest, request)
+            response = handleRequest(request)
+        return self.completed(response)
+
+    def completed(self, response):
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(response)
+        return future
+
+    async def handle(self, reader, writer):
+        pending = asyncio.Queue(self.maxPending)
+
+        async def respond():
+            while True:
+                future = await pending.get()
+                if future is None:
+                    return
+                try:
+                    response = await future
+                except Exception as e:
+                    # the worker process could not run the request at all
+                    response = { "error": "Request failed: " + type(e).__name__ + ": " + str(e) }
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+
+        responder = asyncio.ensure_future(respond())
+        try:
+            while not responder.done():
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await pending.put(self.completed({ "error": "Request line is too long" }))
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    await pending.put(self.dispatch(line))
+            if not responder.done():
+                await pending.put(None)
+            await responder
+        except (ConnectionError, asyncio.CancelledError):
+            responder.cancel()
+        finally:
+            writer.close()
+
+    async def serve(self, address, allowRemote=False):
+        """
+        Listens on an address as given to parseAddress, until cancelled. Requests
+        hold plain secrets and are not authenticated, so a TCP host must be
+        loopback unless allowRemote is set.
+
+        Raises:
+            ValueError: If the host is not loopback, or another server is
+                listening on the socket path
+        """
+        family, target = parseAddress(address)
+        if family == "tcp" and not allowRemote and not isLoopback(target[0]):
+            raise ValueError("Refusing to listen on " + target[0] + ", which is not a loopback address;"
+                " the server takes plain secrets with no authentication (allow it with --allow-remote)")
+        if family == "unix":
+            if os.path.exists(target) and stat.S_ISSOCK(os.stat(target).st_mode):
+                removeStaleSocket(target)
+            server = await asyncio.start_unix_server(self.handle, target, limit=MAX_LINE)
+        else:
+            server = await asyncio.start_server(self.handle, target[0], target[1], limit=MAX_LINE)
+        print("Serving on", address, "with", self.workers, "worker processes", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if family == "unix" and os.path.exists(target):
+                os.unlink(target)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def removeStaleSocket(path):
+    """
+    Removes a UNIX socket left behind by a server that is gone. A socket that a
+    server still answers on is left alone.
+
+    Raises:
+        ValueError: If a server is listening on the socket
+    """
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)
+        return
+    except FileNotFoundError:
+        return
+    finally:
+        probe.close()
+    raise ValueError("Another server is already listening on " + path)
+
+
+def serve(address, workers=None, maxPending=128, allowRemote=False):
+    """
+    Runs a DeckServer on an address until interrupted.
+
+    Raises:
+        ValueError: If the address cannot be served, as for DeckServer.serve
+    """
+    server = DeckServer(workers, maxPending)
+
+    async def run():
+        task = asyncio.ensure_future(server.serve(address, allowRemote))
+        loop = asyncio.get_event_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, task.cancel)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.close()
+
+
+###############################
+## Client
+###############################
+
+class DeckClient(object):
+    """
+    Blocking client for a DeckServer. The op methods raise ValueError when the
+    server answers with an error.
+
+    Args:
+        address (string): Socket path, port or HOST:PORT of the server
+    """
+    def __init__(self, address):
+        family, target = parseAddress(address)
+        self.sock = socket.socket(socket.AF_UNIX if family == "unix" else socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.connect(target)
+        self.rfile = self.sock.makefile("rb")
+
+    def send(self, lines):
+        self.sock.sendall(b"".join(lines))
+
+    def receive(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("Server closed the connection")
+        return json.loads(line)
+
+    def pipeline(self, requests, depth=64):
+        """
+        Sends requests without waiting for each response, keeping up to depth of
+        them in flight, and returns the responses in order.
+        """
+        return self.pipelineLines([ json.dumps(r).encode("utf-8") + b"\n" for r in requests ], depth)
+
+    def pipelineLines(self, lines, depth=64):
+        """
+        Same as pipeline, for requests already encoded as JSON lines.
+        """
+        responses = []
+        self.send(lines[:depth])
+        for sent in range(depth, len(lines)):
+            responses.append(self.receive())
+            self.send([ lines[sent] ])
+        while len(responses) < len(lines):
+            responses.append(self.receive())
+        return responses
+
+    def request(self, op, **params):
+        params["op"] = op
+        response = self.pipeline([ params ])[0]
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response
+
+    def encode(self, msg):
+        return self.request("encode", message_hex=binascii.hexlify(msg).decode("ascii"))["deck"]
+
+    def decode(self, deck):
+        return responseMessage(self.request("decode", deck=deck))
+
+    def encrypt(self, msg, thresh, total, pack=None):
+        return self.request("encrypt", message_hex=binascii.hexlify(msg).decode("ascii"),
+                thresh=thresh, total=total, pack=pack)["decks"]
+
+    def decrypt(self, decks, thresh, pack=None):
+        return responseMessage(self.request("decrypt", decks=decks, thresh=thresh, pack=pack))
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def responseMessage(response):
+    if "message_hex" in response:
+        return binascii.unhexlify(response["message_hex"])
+    return response["message"].encode("utf-8")
+
+
+###############################
+## Server Start
+###############################
+def main(argv=None):
+    apar = argparse.ArgumentParser(prog='scs28_server',
+    description="""    Super Card Shuffle 28 server --
+    Answers line delimited JSON requests on a UNIX socket or localhost TCP port.
+    """)
+    apar.add_argument('address', metavar='ADDRESS',
+            help='UNIX socket path, port number on localhost, or HOST:PORT; HOST must be loopback unless --allow-remote is given')
+    apar.add_argument('-w','--workers', type=int, metavar='COUNT',
+            help='number of worker processes for encrypt and decrypt; 0 to answer everything in the server process; defaults to the number of CPUs')
+    apar.add_argument('--max-pending', type=int, default=128, metavar='COUNT',
+            help='requests per connection worked on at once before the server stops reading; default of 128')
+    apar.add_argument('--allow-remote', action='store_true',
+            help='allow a HOST that is not a loopback address; anyone who can reach it can use the server, which has no authentication')
+    apar.add_argument('--client', action='store_true',
+            help='instead of serving, send JSON request lines from stdin to the server at ADDRESS and print the responses')
+    pargs = apar.parse_args(argv)
+
+    if pargs.client:
+        with DeckClient(pargs.address) as client:
+            lines = [ line.rstrip("\n").encode("utf-8") + b"\n" for line in sys.stdin if line.strip() ]
+            for response in client.pipelineLines(lines):
+                print(json.dumps(response))
+        return 0
+
+    try:
+        serve(pargs.address, pargs.workers, max(1, pargs.max_pending), pargs.allow_remote)
+    except ValueError as e:
+        print("FAILURE:", e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# coding: utf-8
+###############################################################################
+# Copyright (c) 2015 Nathan Collins
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+"""
+Super Card Shuffle 28! Streams
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Splits a byte stream of any length into numbered frames, one per deck, and
+puts them back together from decks given in any order.
+"""
+
+from __future__ import print_function
+import struct
+
+from scs28 import (b, decodeCardsToNumber, encodeNumberToCards, numberToRecord,
+    readFully, recordToNumber)
+from scs28_packed import EXT_BASE
+
+
+###############################
+## Streaming Frames
+###############################
+
+# A stream is split into frames of one deck each. A frame is a 28 byte record:
+# a 4 byte sequence number, a flag byte holding the last frame bit and the data
+# length, then up to 23 bytes of data padded with nulls.
+FRAME_HEADER = struct.Struct('>IB')
+FRAME_PAYLOAD = 28 - FRAME_HEADER.size
+FRAME_LAST = 0x80
+FRAME_LENGTH = 0x1f
+
+
+def packFrame(seq, last, data):
+    if seq >= (1 << 32):
+        raise ValueError("Stream is too long; ran out of frame numbers")
+    flags = (FRAME_LAST if last else 0) | len(data)
+    return FRAME_HEADER.pack(seq, flags) + data.ljust(FRAME_PAYLOAD, b('\0'))
+
+
+def unpackFrame(record):
+    """
+    Returns:
+        tuple: The frame's sequence number, last frame flag and data
+    """
+    seq, flags = FRAME_HEADER.unpack(record[:FRAME_HEADER.size])
+    last = bool(flags & FRAME_LAST)
+    length = flags & FRAME_LENGTH
+    if flags & ~(FRAME_LAST | FRAME_LENGTH) or length > FRAME_PAYLOAD or (length < FRAME_PAYLOAD and not last):
+        raise ValueError("Deck does not hold a stream frame")
+    return seq, last, record[FRAME_HEADER.size:FRAME_HEADER.size+length]
+
+
+def streamFrames(infile):
+    """
+    Generator reading a binary file incrementally and yielding the sequence
+    number, last frame flag and data of one frame per 23 bytes. One chunk is read
+    ahead to know which frame is the last; empty input still produces a single,
+    empty last frame.
+    """
+    seq = 0
+    data = readFully(infile, FRAME_PAYLOAD)
+    while True:
+        ahead = readFully(infile, FRAME_PAYLOAD)
+        last = not ahead
+        yield seq, last, data
+        if last:
+            break
+        data = ahead
+        seq += 1
+
+
+def streamToDecks(infile):
+    """
+    Generator reading a binary file incrementally and yielding one framed deck per
+    23 bytes.
+    """
+    for seq, last, data in streamFrames(infile):
+        yield encodeNumberToCards(recordToNumber(packFrame(seq, last, data)))
+
+
+def decksToStream(decks):
+    """
+    Generator reassembling framed decks into the original data. Decks may arrive
+    in any order; data is yielded as soon as every frame before it has arrived,
+    so only out of order frames are held in memory. Erasure parity decks are
+    skipped, so an erasure coded stream with nothing lost decodes as is.
+
+    Raises:
+        ValueError: On bad or duplicate frames, or frames missing at the end
+    """
+    return framesToStream( decodeCardsToNumber(deck) for deck in decks )
+
+
+def framesToStream(nums):
+    """
+    Generator reassembling the numbers of framed decks into the original data, as
+    decksToStream does.
+    """
+    pending = {}
+    nextSeq = 0
+    lastSeq = None
+    highSeq = -1
+    for num in nums:
+        if num >= EXT_BASE:
+            # parity decks of an erasure coded stream are left to repairErasures
+            from scs28_erasure import unpackErasureNumber
+            if unpackErasureNumber(num) is not None:
+                continue
+        seq, last, data = unpackFrame(numberToRecord(num))
+        if seq < nextSeq or seq in pending:
+            raise ValueError("Received frame "+str(seq)+" more than once")
+        highSeq = max(highSeq, seq)
+        if last:
+            if lastSeq is not None:
+                raise ValueError("Received more than one last frame")
+            lastSeq = seq
+        if lastSeq is not None and highSeq > lastSeq:
+            raise ValueError("Received a frame after the last frame")
+
+        pending[seq] = data
+        while nextSeq in pending:
+            yield pending.pop(nextSeq)
+            nextSeq += 1
+
+    if lastSeq is None or nextSeq <= lastSeq:
+        end = lastSeq if lastSeq is not None else max(nextSeq, highSeq)
+        missing = [ str(s) for s in range(nextSeq, end + 1) if s not in pending ]
+        if lastSeq is None:
+            missing.append("last")
+        raise ValueError("Stream is incomplete; missing frames: "+" ".join(missing[:20])
+            + (" ..." if len(missing) > 20 else ""))